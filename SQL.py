@@ -1,15 +1,69 @@
-import json
+import base64
+import hashlib
+import random
 import sqlite3
 import time
+from typing import Iterator
 
-from chain_types import Block, Tx
-from util import txraw_to_hash
+import codec
+from chain_types import DECODE_FAILED, DECODE_POLICY, Block, BlockData, Tx, TxDecode
+from tx_json_codec import CODEC_ZLIB_DICT, TxJsonCodec
+from util import retry_backoff, txraw_to_hash
+
+
+# the decode columns of 1 Tx, _decode_params fills it. Policy skips are not decoder attempts.
+UPDATE_TX_DECODE = """UPDATE txs SET tx_json=?, msg_types=?, address=?, decode_status=?, decode_error=?, decoder_version=?, decode_attempts=decode_attempts+? WHERE id=?"""
+
+INSERT_MESSAGE = """INSERT INTO messages (tx_id, msg_index, nested, height, type_id, signer) VALUES (?, ?, ?, ?, ?, ?)"""
+
+# settings.tx_storage: txs.tx_amino / tx_hash are base64 / uppercase hex TEXT by default, raw TxRaw bytes /
+# 32 byte sha256 BLOBs when it is "blob" (migrations/tx_blobs.py). While a table is migrated it holds both,
+# so reads take either and the Database API always returns the text forms.
+TX_STORAGE_BLOB = "blob"
+TX_STORAGE_TEXT = "text"
+
+
+def _amino_text(value: str | bytes) -> str:
+    return base64.b64encode(value).decode() if isinstance(value, bytes) else value
+
+
+def _hash_text(value: str | bytes | None) -> str:
+    return value.hex().upper() if isinstance(value, bytes) else value or ""
+
+
+# settings.tx_json_dict: the tx_json_dicts.id new tx_json is compressed with (tx_json_codec.py), "" for
+# TEXT. Decompressed tx_json of the last TX_JSON_CACHE_SIZE values read is kept.
+TX_JSON_CACHE_SIZE = 10_000
+
+# the first 7 txs columns, in order
+TX_COLUMNS = list(Tx.__annotations__.keys())
+
+
+def _decode_params(_id: int, decoded: TxDecode, tx_json: str | bytes) -> tuple:
+    """tx_json: decoded.tx_json as it is stored (Database.tx_json_codec)"""
+    return (
+        tx_json,
+        decoded.msg_types,
+        decoded.sender,
+        decoded.status,
+        decoded.error,
+        decoded.decoder_version,
+        int(decoded.status != DECODE_POLICY),
+        _id,
+    )
 
 
 class Database:
     def __init__(self, db: str):
-        self.conn = sqlite3.connect(db)
+        # Sections (and the pipeline's writer) share data.db, SQLite waits up to 60s for the write lock
+        # of another connection instead of failing with "database is locked".
+        self.conn = sqlite3.connect(db, timeout=60)
         self.cur = self.conn.cursor()
+        # type URL -> msg_type_ids.id, of the ids this connection has seen committed or written
+        self.type_ids: dict[str, int] = {}
+        # how new Txs are written, see TX_STORAGE_BLOB
+        self.tx_blobs = self.get_setting("tx_storage") == TX_STORAGE_BLOB
+        self.tx_json_codec = self.load_tx_json_codec()
         # self.optimize_db(vacuum=False) # never run vacuum here
         # self.cur.execute("""PRAGMA temp_store=MEMORY""")
         # self.optimize_tables()
@@ -17,6 +71,11 @@ class Database:
     def commit(self):
         self.conn.commit()
 
+    def rollback(self):
+        self.conn.rollback()
+        # type ids written in the rolled back transaction are gone
+        self.type_ids = {}
+
     def create_tables(self):
         # height, time, txs_ids
         self.cur.execute(
@@ -27,22 +86,82 @@ class Database:
         self.cur.execute(
             """CREATE TABLE IF NOT EXISTS txs (id INTEGER PRIMARY KEY AUTOINCREMENT, height INTEGER, tx_amino TEXT, msg_types TEXT, tx_json TEXT, address TEXT, tx_hash TEXT)"""
         )
+        # "" decoded or still to decode, "policy" saved raw on purpose (decoding.TypePolicy), "failed"
+        self.add_column_if_missing("txs", "decode_status", "TEXT NOT NULL DEFAULT ''")
+        # times a decoder was run on the Tx, the version of the last one & its error
+        self.add_column_if_missing("txs", "decode_attempts", "INTEGER NOT NULL DEFAULT 0")
+        self.add_column_if_missing("txs", "decoder_version", "TEXT NOT NULL DEFAULT ''")
+        self.add_column_if_missing("txs", "decode_error", "TEXT NOT NULL DEFAULT ''")
+
+        # normalized fields of each decoded message (extractors.py): sender, recipient, contract, proposal_id, ...
+        # nested > 0 are messages inside an authz MsgExec, msg_index is the position in the flattened messages
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS msg_fields (tx_id INTEGER, height INTEGER, msg_index INTEGER, nested INTEGER, msg_type TEXT, field TEXT, value TEXT)"""
+        )
+
+        # message type URLs, interned for messages.type_id
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS msg_type_ids (id INTEGER PRIMARY KEY, type_url TEXT UNIQUE)"""
+        )
+        # 1 row per message of every decoded Tx, authz MsgExec inner messages flattened in (same
+        # msg_index / nested as msg_fields). signer is the message's sender (extractors.py), "" if unknown.
+        self.cur.execute("""PRAGMA table_info(messages)""")
+        if "count" in [row[1] for row in self.cur.fetchall()]:
+            print("Renaming the old messages (message, height, count) table to messages_counts")
+            self.cur.execute("""ALTER TABLE messages RENAME TO messages_counts""")
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS messages (tx_id INTEGER, msg_index INTEGER, nested INTEGER, height INTEGER, type_id INTEGER, signer TEXT)"""
+        )
+
+        # data.db wide options (tx_storage, tx_json_dict)
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)"""
+        )
+        # tx_json compression dictionaries, kept for as long as values compressed with them may exist
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS tx_json_dicts (id INTEGER PRIMARY KEY, codec INTEGER, dict BLOB, samples INTEGER, created REAL)"""
+        )
+
+        # heights which failed to download. Retried with backoff until `dead` (max attempts)
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS retry_queue (height INTEGER PRIMARY KEY, attempts INTEGER, next_attempt REAL, last_error TEXT, last_endpoint TEXT, dead INTEGER)"""
+        )
 
         # users: address, height, tx_id
         # self.cur.execute(
         #     """CREATE TABLE IF NOT EXISTS users (address TEXT, height INTEGER, tx_id INTEGER)"""
         # )
 
-        # messages: message_type, height, count
-        # This may be extra? We could just iter txs but I guess it depends. Can add in the future
-        # NOTE: Getting just the count is dumb. If we were to redo this it should be the Tx IDs
-        # self.cur.execute(
-        #     # This was updated in the migrations.txt on current db
-        #     """CREATE TABLE IF NOT EXISTS messages (message TEXT, height INTEGER, count INTEGER)"""
-        # )
-
         self.commit()
 
+    def get_setting(self, key: str, default: str = "") -> str:
+        self.cur.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='settings'""")
+        if self.cur.fetchone() is None:
+            return default
+
+        self.cur.execute("""SELECT value FROM settings WHERE key=?""", (key,))
+        data = self.cur.fetchone()
+        return default if data is None else data[0]
+
+    def set_setting(self, key: str, value: str):
+        self.cur.execute("""INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)""", (key, value))
+
+    def add_column_if_missing(self, table: str, column: str, definition: str):
+        """Columns added after a table was first made, so older data.db files get them too."""
+        self.cur.execute(f"""PRAGMA table_info({table})""")
+        if column not in [row[1] for row in self.cur.fetchall()]:
+            self.cur.execute(f"""ALTER TABLE {table} ADD COLUMN {column} {definition}""")
+
+    def replace_index_if_changed(self, name: str, create: str):
+        """(Re)creates an index whose definition changed since older data.db files made it."""
+        self.cur.execute("""SELECT sql FROM sqlite_master WHERE type='index' AND name=?""", (name,))
+        data = self.cur.fetchone()
+        if data is not None and data[0] == create:
+            return
+        if data is not None:
+            self.cur.execute(f"""DROP INDEX {name}""")
+        self.cur.execute(create)
+
     def optimize_tables(self):
         # Only runs this after we have saved values
         # self.cur.execute("""VACUUM""")
@@ -57,6 +176,43 @@ class Database:
         self.cur.execute(
             """CREATE INDEX IF NOT EXISTS txs_data_index ON txs (id, height, address, tx_hash)"""
         )
+        # height range reads (get_txs_in_range), covering the small columns. txs_data_index leads with
+        # id, so it never helped a height range
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS txs_height ON txs (height, id, msg_types, address)"""
+        )
+        # the decode work queue (iter_txs_to_decode): only Txs not decoded yet are in it, so it stays
+        # small once a range is decoded. Txs the policy skipped stay undecoded for good, they are left out.
+        # Failed ones are filtered on the indexed decode_status / decoder_version, without a table lookup.
+        self.replace_index_if_changed(
+            "txs_to_decode",
+            f"""CREATE INDEX txs_to_decode ON txs (height, id, decode_status, decoder_version) WHERE tx_json='' AND decode_status!='{DECODE_POLICY}'""",
+        )
+
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS msg_fields_value ON msg_fields (field, value)"""
+        )
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS msg_fields_type ON msg_fields (msg_type, height)"""
+        )
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS msg_fields_tx ON msg_fields (tx_id)"""
+        )
+
+        # "every MsgVote in blocks X-Y" is a range scan of messages_type
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS messages_type ON messages (type_id, height)"""
+        )
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS messages_signer ON messages (signer, height)"""
+        )
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS messages_tx ON messages (tx_id)"""
+        )
+
+        self.cur.execute(
+            """CREATE INDEX IF NOT EXISTS retry_queue_due ON retry_queue (dead, next_attempt)"""
+        )
 
         self.commit()
 
@@ -212,7 +368,68 @@ class Database:
         # insert the height and tx_amino.
         self.cur.execute(
             """INSERT INTO blocks (height, time, txs) VALUES (?, ?, ?)""",
-            (height, time, json.dumps(txs_ids)),
+            (height, time, codec.dumps(txs_ids)),
+        )
+
+    def insert_block_rows(self, rows: list[tuple]):
+        """
+        rows: (height, time, [(amino, TxDecode | None)]), None for Txs which were not sent to a decoder.
+        Tx ids come from reserve_tx_ids, so every txs / blocks / msg_fields / messages row is written with
+        1 executemany per table. Runs in the caller's transaction (it commits).
+        """
+        if len(rows) == 0:
+            return
+
+        next_id = self.reserve_tx_ids(sum(len(txs) for _, _, txs in rows))
+        tx_rows, block_rows, field_rows, message_rows = [], [], [], []
+        for height, block_time, txs in rows:
+            sql_tx_ids = list(range(next_id, next_id + len(txs)))
+            next_id += len(txs)
+
+            for unique_id, (amino, decoded) in zip(sql_tx_ids, txs):
+                amino, tx_hash = self.tx_storage_values(amino)
+                if decoded is None:
+                    tx_rows.append((unique_id, height, amino, "", "", "", tx_hash, "", "", "", 0))
+                    continue
+
+                tx_rows.append(
+                    (
+                        unique_id,
+                        height,
+                        amino,
+                        decoded.msg_types,
+                        self.tx_json_codec.compress(decoded.tx_json),
+                        decoded.sender,
+                        tx_hash,
+                        decoded.status,
+                        decoded.error,
+                        decoded.decoder_version,
+                        int(decoded.status != DECODE_POLICY),
+                    )
+                )
+                field_rows.extend((unique_id, height, *field) for field in decoded.fields)
+                message_rows.extend(
+                    (unique_id, msg_index, nested, height, self.msg_type_id(msg_type), signer)
+                    for msg_index, nested, msg_type, signer in decoded.messages
+                )
+
+            block_rows.append((height, block_time, codec.dumps(sql_tx_ids)))
+
+        self.cur.executemany(
+            """INSERT INTO txs (id, height, tx_amino, msg_types, tx_json, address, tx_hash, decode_status, decode_error, decoder_version, decode_attempts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            tx_rows,
+        )
+        self.cur.executemany("""INSERT INTO blocks (height, time, txs) VALUES (?, ?, ?)""", block_rows)
+        self.cur.executemany(
+            """INSERT INTO msg_fields (tx_id, height, msg_index, nested, msg_type, field, value) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            field_rows,
+        )
+        self.cur.executemany(INSERT_MESSAGE, message_rows)
+
+    def insert_blocks(self, blocks: list[BlockData]):
+        """Downloaded blocks, saved without decoding (see insert_block_rows)."""
+        self.insert_block_rows(
+            [(bd.height, bd.block_time, [(amino, None) for amino in bd.encoded_txs]) for bd in blocks]
         )
 
     def get_block(self, block_height: int) -> Block | None:
@@ -224,7 +441,7 @@ class Database:
         if data is None:
             return None
 
-        return Block(data[0], data[1], json.loads(data[2]))
+        return Block(data[0], data[1], codec.loads(data[2]))
 
     def get_earliest_block(self) -> Block | None:
         self.cur.execute("""SELECT * FROM blocks ORDER BY height ASC LIMIT 1""")
@@ -232,7 +449,7 @@ class Database:
         if data is None:
             return None
 
-        return Block(data[0], data[1], json.loads(data[2]))
+        return Block(data[0], data[1], codec.loads(data[2]))
 
     def get_latest_saved_block(self) -> Block | None:
         self.cur.execute("""SELECT * FROM blocks ORDER BY height DESC LIMIT 1""")
@@ -240,7 +457,7 @@ class Database:
         if data is None:
             return None
 
-        return Block(data[0], data[1], json.loads(data[2]))
+        return Block(data[0], data[1], codec.loads(data[2]))
 
     def get_total_blocks(self) -> int:
         self.cur.execute("""SELECT COUNT(*) FROM blocks""")
@@ -249,17 +466,17 @@ class Database:
             return 0
         return data[0]
 
-    def get_missing_blocks(self, start_height, end_height) -> list[int]:
-        # get all blocks which we do not have value for between a range
+    def get_saved_heights(self, start_height: int, end_height: int) -> set[int]:
+        # One range scan over the primary key instead of a get_block per height.
         self.cur.execute(
             """SELECT height FROM blocks WHERE height BETWEEN ? AND ?""",
             (start_height, end_height),
         )
-        data = self.cur.fetchall()
-        if data is None:
-            return list(range(start_height, end_height + 1))
+        return set(x[0] for x in self.cur.fetchall())
 
-        found_heights = set(x[0] for x in data)
+    def get_missing_blocks(self, start_height, end_height) -> list[int]:
+        # get all blocks which we do not have value for between a range
+        found_heights = self.get_saved_heights(start_height, end_height)
         missing_heights = [
             height
             for height in range(start_height, end_height + 1)
@@ -267,17 +484,208 @@ class Database:
         ]
         return missing_heights
 
+    # ===================================
+    # Retry Queue (failed block downloads)
+    # ===================================
+
+    def queue_retry(
+        self,
+        height: int,
+        error: str,
+        endpoint: str,
+        max_attempts: int,
+        base_seconds: float = 5,
+        max_seconds: float = 3600,
+    ) -> int:
+        """
+        Adds (or bumps) a failed height. Returns the number of attempts so far.
+        Once max_attempts is hit the height is dead lettered and no longer retried.
+        """
+        self.cur.execute(
+            """SELECT attempts FROM retry_queue WHERE height=?""",
+            (height,),
+        )
+        data = self.cur.fetchone()
+        attempts = (data[0] if data is not None else 0) + 1
+
+        dead = 1 if attempts >= max_attempts else 0
+        next_attempt = time.time() + retry_backoff(attempts, base_seconds, max_seconds)
+        self.cur.execute(
+            """INSERT OR REPLACE INTO retry_queue (height, attempts, next_attempt, last_error, last_endpoint, dead) VALUES (?, ?, ?, ?, ?, ?)""",
+            (height, attempts, next_attempt, error, endpoint, dead),
+        )
+        return attempts
+
+    def get_due_retries(
+        self, now: float, start_height: int, end_height: int, limit: int = 100_000
+    ) -> dict[int, str]:
+        # height: last endpoint it failed on (so we can try another one)
+        self.cur.execute(
+            """SELECT height, last_endpoint FROM retry_queue WHERE dead=0 AND next_attempt<=? AND height BETWEEN ? AND ? AND height NOT IN (SELECT height FROM blocks WHERE height BETWEEN ? AND ?) ORDER BY height ASC LIMIT ?""",
+            (now, start_height, end_height, start_height, end_height, limit),
+        )
+        return {x[0]: x[1] for x in self.cur.fetchall()}
+
+    def get_waiting_retries(self, now: float) -> set[int]:
+        # heights which are backing off or dead lettered. These are not downloaded yet.
+        self.cur.execute(
+            """SELECT height FROM retry_queue WHERE dead=1 OR next_attempt>?""",
+            (now,),
+        )
+        return set(x[0] for x in self.cur.fetchall())
+
+    def get_queued_retries(self) -> set[int]:
+        # every height of the retry queue, due or not
+        self.cur.execute("""SELECT height FROM retry_queue""")
+        return set(x[0] for x in self.cur.fetchall())
+
+    def get_dead_retries(self) -> list[tuple[int, int, str, str]]:
+        # height, attempts, last_error, last_endpoint
+        self.cur.execute(
+            """SELECT height, attempts, last_error, last_endpoint FROM retry_queue WHERE dead=1 ORDER BY height ASC"""
+        )
+        return self.cur.fetchall()
+
+    def remove_retries(self, heights: list[int]):
+        self.cur.executemany(
+            """DELETE FROM retry_queue WHERE height=?""",
+            [(h,) for h in heights],
+        )
+
     # ===================================
     # Transactions
     # ===================================
 
+    def reserve_tx_ids(self, count: int) -> int:
+        """
+        The first of `count` contiguous, never used txs ids. Takes the write lock (BEGIN IMMEDIATE) when
+        no transaction is open, so no other connection can insert Txs until the caller commits.
+        """
+        if not self.conn.in_transaction:
+            self.cur.execute("BEGIN IMMEDIATE")
+
+        # AUTOINCREMENT: ids are never reused, even the ones of deleted Txs
+        self.cur.execute(
+            """SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='txs'), 0), COALESCE((SELECT MAX(id) FROM txs), 0))"""
+        )
+        # inserting the ids moves sqlite_sequence past them, the write lock keeps the range ours until then
+        return self.cur.fetchone()[0] + 1
+
+    def tx_storage_values(self, tx_amino: str) -> tuple[str | bytes, str | bytes]:
+        """The (tx_amino, tx_hash) column values of a base64 TxRaw, in this data.db's tx_storage."""
+        if not self.tx_blobs:
+            return tx_amino, txraw_to_hash(tx_amino)
+
+        raw = base64.b64decode(tx_amino)
+        return raw, hashlib.sha256(raw).digest()
+
+    def convert_tx_storage(self, after_id: int, batch_size: int = 10_000) -> int | None:
+        """
+        Rewrites the next `batch_size` Txs after `after_id` in this data.db's tx_storage (TEXT <-> BLOB), in
+        1 short transaction so readers & the indexer carry on meanwhile. Returns the last id looked at, None
+        once there are no Txs after `after_id`. Hashes which are already saved are kept as they are.
+        """
+        self.cur.execute(
+            """SELECT id, tx_amino, tx_hash FROM txs WHERE id>? ORDER BY id LIMIT ?""",
+            (after_id, batch_size),
+        )
+        batch = self.cur.fetchall()
+        if len(batch) == 0:
+            return None
+
+        kind = bytes if self.tx_blobs else str
+        rows = []
+        for _id, amino, tx_hash in batch:
+            if isinstance(amino, kind) and isinstance(tx_hash, kind) and len(tx_hash) > 0:
+                continue
+
+            amino, new_hash = self.tx_storage_values(_amino_text(amino))
+            if tx_hash:
+                new_hash = _hash_text(tx_hash)
+                new_hash = bytes.fromhex(new_hash) if self.tx_blobs else new_hash
+            rows.append((amino, new_hash, _id))
+
+        self.cur.executemany("""UPDATE txs SET tx_amino=?, tx_hash=? WHERE id=?""", rows)
+        self.commit()
+        return batch[-1][0]
+
+    def load_tx_json_codec(self) -> TxJsonCodec:
+        """The tx_json dictionaries of this data.db & the one new values are compressed with"""
+        active = self.get_setting("tx_json_dict")
+        dicts = {}
+        self.cur.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='tx_json_dicts'""")
+        if self.cur.fetchone() is not None:
+            self.cur.execute("""SELECT id, dict FROM tx_json_dicts""")
+            dicts = dict(self.cur.fetchall())
+
+        return TxJsonCodec(dicts, int(active) if active != "" else None, TX_JSON_CACHE_SIZE)
+
+    def tx_json_text(self, value: str | bytes | None, cached: bool = True) -> str:
+        """A stored txs.tx_json value as JSON text, compressed or not. cached: see TxJsonCodec.decompress"""
+        try:
+            return self.tx_json_codec.decompress(value, cached)
+        except KeyError:
+            # compressed with a dictionary added after this connection loaded them
+            self.tx_json_codec = self.load_tx_json_codec()
+            return self.tx_json_codec.decompress(value, cached)
+
+    def add_tx_json_dict(self, dictionary: bytes, samples: int) -> int:
+        self.cur.execute(
+            """INSERT INTO tx_json_dicts (codec, dict, samples, created) VALUES (?, ?, ?, ?)""",
+            (CODEC_ZLIB_DICT, dictionary, samples, time.time()),
+        )
+        return self.cur.lastrowid
+
+    def sample_tx_json(self, count: int) -> list[str]:
+        """The tx_json of up to `count` decoded Txs spread over the whole table (random ids, no full scan)."""
+        self.cur.execute("""SELECT MIN(id), MAX(id) FROM txs""")
+        low, high = self.cur.fetchone()
+        if low is None:
+            return []
+
+        samples = {}
+        for _ in range(count):
+            self.cur.execute(
+                """SELECT id, tx_json FROM txs WHERE id>=? AND tx_json!='' ORDER BY id LIMIT 1""",
+                (random.randint(low, high),),
+            )
+            data = self.cur.fetchone()
+            if data is not None:
+                samples[data[0]] = self.tx_json_text(data[1], cached=False)
+        return list(samples.values())
+
+    def convert_tx_json(self, after_id: int, batch_size: int = 10_000) -> int | None:
+        """
+        Rewrites the tx_json of the next `batch_size` Txs after `after_id` as tx_json_codec would write it now
+        (compressed with the active dictionary, or TEXT), like convert_tx_storage. Returns the last id looked
+        at, None once there are no Txs after `after_id`.
+        """
+        self.cur.execute(
+            """SELECT id, tx_json FROM txs WHERE id>? ORDER BY id LIMIT ?""",
+            (after_id, batch_size),
+        )
+        batch = self.cur.fetchall()
+        if len(batch) == 0:
+            return None
+
+        self.cur.executemany(
+            """UPDATE txs SET tx_json=? WHERE id=?""",
+            [
+                (self.tx_json_codec.compress(self.tx_json_text(tx_json, cached=False)), _id)
+                for _id, tx_json in batch
+                if not self.tx_json_codec.is_current(tx_json)
+            ],
+        )
+        self.commit()
+        return batch[-1][0]
+
     def insert_tx(self, height: int, tx_amino: str):
         # We insert the data without it being decoded. We can update later
         # insert the height and tx_amino, then return the unique id
         # fill the other collums with empty strings
         # """CREATE TABLE IF NOT EXISTS txs (id INTEGER PRIMARY KEY AUTOINCREMENT, height INTEGER, tx_amino TEXT, msg_types TEXT, tx_json TEXT, address TEXT)"""
 
-        tx_hash = txraw_to_hash(tx_amino)
+        tx_amino, tx_hash = self.tx_storage_values(tx_amino)
         self.cur.execute(
             """INSERT INTO txs (height, tx_amino, msg_types, tx_json, address, tx_hash) VALUES (?, ?, ?, ?, ?, ?)""",
             (height, tx_amino, "", "", "", tx_hash),
@@ -288,20 +696,180 @@ class Database:
         # update the data after we decode it (post insert_tx)
         self.cur.execute(
             """UPDATE txs SET tx_json=?, msg_types=?, address=? WHERE id=?""",
-            (tx_json, msg_types, address, _id),
+            (self.tx_json_codec.compress(tx_json), msg_types, address, _id),
+        )
+
+    def update_txs(self, rows: list[tuple[int, TxDecode]]):
+        """
+        Saves a batch of decoded (or failed) Txs, rows: (id, TxDecode).
+        1 BEGIN IMMEDIATE transaction (takes the write lock up front), so the whole batch is visible at once.
+        If the caller already has a transaction open, the batch is part of it: the caller commits or rolls back.
+        """
+        if len(rows) == 0:
+            return
+
+        # like reserve_tx_ids, never commit someone else's transaction
+        own_transaction = not self.conn.in_transaction
+        if own_transaction:
+            self.cur.execute("BEGIN IMMEDIATE")
+        try:
+            self.cur.executemany(
+                UPDATE_TX_DECODE,
+                [
+                    _decode_params(_id, decoded, self.tx_json_codec.compress(decoded.tx_json))
+                    for _id, decoded in rows
+                ],
+            )
+            # a Tx decoded again replaces its fields & messages
+            self.cur.executemany(
+                """DELETE FROM msg_fields WHERE tx_id=?""", [(row[0],) for row in rows]
+            )
+            self.cur.executemany(
+                """DELETE FROM messages WHERE tx_id=?""", [(row[0],) for row in rows]
+            )
+            self.cur.executemany(
+                INSERT_MESSAGE,
+                [
+                    (_id, msg_index, nested, decoded.height, self.msg_type_id(msg_type), signer)
+                    for _id, decoded in rows
+                    for msg_index, nested, msg_type, signer in decoded.messages
+                ],
+            )
+            self.cur.executemany(
+                """INSERT INTO msg_fields (tx_id, height, msg_index, nested, msg_type, field, value) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (_id, decoded.height, *field)
+                    for _id, decoded in rows
+                    for field in decoded.fields
+                ],
+            )
+        except Exception:
+            if own_transaction:
+                self.rollback()
+            raise
+        if own_transaction:
+            self.conn.commit()
+
+    def insert_msg_fields(self, tx_id: int, height: int, fields: list[tuple]):
+        """fields: (msg_index, nested, msg_type, field, value), see extractors.extract_fields"""
+        self.cur.executemany(
+            """INSERT INTO msg_fields (tx_id, height, msg_index, nested, msg_type, field, value) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [(tx_id, height, *field) for field in fields],
+        )
+
+    def get_msg_fields_in_range(
+        self, msg_type: str, start_height: int, end_height: int
+    ) -> list[dict[str, list[str]]]:
+        """
+        The fields of every msg_type message (authz nested ones too) in the range, in order.
+        Each is {field: [values]} + "tx_id" & "height".
+        """
+        self.cur.execute(
+            """SELECT tx_id, height, msg_index, nested, field, value FROM msg_fields WHERE msg_type=? AND height>=? AND height<=? ORDER BY tx_id, msg_index, nested""",
+            (msg_type, start_height, end_height),
+        )
+
+        msgs: dict[tuple[int, int, int], dict[str, list[str]]] = {}
+        for tx_id, height, msg_index, nested, field, value in self.cur.fetchall():
+            msg = msgs.setdefault(
+                (tx_id, msg_index, nested), {"tx_id": [str(tx_id)], "height": [str(height)]}
+            )
+            msg.setdefault(field, []).append(value)
+
+        return list(msgs.values())
+
+    def count_msg_field_values(
+        self, field: str, msg_type: str, start_height: int, end_height: int
+    ) -> dict[str, int]:
+        """value: times it is in `field` of msg_type messages in the range"""
+        self.cur.execute(
+            """SELECT value, COUNT(*) FROM msg_fields WHERE msg_type=? AND field=? AND height>=? AND height<=? GROUP BY value""",
+            (msg_type, field, start_height, end_height),
         )
+        return {value: count for value, count in self.cur.fetchall()}
+
+    def msg_type_id(self, type_url: str) -> int:
+        """The msg_type_ids.id of a type URL, added the first time it is seen."""
+        type_id = self.type_ids.get(type_url)
+        if type_id is None:
+            self.cur.execute(
+                """INSERT OR IGNORE INTO msg_type_ids (type_url) VALUES (?)""", (type_url,)
+            )
+            self.cur.execute("""SELECT id FROM msg_type_ids WHERE type_url=?""", (type_url,))
+            type_id = self.cur.fetchone()[0]
+            self.type_ids[type_url] = type_id
+        return type_id
+
+    def insert_messages(self, tx_id: int, height: int, messages: list[tuple]):
+        """messages: (msg_index, nested, msg_type, signer), see extractors.extract_fields"""
+        self.cur.executemany(
+            INSERT_MESSAGE,
+            [
+                (tx_id, msg_index, nested, height, self.msg_type_id(msg_type), signer)
+                for msg_index, nested, msg_type, signer in messages
+            ],
+        )
+
+    def get_msg_type_ids(self, msg_type: str) -> list[int]:
+        """Ids of a type URL, or of every type URL starting with it when it ends in * ("/cosmos.gov.*")"""
+        if msg_type.endswith("*"):
+            self.cur.execute(
+                """SELECT id FROM msg_type_ids WHERE substr(type_url, 1, ?)=?""",
+                (len(msg_type) - 1, msg_type[:-1]),
+            )
+        else:
+            self.cur.execute("""SELECT id FROM msg_type_ids WHERE type_url=?""", (msg_type,))
+        return [row[0] for row in self.cur.fetchall()]
+
+    def get_messages_in_range(
+        self, msg_type: str, start_height: int, end_height: int
+    ) -> list[tuple[int, int, int, int, str]]:
+        """
+        (tx_id, msg_index, nested, height, signer) of every msg_type message (authz nested ones too) in the
+        range, in order. msg_type as in get_msg_type_ids.
+        """
+        type_ids = self.get_msg_type_ids(msg_type)
+        if len(type_ids) == 0:
+            return []
+
+        self.cur.execute(
+            f"""SELECT tx_id, msg_index, nested, height, signer FROM messages WHERE type_id IN ({','.join('?' * len(type_ids))}) AND height BETWEEN ? AND ? ORDER BY height, tx_id, msg_index""",
+            (*type_ids, start_height, end_height),
+        )
+        return self.cur.fetchall()
+
+    def count_messages_in_range(self, msg_type: str, start_height: int, end_height: int) -> int:
+        type_ids = self.get_msg_type_ids(msg_type)
+        if len(type_ids) == 0:
+            return 0
+
+        self.cur.execute(
+            f"""SELECT COUNT(*) FROM messages WHERE type_id IN ({','.join('?' * len(type_ids))}) AND height BETWEEN ? AND ?""",
+            (*type_ids, start_height, end_height),
+        )
+        return self.cur.fetchone()[0]
+
+    def get_tx_ids_with_msg_type(self, msg_type: str, start_height: int, end_height: int) -> list[int]:
+        """Ids of the Txs with a msg_type message in the range, in order."""
+        return sorted(set(row[0] for row in self.get_messages_in_range(msg_type, start_height, end_height)))
 
     def update_tx_hash(self, _id: int, tx_hash: str):
         # This is only used for the migration to add this section.
         self.cur.execute(
             """UPDATE txs SET tx_hash=? WHERE id=?""",
-            (tx_hash, _id),
+            (bytes.fromhex(tx_hash) if self.tx_blobs else tx_hash, _id),
         )
 
     def get_tx_by_hash(self, tx_hash: str) -> Tx | None:
+        try:
+            raw_hash = bytes.fromhex(tx_hash)
+        except ValueError:
+            return None
+
+        # either storage, a data.db being migrated has both
         self.cur.execute(
-            """SELECT id FROM txs WHERE tx_hash=?""",
-            (tx_hash,),
+            """SELECT id FROM txs WHERE tx_hash IN (?, ?)""",
+            (tx_hash.upper(), raw_hash),
         )
         data = self.cur.fetchone()
         if data is None:
@@ -309,6 +877,15 @@ class Database:
 
         return self.get_tx(data[0])
 
+    def _tx(self, fields: list[str], row: tuple, cached: bool = True) -> Tx:
+        """A Tx from a row of `fields` columns, in text form. The Tx fields not read are ""."""
+        tx = {column: "" for column in TX_COLUMNS}
+        tx.update(zip(fields, row))
+        tx["tx_amino"] = _amino_text(tx["tx_amino"])
+        tx["tx_hash"] = _hash_text(tx["tx_hash"])
+        tx["tx_json"] = self.tx_json_text(tx["tx_json"], cached)
+        return Tx(**tx)
+
     def get_tx(self, tx_id: int) -> Tx | None:
         self.cur.execute(
             """SELECT * FROM txs WHERE id=?""",
@@ -318,7 +895,7 @@ class Database:
         if data is None:
             return None
 
-        return Tx(data[0], data[1], data[2], data[3], data[4], data[5], data[6] or "")
+        return self._tx(TX_COLUMNS, data[:7])
 
     def get_tx_specific(self, tx_id: int, fields: list[str]):
         self.cur.execute(
@@ -329,17 +906,8 @@ class Database:
         if data is None:
             return None
 
-        # save fields in a dict
-        tx = {}
-        for i in range(len(fields)):
-            tx[fields[i]] = data[i]
-
-        # fill in the missing fields with empty strings
-        for tx_type in Tx.__annotations__.keys():
-            if tx_type not in tx:
-                tx[tx_type] = ""
-
-        return Tx(**tx)
+        # the missing fields are empty strings
+        return self._tx(fields, data)
 
     def get_txs_from_address_in_range(self, address: str) -> list[dict]:
         txs: list[dict] = []
@@ -382,7 +950,7 @@ class Database:
             return txs
 
         for tx in data:
-            txs.append(Tx(tx[0], tx[1], tx[2], tx[3], tx[4], tx[5], tx[6] or ""))
+            txs.append(self._tx(TX_COLUMNS, tx[:7], cached=False))
 
         return txs
 
@@ -395,59 +963,66 @@ class Database:
         return self.get_tx(data[0])
 
     # Rename this to _in_block_range. As a user could also _in_id_range
-    def get_txs_in_range(self, start_height: int, end_height: int) -> list[Tx]:
-        start = time.time()
+    def get_txs_in_range(
+        self, start_height: int, end_height: int, fields: list[str] | None = None
+    ) -> list[Tx]:
+        """
+        Every Tx in the range, in (height, id) order, with 1 range scan of the txs_height index.
+        fields: the Tx columns to read (default all), the others are "". Leave out tx_amino / tx_json
+        when they are not needed, (id, height, msg_types, address) is read from the index alone.
+        """
+        fields = TX_COLUMNS if fields is None else fields
+        unknown = [f for f in fields if f not in TX_COLUMNS]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown Tx fields: {unknown}")
 
-        tx_ids = {}
-        # print("Getting txs ids from blocks")
-        for block_index in range(start_height, end_height + 1):
-            b = self.get_block(block_index)
-            if b:
-                for tx_id in b.tx_ids:
-                    tx_ids[tx_id] = True
+        self.cur.execute(
+            f"""SELECT {','.join(fields)} FROM txs WHERE height BETWEEN ? AND ? ORDER BY height, id""",
+            (start_height, end_height),
+        )
 
-        txs: list[Tx] = []
-        # print("Getting Txs from found tx_ids")
-        for tx_id in tx_ids:
-            _tx = self.get_tx(tx_id)
-            if _tx:
-                txs.append(_tx)
+        return [self._tx(fields, row, cached=False) for row in self.cur.fetchall()]
 
-        # This is ~3.5x slower than above
-        # self.cur.execute(
-        #     """SELECT * FROM txs WHERE height BETWEEN ? AND ?""",
-        #     (start_height, end_height),
-        # )
-        # data = self.cur.fetchall()
-        # if data is None:
-        #     return []
-        # txs: list[Tx] = []
-        # for x in data:
-        #     txs.append(Tx(x[0], x[1], x[2], x[3], x[4], x[5]))
+    def iter_txs_to_decode(
+        self, start_height: int, end_height: int, decoder_version: str = "", chunk_size: int = 10_000
+    ) -> Iterator[list[tuple[int, int, str]]]:
+        """
+        (id, height, tx_amino) of the Txs still to decode in the range, `chunk_size` at a time in (height, id)
+        order. Txs the decode policy skipped are not, nor ones which failed on this decoder_version.
 
-        # print(f"Got {len(txs)} txs in {time.time() - start} seconds")
+        Each chunk is its own query on the txs_to_decode partial index (the policy term has to be spelled
+        out for SQLite to use it), continuing after the last row of the one before. Memory stays at 1 chunk, and Txs saved while we iterate do not shift what is left.
+        """
+        last_height, last_id = start_height, -1
+        while True:
+            self.cur.execute(
+                f"""SELECT id, height, tx_amino FROM txs WHERE tx_json='' AND decode_status!='{DECODE_POLICY}' AND height BETWEEN ? AND ? AND (height>? OR id>?) AND (decode_status='' OR (decode_status=? AND decoder_version!=?)) ORDER BY height, id LIMIT ?""",
+                (
+                    last_height,
+                    end_height,
+                    last_height,
+                    last_id,
+                    DECODE_FAILED,
+                    decoder_version,
+                    chunk_size,
+                ),
+            )
+            chunk = self.cur.fetchall()
+            if len(chunk) == 0:
+                return
 
-        return txs
+            yield [(tx_id, height, _amino_text(amino)) for tx_id, height, amino in chunk]
+            last_id, last_height = chunk[-1][0], chunk[-1][1]
 
-    def get_non_decoded_txs_in_range(
+    def get_failed_decodes(
         self, start_height: int, end_height: int
-    ) -> list[Tx]:
-        # returns all txs which have not been decoded in the json field. This field is "" if not decoded
+    ) -> list[tuple[int, int, int, str, str]]:
+        """(id, height, decode_attempts, decoder_version, decode_error) of Txs no decoder could handle"""
         self.cur.execute(
-            """SELECT * FROM txs WHERE height BETWEEN ? AND ?""",
-            (start_height, end_height),
+            """SELECT id, height, decode_attempts, decoder_version, decode_error FROM txs WHERE height BETWEEN ? AND ? AND decode_status=? ORDER BY id""",
+            (start_height, end_height, DECODE_FAILED),
         )
-        data = self.cur.fetchall()
-        if data is None:
-            return []
-
-        txs: list[Tx] = []
-        for x in data:
-            # check if tx_json is "", if so, add it to the array
-            if len(x[4]) == 0:
-                txs.append(Tx(x[0], x[1], x[2], x[3], x[4], x[5], x[6]))
-
-        return txs
+        return self.cur.fetchall()
 
     # def get_users_txs_in_range(
     #     self, address: str, start_height: int, end_height: int
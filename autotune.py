@@ -0,0 +1,118 @@
+"""
+AIMD (additive increase, multiplicative decrease) tuning of the download load, like TCP congestion control.
+
+Instead of hand tuning max_in_flight / rpc_batch_size per RPC, every endpoint gets a window of open
+requests which grows while the node keeps up and shrinks as soon as it struggles:
+- slow start: the window doubles every clean round until the first sign of congestion.
+- then +1 per clean round (a round is `window` finished requests).
+- a round with failures (timeouts, 429, 5xx, connection errors) halves it.
+- a round whose p90 latency is `latency_tolerance`x the best p50 seen shrinks it by 20%,
+  the node is queueing our requests before it starts failing them.
+
+BatchSizeTuner does the same for the number of heights per JSON-RPC batch, against a target latency.
+"""
+
+import statistics
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class AIMDWindow:
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_tolerance: float = 3.0,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.value = min(self.maximum, max(self.minimum, initial))
+        self.latency_tolerance = latency_tolerance
+
+        self.slow_start = True
+        self.baseline = 0.0  # best round p50 latency (seconds)
+        self.round_latencies: list[float] = []
+        self.round_failures = 0
+
+        self.increases = 0
+        self.decreases = 0
+
+    def observe(self, ok: bool, latency: float | None = None):
+        if ok and latency is not None:
+            self.round_latencies.append(latency)
+        elif not ok:
+            self.round_failures += 1
+
+        if len(self.round_latencies) + self.round_failures >= self.value:
+            self._end_round()
+
+    def _end_round(self):
+        latencies, failures = self.round_latencies, self.round_failures
+        self.round_latencies, self.round_failures = [], 0
+
+        if failures > 0:
+            self._decrease(0.5)
+            return
+
+        if len(latencies) == 0:
+            return
+
+        p50 = statistics.median(latencies)
+        p90 = percentile(latencies, 0.9)
+        if self.baseline == 0 or p50 < self.baseline:
+            self.baseline = p50
+        else:
+            # let the baseline follow a node which got slower for good (5% per round)
+            self.baseline = min(p50, self.baseline * 1.05)
+
+        if p90 > self.baseline * self.latency_tolerance:
+            self._decrease(0.8)
+        else:
+            self._increase()
+
+    def _increase(self):
+        if self.value >= self.maximum:
+            return
+
+        if self.slow_start:
+            self.value = min(self.maximum, self.value * 2)
+        else:
+            self.value = min(self.maximum, self.value + 1)
+        self.increases += 1
+
+    def _decrease(self, factor: float):
+        self.slow_start = False
+        self.value = max(self.minimum, int(self.value * factor))
+        self.decreases += 1
+
+    def __repr__(self) -> str:
+        return f"{self.value}"
+
+
+class BatchSizeTuner:
+    """
+    Heights per JSON-RPC batch. Grows by `step` while batches come back within target_seconds,
+    halves when one fails or is slower (too large for the node's timeouts / max body size).
+    """
+
+    def __init__(self, initial: int, maximum: int, target_seconds: float = 5.0):
+        self.maximum = max(1, maximum)
+        self.value = min(self.maximum, max(1, initial))
+        self.target_seconds = target_seconds
+        self.step = max(1, self.maximum // 20)
+
+    def observe(self, ok: bool, latency: float | None = None):
+        if ok and latency is not None and latency <= self.target_seconds:
+            self.value = min(self.maximum, self.value + self.step)
+        else:
+            self.value = max(1, self.value // 2)
+
+    def __call__(self) -> int:
+        return self.value
+
+    def __repr__(self) -> str:
+        return f"{self.value}"
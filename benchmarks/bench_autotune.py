@@ -0,0 +1,108 @@
+"""
+Static max_in_flight vs the AIMD auto tuner (autotune.py), against a stub RPC which can only serve
+`capacity` requests at once (slower past it, 429s past 2x it).
+
+python3 bench_autotune.py --blocks 3000 --latency 0.05 --capacity 20 --static 10,100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from autotune import BatchSizeTuner
+from downloader import download_in_order, fetch_block, fetch_blocks_batch
+from rpc_pool import EndpointPool
+from stub_rpc import StubChain, start_stub_rpc
+
+
+async def run(
+    url: str, heights: list[int], in_flight: int, adaptive: bool, batch_size: int
+) -> tuple[float, int, EndpointPool, BatchSizeTuner | None]:
+    pool = EndpointPool([url], in_flight, adaptive=adaptive)
+    tuner = None
+    if adaptive and batch_size > 1:
+        tuner = BatchSizeTuner(min(10, batch_size), batch_size, target_seconds=1)
+    saved = 0
+
+    def write(values):
+        nonlocal saved
+        saved += len([v for v in values if v is not None])
+
+    limits = httpx.Limits(max_connections=in_flight)
+    async with httpx.AsyncClient(limits=limits) as client:
+
+        async def fetch(height: int):
+            return await fetch_block(client, pool, height)
+
+        async def fetch_many(batch: list[int]):
+            return await fetch_blocks_batch(client, pool, batch, tuner=tuner)
+
+        start = time.perf_counter()
+        await download_in_order(
+            heights,
+            fetch,
+            write,
+            max_in_flight=in_flight,
+            batch_size=1_000,
+            fetch_many=fetch_many if batch_size > 1 else None,
+            fetch_many_size=tuner or batch_size,
+            max_requeue=10,
+        )
+        return time.perf_counter() - start, saved, pool, tuner
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=3_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per HTTP request")
+    parser.add_argument("--capacity", type=int, default=20, help="requests the stub serves at once")
+    parser.add_argument("--static", type=str, default="10,100", help="static max_in_flight to compare")
+    parser.add_argument("--ceiling", type=int, default=100, help="max_in_flight of the adaptive run")
+    parser.add_argument("--batch-size", type=int, default=1, help="> 1 also tunes the JSON-RPC batch size")
+    parser.add_argument("--txs-per-block", type=int, default=5)
+    args = parser.parse_args()
+
+    chain = StubChain(
+        latest_height=args.blocks,
+        txs_per_block=args.txs_per_block,
+        latency=args.latency,
+        capacity=args.capacity,
+    )
+    server, url = start_stub_rpc(chain)
+    heights = list(range(1, args.blocks + 1))
+
+    print(
+        f"{args.blocks:,} blocks, {args.latency}s per request, stub capacity {args.capacity} requests"
+    )
+    runs = [(int(x), False) for x in args.static.split(",")] + [(args.ceiling, True)]
+    for in_flight, adaptive in runs:
+        chain.requests, chain.rejected = 0, 0
+        seconds, saved, pool, tuner = asyncio.run(
+            run(url, heights, in_flight, adaptive, args.batch_size)
+        )
+
+        name = f"static {in_flight}"
+        if adaptive:
+            window = pool.endpoints[0].window
+            name = f"AIMD <= {in_flight}"
+            name += f" (window {window}, {window.increases} up / {window.decreases} down"
+            if tuner is not None:
+                name += f", batch {tuner}"
+            name += ")"
+        print(
+            f"{name:>50}: {seconds:7.2f}s  {saved / seconds:8.1f} blocks/s  {chain.rejected:,} 429s  ({saved:,} saved)"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
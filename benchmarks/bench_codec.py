@@ -0,0 +1,114 @@
+"""
+Micro benchmark of the JSON codec (codec.py) over real shaped payloads.
+
+- /block responses (pretty printed like Tendermint returns them), small & multi MB.
+- decoded Tx JSON (what the decoder returns and what the scripts read back from tx_json).
+
+python3 bench_codec.py --loops 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import codec
+from stub_rpc import StubChain
+
+TX_JSON = {
+    "body": {
+        "messages": [
+            {
+                "@type": "/cosmwasm.wasm.v1.MsgExecuteContract",
+                "sender": "juno1k0hmfxjj3thuc47057cxuhxneu8rmseudyg9dd",
+                "contract": "juno1mkw83sv6c7sjdvsaplrzc8yaes9l42p4mhy0ssuxjnyzl87c9eps7ce3m9",
+                "msg": {"swap": {"input_token": "Token1", "input_amount": "1000000", "min_output": "987654"}},
+                "funds": [{"denom": "ujuno", "amount": "1000000"}],
+            }
+        ],
+        "memo": "",
+        "timeout_height": "0",
+        "extension_options": [],
+        "non_critical_extension_options": [],
+    },
+    "auth_info": {
+        "signer_infos": [
+            {
+                "public_key": {
+                    "@type": "/cosmos.crypto.secp256k1.PubKey",
+                    "key": "A3j3UeRAXrPYBw3tR1aJSDgKdK/eqx2CyYupKIUNEpkd",
+                },
+                "mode_info": {"single": {"mode": "SIGN_MODE_DIRECT"}},
+                "sequence": "12",
+            }
+        ],
+        "fee": {
+            "amount": [{"denom": "ujuno", "amount": "5000"}],
+            "gas_limit": "200000",
+            "payer": "",
+            "granter": "",
+        },
+    },
+    "signatures": [
+        "zyhDeoEIUHFgxqM2Fgpx57gR2xr156UlTYa3uDmip6Fx8FKgH/PvOyth9k1Um55OAuPOdORk8mAnoHuIPHxJWg=="
+    ],
+}
+
+
+def block_response(txs_per_block: int, tx_size: int) -> bytes:
+    chain = StubChain(txs_per_block=txs_per_block, tx_size=tx_size)
+    response = {"jsonrpc": "2.0", "id": -1, "result": chain.block_result(7_000_000)}
+    return json.dumps(response, indent=2).encode()
+
+
+def stdlib_block(raw: bytes):
+    v = json.loads(raw)["result"]["block"]
+    return v["header"]["time"], v["data"]["txs"]
+
+
+def full_block(raw: bytes):
+    v = codec.loads(raw)["result"]["block"]
+    return v["header"]["time"], v["data"]["txs"]
+
+
+def bench(name: str, func, payload, loops: int, size: int):
+    start = time.perf_counter()
+    for _ in range(loops):
+        func(payload)
+    seconds = time.perf_counter() - start
+    print(
+        f"  {name:<32} {seconds / loops * 1_000_000:10.1f}us/op  {size * loops / seconds / 1_000_000:8.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loops", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"codec backend: {codec.BACKEND}")
+
+    for txs, tx_size in [(0, 0), (20, 500), (300, 8_000)]:
+        raw = block_response(txs, tx_size)
+        assert codec.block_time_and_txs(raw) == stdlib_block(raw)
+        print(f"/block response, {txs} txs of {tx_size} bytes ({len(raw) / 1_000_000:.2f} MB)")
+        bench("json.loads (old r.json())", stdlib_block, raw, args.loops, len(raw))
+        bench("codec.loads", full_block, raw, args.loops, len(raw))
+        bench("codec.block_time_and_txs", codec.block_time_and_txs, raw, args.loops, len(raw))
+
+    tx_str = json.dumps(TX_JSON)
+    loops = args.loops * 100
+    print(f"decoded Tx JSON ({len(tx_str)} bytes)")
+    bench("json.loads", json.loads, tx_str, loops, len(tx_str))
+    bench("codec.loads", codec.loads, tx_str, loops, len(tx_str))
+    bench("json.dumps", json.dumps, TX_JSON, loops, len(tx_str))
+    bench("codec.dumps", codec.dumps, TX_JSON, loops, len(tx_str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Finding the Txs left to decode in a mostly decoded txs table: the old full range `SELECT *` + filter in
+Python vs Database.iter_txs_to_decode (txs_to_decode partial index, chunks of --chunk-size).
+Reports the time to the first chunk, the full pass and the peak Python memory of each.
+
+Txs the decode policy skipped (--policy) and Txs which failed on the current decoder version (--failed) stay
+undecoded for good, they are never returned. The queue should not get slower as they pile up.
+
+python3 bench_decode_queue.py --txs 500000 --undecoded 0.01
+python3 bench_decode_queue.py --txs 400000 --undecoded 0 --policy 0.4 --failed 0.05
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from chain_types import DECODE_FAILED, DECODE_POLICY
+from SQL import Database
+
+TXS_PER_BLOCK = 10
+VERSION = "bench"
+INSERT = """INSERT INTO txs (id, height, tx_amino, msg_types, tx_json, decode_status, decoder_version) VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+
+def build(path: str, txs: int, undecoded: float, policy: float, failed: float, tx_json_size: int):
+    db = Database(path)
+    db.create_tables()
+
+    rng = random.Random(1)
+    tx_json = "{" + "x" * (tx_json_size - 2) + "}"
+    rows = []
+    for i in range(1, txs + 1):
+        r = rng.random()
+        height = i // TXS_PER_BLOCK + 1
+        if r < undecoded:
+            rows.append((i, height, "A" * 300, "", "", "", ""))
+        elif r < undecoded + policy:
+            rows.append((i, height, "A" * 300, "", "", DECODE_POLICY, VERSION))
+        elif r < undecoded + policy + failed:
+            rows.append((i, height, "A" * 300, "", "", DECODE_FAILED, VERSION))
+        else:
+            rows.append((i, height, "A" * 300, '["/cosmos.bank.v1beta1.MsgSend"]', tx_json, "", VERSION))
+
+        if len(rows) == 50_000:
+            db.cur.executemany(INSERT, rows)
+            rows = []
+    db.cur.executemany(INSERT, rows)
+    db.commit()
+    db.optimize_tables()
+    db.conn.close()
+
+
+def full_range(db: Database, end: int, chunk_size: int):
+    """What get_non_decoded_txs_in_range did: every column of every Tx, filtered in Python."""
+    db.cur.execute("""SELECT * FROM txs WHERE height BETWEEN ? AND ?""", (0, end))
+    columns = [c[0] for c in db.cur.description]
+    tx_json, status, version = (columns.index(c) for c in ("tx_json", "decode_status", "decoder_version"))
+    txs = [
+        x
+        for x in db.cur.fetchall()
+        if len(x[tx_json]) == 0
+        and (x[status] == "" or (x[status] == DECODE_FAILED and x[version] != VERSION))
+    ]
+    for i in range(0, len(txs), chunk_size):
+        yield txs[i : i + chunk_size]
+
+
+def index_entries(db: Database) -> int:
+    """Rows in the txs_to_decode index, what every pass of the queue walks"""
+    db.cur.execute("""SELECT sql FROM sqlite_master WHERE name='txs_to_decode'""")
+    where = db.cur.fetchone()[0].split(" WHERE ", 1)[1]
+    db.cur.execute(f"""SELECT COUNT(*) FROM txs WHERE {where}""")
+    return db.cur.fetchone()[0]
+
+
+def measure(name: str, chunks) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    found = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        found += len(chunk)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:<18} first chunk {(first or 0) * 1000:9.2f}ms  all {seconds * 1000:9.2f}ms  "
+        f"{found:,} Txs  peak {peak / 1e6:7.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=500_000)
+    parser.add_argument("--undecoded", type=float, default=0.01, help="share of Txs not decoded yet")
+    parser.add_argument("--policy", type=float, default=0.0, help="share of Txs the decode policy skipped")
+    parser.add_argument("--failed", type=float, default=0.0, help="share of Txs failed on this decoder version")
+    parser.add_argument("--tx-json-size", type=int, default=1_500)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "data.db")
+        build(path, args.txs, args.undecoded, args.policy, args.failed, args.tx_json_size)
+        end = args.txs // TXS_PER_BLOCK + 1
+        print(
+            f"{args.txs:,} Txs, {args.undecoded * 100:g}% not decoded, {args.policy * 100:g}% policy, "
+            f"{args.failed * 100:g}% failed, {os.path.getsize(path) / 1e6:.0f} MB"
+        )
+
+        db = Database(path)
+        print(f"txs_to_decode index: {index_entries(db):,} rows")
+        measure("SELECT * + filter", full_range(db, end, args.chunk_size))
+        measure("iter_txs_to_decode", db.iter_txs_to_decode(0, end, VERSION, args.chunk_size))
+        db.conn.close()
+
+
+if __name__ == "__main__":
+    main()
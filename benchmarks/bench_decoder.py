@@ -0,0 +1,92 @@
+"""
+decode-file (temp files + 1 process per batch) vs decode-stream (1 long lived process), with the fake decoder.
+Then a full decode over DecoderPools of 1..N decoders (COSMOS_PROTO_DECODE_WORKERS).
+
+python3 bench_decoder.py --txs 20000 --batch-sizes 10,1000,10000 --workers 1,2,4 --decode-us 50
+"""
+
+import argparse
+import base64
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from decoding import DecoderPool, StreamDecoder, run_decoder
+
+FAKE_DECODER = os.path.join(current_dir, "fake_juno_decode.py")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=20_000)
+    parser.add_argument("--tx-size", type=int, default=400, help="bytes of amino per Tx")
+    parser.add_argument("--batch-sizes", type=str, default="10,1000,10000")
+    parser.add_argument("--binary", type=str, default=FAKE_DECODER)
+    parser.add_argument("--workers", type=str, default="1,2,4", help="DecoderPool sizes to compare")
+    parser.add_argument("--pool-batch-size", type=int, default=1_000)
+    parser.add_argument("--decode-us", type=float, default=0, help="fake decoder CPU microseconds per Tx")
+    args = parser.parse_args()
+
+    os.environ["FAKE_DECODE_US_PER_TX"] = str(args.decode_us)
+
+    rng = random.Random(1)
+    txs = [
+        {"id": i, "tx": base64.b64encode(rng.randbytes(args.tx_size)).decode()}
+        for i in range(args.txs)
+    ]
+    tmp_dir = tempfile.mkdtemp()
+
+    print(f"{args.txs:,} Txs of {args.tx_size} bytes, {args.binary}")
+    for batch_size in [int(x) for x in args.batch_sizes.split(",")]:
+        batches = [txs[i : i + batch_size] for i in range(0, len(txs), batch_size)]
+        if batch_size < 100:
+            # 1 process per batch, keep the run short
+            batches = batches[:200]
+        count = sum(len(b) for b in batches)
+
+        start = time.perf_counter()
+        for batch in batches:
+            run_decoder(args.binary, batch, tmp_dir)
+        file_seconds = time.perf_counter() - start
+
+        decoder = StreamDecoder(args.binary, tmp_dir)
+        decoder.decode(batches[0][:1])  # started before the clock, it lives for the whole run
+        start = time.perf_counter()
+        for batch in batches:
+            decoder.decode(batch)
+        stream_seconds = time.perf_counter() - start
+        decoder.close()
+
+        print(
+            f"batch {batch_size:>6,}: decode-file {count / file_seconds:10.1f} txs/s   "
+            f"decode-stream {count / stream_seconds:10.1f} txs/s   ({len(batches):,} batches)"
+        )
+
+    batches = [
+        txs[i : i + args.pool_batch_size] for i in range(0, len(txs), args.pool_batch_size)
+    ]
+    print(f"cores: {os.cpu_count()}")
+    for workers in [int(x) for x in args.workers.split(",")]:
+        pool = DecoderPool(args.binary, tmp_dir, workers)
+        # start every decoder before the clock
+        list(pool.imap([batches[0][:1]] * workers))
+
+        start = time.perf_counter()
+        decoded = sum(len(values) for _, values, _ in pool.imap(batches))
+        seconds = time.perf_counter() - start
+        pool.close()
+
+        print(f"{workers:>3} decoders: {decoded / seconds:10.1f} txs/s  ({len(batches):,} batches of {args.pool_batch_size:,})")
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+txs/s of fast_decode.py alone, then of a DecoderPool with and without it (COSMOS_PROTO_FAST_DECODE),
+over proto_tx.py Txs with the fake decoder.
+
+python3 bench_fast_decode.py --txs 20000 --unknown-rate 0.1 --decode-us 50
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import codec
+from decoding import DecoderPool
+from fast_decode import decode_tx
+from proto_tx import synthetic_tx
+
+FAKE_DECODER = os.path.join(current_dir, "fake_juno_decode.py")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=20_000)
+    parser.add_argument("--unknown-rate", type=float, default=0.1, help="share of Txs only the binary decodes")
+    parser.add_argument("--binary", type=str, default=FAKE_DECODER)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    parser.add_argument("--decode-us", type=float, default=0, help="fake decoder CPU microseconds per Tx")
+    args = parser.parse_args()
+
+    os.environ["FAKE_DECODE_US_PER_TX"] = str(args.decode_us)
+
+    rng = random.Random(1)
+    txs = [synthetic_tx(rng, args.unknown_rate)[0] for _ in range(args.txs)]
+    print(f"{args.txs:,} Txs, {args.unknown_rate * 100:.0f}% unknown, {codec.BACKEND} ({args.binary})")
+
+    start = time.perf_counter()
+    fast = sum(decode_tx(tx) is not None for tx in txs)
+    seconds = time.perf_counter() - start
+    print(f"fast_decode only: {args.txs / seconds:10.1f} txs/s  ({fast:,} decoded in process)")
+
+    tmp_dir = tempfile.mkdtemp()
+    batches = [
+        [{"id": i + j, "tx": tx} for j, tx in enumerate(txs[i : i + args.batch_size])]
+        for i in range(0, len(txs), args.batch_size)
+    ]
+    for use_fast in (False, True):
+        pool = DecoderPool(args.binary, tmp_dir, fast=use_fast)
+        pool.decode(batches[0][:1])  # decoder started before the clock
+
+        start = time.perf_counter()
+        decoded = sum(len(values) for _, values, _ in pool.imap(batches))
+        seconds = time.perf_counter() - start
+        pool.close()
+
+        print(
+            f"DecoderPool fast={use_fast!s:<5}: {decoded / seconds:10.1f} txs/s  "
+            f"({pool.fast_decoded:,} in process, {pool.binary_decoded:,} by the binary)"
+        )
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
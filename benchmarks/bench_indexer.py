@@ -0,0 +1,313 @@
+"""
+End to end benchmark of main.py (download, decode, then sync) against the local stub RPC and the fake decoder.
+Nothing touches a real archive node, so runs can be compared before and after a change.
+
+python3 bench_indexer.py --blocks 5000 --txs-per-block 10 --latency 0.05
+python3 bench_indexer.py --recorded-dir recorded  # real blocks saved by record_blocks.py
+
+main.py runs unmodified as a subprocess, from a throwaway copy of the repo with a generated
+chain_config.json. Reports blocks/s, txs/s, p50 / p99 of each stage (main.py's STATS_FILE) and the peak RSS
+of every task.
+"""
+
+import argparse
+import glob
+import json
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from stub_rpc import StubChain, start_stub_rpc
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+
+FAKE_DECODER = os.path.join(current_dir, "fake_juno_decode.py")
+STATS_FILE = "bench_stats.json"
+
+
+class IndexerRun:
+    """`python3 main.py bench` in a subprocess. Every output line is timestamped as it arrives."""
+
+    def __init__(self, workdir: str, env: dict, verbose: bool = False):
+        self.verbose = verbose
+        self.start = time.time()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", "main.py", "bench"],
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        self.lines: queue.Queue[tuple[float, str | None]] = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self.lines.put((time.time(), line.rstrip()))
+        self.lines.put((time.time(), None))
+
+    def wait_for(self, pattern: str | None, timeout: float) -> tuple[float, re.Match | None]:
+        """
+        Waits for an output line matching pattern. Returns (time, match), match is None if main.py
+        exited first. pattern=None waits for main.py to exit.
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                t, line = self.lines.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                raise TimeoutError(f"main.py did not print {pattern!r} within {timeout}s")
+
+            if line is None:
+                return t, None
+            if self.verbose:
+                print(f"    | {line}")
+
+            if pattern is not None:
+                match = re.search(pattern, line)
+                if match is not None:
+                    return t, match
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc.wait()
+
+
+def make_workdir() -> str:
+    workdir = tempfile.mkdtemp(prefix="indexer-bench-")
+    for path in glob.glob(os.path.join(parent, "*.py")):
+        shutil.copy(path, workdir)
+    return workdir
+
+
+def write_config(workdir: str, task: str, url: str, end: int, args):
+    config = {
+        "COSMOS_PROTO_DECODE_BINARY": FAKE_DECODER,
+        "COSMOS_PROTO_DECODE_LIMIT": args.decode_limit,
+        "COSMOS_PROTO_DECODE_BLOCK_LIMIT": 10_000,
+        "COSMOS_PROTO_DECODE_WORKERS": args.decode_workers,
+        "DECODE_ON_DOWNLOAD": args.decode_on_download,
+        "DECODE_EXCLUDE_TYPES": [t for t in args.exclude_types.split(",") if t != ""],
+        "TX_AMINO_LENGTH_CUTTOFF_LIMIT": 0,
+        "STATS_FILE": STATS_FILE,
+        "TASK": task,
+        "sections": {
+            "bench": {
+                "start": 1,
+                "end": end,
+                "grouping": args.grouping,
+                "max_in_flight": args.max_in_flight,
+                "max_in_flight_per_endpoint": args.max_in_flight,
+                "rpc_batch_size": args.rpc_batch_size,
+                "adaptive": not args.static,
+                "rpc_endpoints": [url],
+            }
+        },
+    }
+    with open(os.path.join(workdir, "chain_config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+    # stats of the previous task
+    if os.path.exists(os.path.join(workdir, STATS_FILE)):
+        os.remove(os.path.join(workdir, STATS_FILE))
+
+
+def db_counts(workdir: str) -> tuple[int, int, int]:
+    """(blocks, txs, decoded txs) in the run's data.db"""
+    conn = sqlite3.connect(os.path.join(workdir, "data.db"))
+    try:
+        blocks = conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+        txs, decoded = conn.execute(
+            "SELECT COUNT(*), COUNT(NULLIF(tx_json, '')) FROM txs"
+        ).fetchone()
+    finally:
+        conn.close()
+    return blocks, txs, decoded
+
+
+def read_stats(workdir: str) -> dict:
+    path = os.path.join(workdir, STATS_FILE)
+    if not os.path.exists(path):
+        return {"stages": {}, "peak_rss_mb": 0.0}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:9.2f}ms"
+
+
+def report(task: str, seconds: float, blocks: int, txs: int, stats: dict, extra: dict | None = None):
+    print(
+        f"{task:<9} {blocks:>8,} blocks {txs:>10,} txs {seconds:8.2f}s "
+        f"{blocks / seconds:10.1f} blocks/s {txs / seconds:10.1f} txs/s  "
+        f"peak RSS {stats['peak_rss_mb']:.1f} MB"
+    )
+
+    stages = dict(stats["stages"])
+    stages.update(extra or {})
+    for stage, s in stages.items():
+        print(f"    {stage:<12} p50 {ms(s['p50'])}  p99 {ms(s['p99'])}  ({s['count']:,})")
+
+
+def run_download(workdir: str, env: dict, url: str, end: int, args) -> int:
+    write_config(workdir, "download", url, end, args)
+    run = IndexerRun(workdir, env, args.verbose)
+    try:
+        t, match = run.wait_for(r"Finished #", args.timeout)
+    finally:
+        run.stop()
+    if match is None:
+        print("download: main.py exited before finishing, run with --verbose")
+        exit(1)
+
+    blocks, txs, _ = db_counts(workdir)
+    report("download", t - run.start, blocks, txs, read_stats(workdir))
+    return blocks
+
+
+def run_decode(workdir: str, env: dict, url: str, end: int, args):
+    write_config(workdir, "decode", url, end, args)
+    _, _, decoded_before = db_counts(workdir)
+
+    run = IndexerRun(workdir, env, args.verbose)
+    try:
+        # the decode task exits once every Tx in the range is decoded
+        t, _ = run.wait_for(None, args.timeout)
+    finally:
+        run.stop()
+
+    blocks, _, decoded = db_counts(workdir)
+    report("decode", t - run.start, blocks, decoded - decoded_before, read_stats(workdir))
+
+
+def run_sync(workdir: str, env: dict, url: str, chain: StubChain, end: int, args):
+    write_config(workdir, "sync", url, end, args)
+    blocks_before, txs_before, _ = db_counts(workdir)
+
+    run = IndexerRun(workdir, env, args.verbose)
+    tip_latencies: list[float] = []
+    try:
+        # caught up & listening (polling fallback prints no line, give it a moment instead)
+        try:
+            run.wait_for(r"Subscribed to NewBlock", 15)
+        except TimeoutError:
+            pass
+
+        produce_start = time.time()
+        chain.produce(args.sync_blocks, args.block_interval)
+        saved = 0
+        while saved < args.sync_blocks:
+            t, match = run.wait_for(r"Tip ([\d,]+) saved", args.timeout)
+            if match is None:
+                print("sync: main.py exited, run with --verbose")
+                exit(1)
+
+            height = int(match.group(1).replace(",", ""))
+            if height in chain.produced_at:
+                tip_latencies.append(t - chain.produced_at[height])
+            saved = height - end
+    finally:
+        run.stop()
+
+    blocks, txs, _ = db_counts(workdir)
+    extra = {}
+    if len(tip_latencies) > 0:
+        ordered = sorted(tip_latencies)
+        extra["tip"] = {
+            "count": len(ordered),
+            "p50": statistics.median(ordered),
+            "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        }
+    report(
+        "sync",
+        time.time() - produce_start,
+        blocks - blocks_before,
+        txs - txs_before,
+        read_stats(workdir),
+        extra,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=2_000)
+    parser.add_argument("--txs-per-block", type=int, default=10)
+    parser.add_argument("--tx-size", type=int, default=400, help="bytes of the unknown message Txs")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per HTTP request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=0, help="requests the stub serves at once (0 = no limit)")
+    parser.add_argument("--recorded-dir", type=str, default="", help="serve blocks saved by record_blocks.py")
+    parser.add_argument("--decode-us", type=float, default=0, help="fake decoder CPU microseconds per Tx")
+    parser.add_argument("--grouping", type=int, default=500)
+    parser.add_argument("--max-in-flight", type=int, default=50)
+    parser.add_argument("--rpc-batch-size", type=int, default=1)
+    parser.add_argument("--static", action="store_true", help="disable AIMD tuning")
+    parser.add_argument("--decode-limit", type=int, default=10_000)
+    parser.add_argument("--decode-workers", type=int, default=1)
+    parser.add_argument("--decode-on-download", action="store_true", help="decode in the download pipeline")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of Txs the fake decoder errors on")
+    parser.add_argument("--exclude-types", type=str, default="", help="DECODE_EXCLUDE_TYPES, comma separated")
+    parser.add_argument("--sync-blocks", type=int, default=20, help="0 skips the sync benchmark")
+    parser.add_argument("--block-interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--tasks", type=str, default="download,decode,sync")
+    parser.add_argument("--keep", action="store_true", help="keep the work dir (data.db, logs)")
+    parser.add_argument("--verbose", action="store_true", help="print main.py's output")
+    args = parser.parse_args()
+
+    chain = StubChain(
+        latest_height=args.blocks,
+        txs_per_block=args.txs_per_block,
+        tx_size=args.tx_size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        capacity=args.capacity,
+        recorded_dir=args.recorded_dir,
+    )
+    server, url = start_stub_rpc(chain)
+    end = chain.latest_height
+
+    env = dict(os.environ)
+    env["FAKE_DECODE_US_PER_TX"] = str(args.decode_us)
+    env["FAKE_DECODE_FAIL_RATE"] = str(args.fail_rate)
+
+    workdir = make_workdir()
+    tasks = args.tasks.split(",")
+    print(
+        f"{end:,} blocks x {args.txs_per_block} Txs, {args.latency}s per request, "
+        f"{args.error_rate * 100}% errors, max_in_flight {args.max_in_flight}, "
+        f"rpc_batch_size {args.rpc_batch_size}, grouping {args.grouping} ({workdir})"
+    )
+    try:
+        if "download" in tasks:
+            run_download(workdir, env, url, end, args)
+        if "decode" in tasks:
+            run_decode(workdir, env, url, end, args)
+        if "sync" in tasks and args.sync_blocks > 0:
+            run_sync(workdir, env, url, chain, end, args)
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
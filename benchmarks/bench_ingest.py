@@ -0,0 +1,116 @@
+"""
+Saving downloaded (and decoded) blocks: the old insert_tx per Tx (lastrowid for the block's txs list) +
+UPDATE per decoded Tx + insert_block per height vs Database.insert_block_rows (reserved id range,
+1 executemany per table). Each runs on a fresh data.db with the usual indexes & pragmas (WAL), 1 commit per
+--batch blocks.
+
+python3 bench_ingest.py --blocks 20000 --txs-per-block 10 --decoded 0.5
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from chain_types import TxDecode
+from SQL import UPDATE_TX_DECODE, Database, _decode_params
+
+
+def make_rows(blocks: int, txs_per_block: int, decoded: float, amino_size: int) -> list[tuple]:
+    """(height, time, [(amino, TxDecode | None)]) like decoding.block_rows"""
+    rng = random.Random(1)
+    rows = []
+    for height in range(1, blocks + 1):
+        txs = []
+        for _ in range(txs_per_block):
+            amino = base64.b64encode(rng.randbytes(amino_size)).decode()
+            decode = None
+            if rng.random() < decoded:
+                sender = f"juno1{rng.getrandbits(160):040x}"
+                decode = TxDecode(
+                    height,
+                    tx_json='{"body":{"messages":[{"@type":"/cosmos.bank.v1beta1.MsgSend"}]}}',
+                    msg_types='["/cosmos.bank.v1beta1.MsgSend"]',
+                    sender=sender,
+                    fields=[
+                        (0, 0, "/cosmos.bank.v1beta1.MsgSend", "from_address", sender),
+                        (0, 0, "/cosmos.bank.v1beta1.MsgSend", "to_address", f"juno1{rng.getrandbits(160):040x}"),
+                    ],
+                    messages=[(0, 0, "/cosmos.bank.v1beta1.MsgSend", sender)],
+                )
+            txs.append((amino, decode))
+        rows.append((height, "2023-01-01T00:00:00Z", txs))
+    return rows
+
+
+def row_at_a_time(db: Database, rows: list[tuple]):
+    """What insert_block_rows did."""
+    for height, block_time, txs in rows:
+        sql_tx_ids: list[int] = []
+        for amino, decoded in txs:
+            unique_id = db.insert_tx(height, amino)
+            if decoded is not None:
+                db.cur.execute(UPDATE_TX_DECODE, _decode_params(unique_id, decoded, decoded.tx_json))
+                db.insert_msg_fields(unique_id, height, decoded.fields)
+                db.insert_messages(unique_id, height, decoded.messages)
+            sql_tx_ids.append(unique_id)
+
+        db.insert_block(height, block_time, sql_tx_ids)
+
+
+def measure(name: str, save, rows: list[tuple], batch: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, "data.db"))
+        db.create_tables()
+        db.optimize_tables()
+        db.optimize_db(vacuum=False)
+        db.commit()
+
+        txs = sum(len(t) for _, _, t in rows)
+        start = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            save(db, rows[i : i + batch])
+            db.commit()
+        seconds = time.perf_counter() - start
+
+        db.cur.execute("""SELECT COUNT(*), MAX(id) FROM txs""")
+        saved, max_id = db.cur.fetchone()
+        # txs + blocks + msg_fields + messages
+        db.cur.execute(
+            """SELECT (SELECT COUNT(*) FROM blocks) + (SELECT COUNT(*) FROM msg_fields) + (SELECT COUNT(*) FROM messages)"""
+        )
+        written = saved + db.cur.fetchone()[0]
+        db.conn.close()
+
+    assert saved == txs == max_id, (saved, txs, max_id)
+    print(
+        f"{name:<20} {seconds:8.2f}s  {len(rows) / seconds:10,.0f} blocks/s  {txs / seconds:10,.0f} txs/s  "
+        f"{written / seconds:10,.0f} rows/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=20_000)
+    parser.add_argument("--txs-per-block", type=int, default=10)
+    parser.add_argument("--decoded", type=float, default=0.5, help="share of Txs decoded on download")
+    parser.add_argument("--amino-size", type=int, default=400, help="bytes per Tx before base64")
+    parser.add_argument("--batch", type=int, default=1_000, help="blocks per commit")
+    args = parser.parse_args()
+
+    rows = make_rows(args.blocks, args.txs_per_block, args.decoded, args.amino_size)
+    print(f"{args.blocks:,} blocks, {args.blocks * args.txs_per_block:,} Txs, {args.decoded * 100:g}% decoded")
+
+    measure("row at a time", row_at_a_time, rows, args.batch)
+    measure("insert_block_rows", lambda db, batch: db.insert_block_rows(batch), rows, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Single GET /block per height vs JSON-RPC batches, against the local stub RPC.
+
+python3 bench_rpc_batch.py --blocks 2000 --latency 0.15 --in-flight 20 --batch-sizes 10,25,50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from downloader import download_in_order, fetch_block, fetch_blocks_batch
+from rpc_pool import EndpointPool
+from stub_rpc import StubChain, start_stub_rpc
+
+
+async def run(url: str, heights: list[int], in_flight: int, batch_size: int) -> tuple[float, int]:
+    pool = EndpointPool([url], in_flight)
+    saved = 0
+
+    def write(values):
+        nonlocal saved
+        saved += len([v for v in values if v is not None])
+
+    limits = httpx.Limits(max_connections=in_flight)
+    async with httpx.AsyncClient(limits=limits) as client:
+
+        async def fetch(height: int):
+            return await fetch_block(client, pool, height)
+
+        async def fetch_many(batch: list[int]):
+            return await fetch_blocks_batch(client, pool, batch)
+
+        start = time.perf_counter()
+        await download_in_order(
+            heights,
+            fetch,
+            write,
+            max_in_flight=in_flight,
+            batch_size=1_000,
+            fetch_many=fetch_many if batch_size > 1 else None,
+            fetch_many_size=batch_size,
+        )
+        return time.perf_counter() - start, saved
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=2_000)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per HTTP request")
+    parser.add_argument("--in-flight", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=str, default="10,25,50")
+    parser.add_argument("--txs-per-block", type=int, default=5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    chain = StubChain(
+        latest_height=args.blocks,
+        txs_per_block=args.txs_per_block,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    )
+    server, url = start_stub_rpc(chain)
+    heights = list(range(1, args.blocks + 1))
+
+    print(
+        f"{args.blocks:,} blocks, {args.latency}s per request, {args.in_flight} requests in flight, {args.error_rate * 100}% errors"
+    )
+    for batch_size in [1] + [int(x) for x in args.batch_sizes.split(",")]:
+        chain.requests = 0
+        seconds, saved = asyncio.run(run(url, heights, args.in_flight, batch_size))
+        name = "single GET" if batch_size == 1 else f"batch {batch_size}"
+        print(
+            f"{name:>12}: {seconds:8.2f}s  {saved / seconds:10.1f} blocks/s  {chain.requests:,} HTTP requests  ({saved:,} saved)"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
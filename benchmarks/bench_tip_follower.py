@@ -0,0 +1,83 @@
+"""
+Tip latency of the sync task: websocket NewBlock subscription vs abci_info polling.
+
+Latency is the time between the stub RPC producing a block and the follower handing it to us.
+The websocket run also drops the connection every few blocks to exercise reconnects. Heights missed
+while reconnecting / between polls are not yielded, main.follow_tip downloads those gaps itself.
+
+python3 bench_tip_follower.py --blocks 20 --block-interval 0.5 --poll-interval 2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import tip_follower
+from rpc_pool import EndpointPool
+from stub_rpc import StubChain, start_stub_rpc
+from tip_follower import TipFollower
+
+
+async def follow(url: str, chain: StubChain, blocks: int, poll_interval: float) -> list[float]:
+    start_height = chain.latest_height
+    target = start_height + blocks
+    latencies: list[float] = []
+
+    async with httpx.AsyncClient() as client:
+        follower = TipFollower(EndpointPool([url]), client, poll_interval=poll_interval)
+        follower.last_height = start_height
+
+        chain.produce(blocks, chain.block_interval)
+        async with contextlib.aclosing(follower.follow()) as tips:
+            async for height, block in tips:
+                latencies.append(time.time() - chain.produced_at[height])
+                if height >= target:
+                    break
+
+    return latencies
+
+
+def report(name: str, latencies: list[float], blocks: int):
+    latencies = sorted(latencies)
+    print(
+        f"{name:>10}: {len(latencies)}/{blocks} tips seen, p50 {statistics.median(latencies) * 1000:8.1f}ms, max {latencies[-1] * 1000:8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--block-interval", type=float, default=0.5)
+    parser.add_argument("--poll-interval", type=float, default=2)
+    parser.add_argument("--disconnect-after", type=int, default=5)
+    args = parser.parse_args()
+
+    chain = StubChain(latest_height=1_000, txs_per_block=5)
+    chain.block_interval = args.block_interval
+    server, url = start_stub_rpc(chain)
+
+    if tip_follower.websockets is not None:
+        chain.disconnect_after = args.disconnect_after
+        report("websocket", asyncio.run(follow(url, chain, args.blocks, args.poll_interval)), args.blocks)
+    else:
+        print("websockets is not installed (pip install websockets), only polling")
+
+    chain.disconnect_after = 0
+    tip_follower.websockets = None
+    report("polling", asyncio.run(follow(url, chain, args.blocks, args.poll_interval)), args.blocks)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
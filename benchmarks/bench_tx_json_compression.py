@@ -0,0 +1,158 @@
+"""
+txs.tx_json as TEXT vs compressed with a trained zlib dictionary (tx_json_codec.py, migrations/compress_tx_json.py):
+data.db size, cold & warm scans through the Database API, repeated get_tx of hot rows (LRU) and the
+conversion itself. Cold scans drop the OS page cache first (needs root, else they are warm).
+
+python3 bench_tx_json_compression.py --txs 500000
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import codec
+from chain_types import TxDecode
+from fake_juno_decode import decode
+from SQL import Database
+from tx_json_codec import train_dictionary
+
+TXS_PER_BLOCK = 10
+
+
+def tx_json(rng: random.Random) -> str:
+    """A fake_juno_decode Tx with a signer, pubkey & signature like real ones"""
+    tx = decode(base64.b64encode(rng.randbytes(300)).decode())
+    tx["auth_info"]["signer_infos"] = [
+        {
+            "public_key": {
+                "@type": "/cosmos.crypto.secp256k1.PubKey",
+                "key": base64.b64encode(rng.randbytes(33)).decode(),
+            },
+            "mode_info": {"single": {"mode": "SIGN_MODE_DIRECT"}},
+            "sequence": str(rng.randint(0, 5_000)),
+        }
+    ]
+    tx["auth_info"]["fee"].update({"payer": "", "granter": ""})
+    tx["signatures"] = [base64.b64encode(rng.randbytes(64)).decode()]
+    return codec.dumps(tx)
+
+
+def build(path: str, txs: int):
+    db = Database(path)
+    db.create_tables()
+    db.optimize_tables()
+
+    rng = random.Random(1)
+    rows = []
+    for height in range(1, txs // TXS_PER_BLOCK + 1):
+        block = []
+        for _ in range(TXS_PER_BLOCK):
+            amino = base64.b64encode(rng.randbytes(300)).decode()
+            block.append((amino, TxDecode(height, tx_json=tx_json(rng), msg_types="[]")))
+        rows.append((height, "2023-01-01T00:00:00Z", block))
+        if len(rows) == 1_000:
+            db.insert_block_rows(rows)
+            db.commit()
+            rows = []
+    db.insert_block_rows(rows)
+    db.commit()
+    db.conn.close()
+
+
+def vacuum(path: str):
+    db = Database(path)
+    db.cur.execute("""VACUUM""")
+    db.conn.close()
+
+
+def drop_page_cache() -> bool:
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("1")
+        return True
+    except OSError:
+        return False
+
+
+def compress(path: str, samples: int) -> None:
+    db = Database(path)
+    start = time.perf_counter()
+    sample = db.sample_tx_json(samples)
+    dictionary = train_dictionary(sample)
+    db.set_setting("tx_json_dict", str(db.add_tx_json_dict(dictionary, len(sample))))
+    db.commit()
+    db.tx_json_codec = db.load_tx_json_codec()
+    print(f"trained a {len(dictionary):,} byte dictionary on {len(sample):,} Txs in {time.perf_counter() - start:.1f}s")
+
+    db.cur.execute("""SELECT COUNT(*) FROM txs""")
+    txs = db.cur.fetchone()[0]
+    start = time.perf_counter()
+    last_id = 0
+    while last_id is not None:
+        last_id = db.convert_tx_json(last_id, 10_000)
+    seconds = time.perf_counter() - start
+    print(f"convert_tx_json: {seconds:.1f}s, {txs / seconds:,.0f} txs/s")
+    db.conn.close()
+
+
+def measure(name: str, path: str, end: int) -> list:
+    db = Database(path)
+    db.cur.execute("""SELECT typeof(tx_json), SUM(length(tx_json)) FROM txs GROUP BY 1""")
+    stored = ", ".join(f"{kind} {size / 1e6:,.0f} MB" for kind, size in db.cur.fetchall())
+    print(f"{name}: data.db {os.path.getsize(path) / 1e6:,.0f} MB (tx_json {stored})")
+
+    fields = ["id", "height", "tx_json"]
+    cold = drop_page_cache()
+    start = time.perf_counter()
+    txs = db.get_txs_in_range(0, end, fields)
+    label = "cold" if cold else "warm (could not drop the page cache)"
+    print(f"  get_txs_in_range {label:<6} {(time.perf_counter() - start) * 1000:9.1f}ms  ({len(txs):,} Txs)")
+
+    start = time.perf_counter()
+    txs = db.get_txs_in_range(0, end, fields)
+    print(f"  get_txs_in_range warm   {(time.perf_counter() - start) * 1000:9.1f}ms")
+
+    # the same 1,000 Txs over and over
+    hot = [random.Random(2).randint(1, len(txs)) for _ in range(1_000)]
+    start = time.perf_counter()
+    for _ in range(10):
+        for tx_id in hot:
+            db.get_tx(tx_id)
+    print(f"  get_tx hot rows         {(time.perf_counter() - start) * 1e6 / 10_000:9.1f}us per Tx")
+
+    db.conn.close()
+    return txs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=500_000)
+    parser.add_argument("--samples", type=int, default=2_000, help="Txs the dictionary is trained on")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "data.db")
+        build(path, args.txs)
+        vacuum(path)
+        end = args.txs // TXS_PER_BLOCK
+
+        before = measure("TEXT", path, end)
+        compress(path, args.samples)
+        vacuum(path)
+        after = measure("zlib + dictionary", path, end)
+
+        # the API returns the same tx_json either way
+        assert before == after
+
+
+if __name__ == "__main__":
+    main()
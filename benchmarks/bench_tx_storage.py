@@ -0,0 +1,120 @@
+"""
+txs.tx_amino / tx_hash as base64 / hex TEXT vs raw bytes / 32 byte BLOBs (migrations/tx_blobs.py): data.db
+size, full table scan speed of tx_amino and of get_txs_in_range, and get_tx_by_hash. The TEXT data.db is
+converted with Database.convert_tx_storage, both are VACUUMed before they are measured.
+
+python3 bench_tx_storage.py --txs 500000 --amino-size 600
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from SQL import TX_STORAGE_BLOB, Database
+
+TXS_PER_BLOCK = 10
+
+
+def build(path: str, txs: int, amino_size: int) -> list[str]:
+    """A TEXT data.db, returns some of its Tx hashes"""
+    db = Database(path)
+    db.create_tables()
+    db.optimize_tables()
+
+    rng = random.Random(1)
+    rows = []
+    for height in range(1, txs // TXS_PER_BLOCK + 1):
+        # +-50% so the rows are not all the same length
+        amino = [
+            base64.b64encode(rng.randbytes(rng.randint(amino_size // 2, amino_size * 3 // 2))).decode()
+            for _ in range(TXS_PER_BLOCK)
+        ]
+        rows.append((height, "2023-01-01T00:00:00Z", [(a, None) for a in amino]))
+        if len(rows) == 1_000:
+            db.insert_block_rows(rows)
+            db.commit()
+            rows = []
+    db.insert_block_rows(rows)
+    db.commit()
+
+    db.cur.execute("""SELECT tx_hash FROM txs ORDER BY random() LIMIT 20""")
+    hashes = [row[0] for row in db.cur.fetchall()]
+    db.conn.close()
+    return hashes
+
+
+def vacuum(path: str):
+    db = Database(path)
+    db.cur.execute("""VACUUM""")
+    db.conn.close()
+
+
+def convert(path: str) -> float:
+    db = Database(path)
+    db.set_setting("tx_storage", TX_STORAGE_BLOB)
+    db.commit()
+    db.tx_blobs = True
+
+    start = time.perf_counter()
+    last_id = 0
+    while last_id is not None:
+        last_id = db.convert_tx_storage(last_id, 10_000)
+    seconds = time.perf_counter() - start
+    db.conn.close()
+    return seconds
+
+
+def measure(name: str, path: str, hashes: list[str], end: int) -> list:
+    db = Database(path)
+    print(f"{name}: {os.path.getsize(path) / 1e6:,.0f} MB")
+
+    start = time.perf_counter()
+    db.cur.execute("""SELECT tx_amino FROM txs""")
+    amino_bytes = sum(len(row[0]) for row in db.cur.fetchall())
+    print(f"  SELECT tx_amino        {(time.perf_counter() - start) * 1000:9.1f}ms  ({amino_bytes / 1e6:,.0f} MB read)")
+
+    start = time.perf_counter()
+    txs = db.get_txs_in_range(0, end)
+    print(f"  get_txs_in_range       {(time.perf_counter() - start) * 1000:9.1f}ms  ({len(txs):,} Txs)")
+
+    start = time.perf_counter()
+    found = [db.get_tx_by_hash(tx_hash) for tx_hash in hashes]
+    print(f"  get_tx_by_hash         {(time.perf_counter() - start) * 1000 / len(hashes):9.1f}ms per lookup")
+    assert all(tx is not None and tx.tx_hash == tx_hash for tx, tx_hash in zip(found, hashes))
+
+    db.conn.close()
+    return txs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=500_000)
+    parser.add_argument("--amino-size", type=int, default=600, help="average bytes per TxRaw")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "data.db")
+        hashes = build(path, args.txs, args.amino_size)
+        vacuum(path)
+        end = args.txs // TXS_PER_BLOCK
+        print(f"{args.txs:,} Txs, ~{args.amino_size} bytes each")
+
+        before = measure("TEXT", path, hashes, end)
+        print(f"convert_tx_storage: {convert(path):.1f}s")
+        vacuum(path)
+        after = measure("BLOB", path, hashes, end)
+
+        # the API returns the same Txs either way
+        assert before == after
+
+
+if __name__ == "__main__":
+    main()
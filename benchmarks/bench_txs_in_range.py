@@ -0,0 +1,119 @@
+"""
+Database.get_txs_in_range on a multi million Tx data.db: the old get_block + get_tx per height / id vs the
+1 query txs_height range scan, with all columns and with only the small ones (covering index).
+
+python3 bench_txs_in_range.py --txs 2000000 --range-blocks 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import codec
+from chain_types import Tx
+from SQL import Database
+
+TXS_PER_BLOCK = 10
+
+
+def build(path: str, txs: int, tx_json_size: int):
+    db = Database(path)
+    db.create_tables()
+
+    rng = random.Random(1)
+    tx_json = "{" + "x" * (tx_json_size - 2) + "}"
+    tx_rows, block_rows = [], []
+    for height in range(1, txs // TXS_PER_BLOCK + 1):
+        first = (height - 1) * TXS_PER_BLOCK + 1
+        ids = list(range(first, first + TXS_PER_BLOCK))
+        block_rows.append((height, "2023-01-01T00:00:00Z", codec.dumps(ids)))
+        for tx_id in ids:
+            tx_rows.append(
+                (tx_id, height, "A" * 300, '["/cosmos.bank.v1beta1.MsgSend"]', tx_json,
+                 f"juno1{rng.getrandbits(160):040x}", f"{rng.getrandbits(256):064X}")
+            )
+
+        if len(tx_rows) >= 100_000:
+            flush(db, tx_rows, block_rows)
+            tx_rows, block_rows = [], []
+    flush(db, tx_rows, block_rows)
+
+    db.optimize_tables()
+    db.conn.close()
+
+
+def flush(db: Database, tx_rows: list, block_rows: list):
+    db.cur.executemany(
+        """INSERT INTO txs (id, height, tx_amino, msg_types, tx_json, address, tx_hash) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        tx_rows,
+    )
+    db.cur.executemany("""INSERT INTO blocks (height, time, txs) VALUES (?, ?, ?)""", block_rows)
+    db.commit()
+
+
+def per_block(db: Database, start: int, end: int) -> list[Tx]:
+    """What get_txs_in_range did: a get_block per height, then a get_tx per id."""
+    tx_ids = {}
+    for height in range(start, end + 1):
+        b = db.get_block(height)
+        if b:
+            for tx_id in b.tx_ids:
+                tx_ids[tx_id] = True
+    return [tx for tx in map(db.get_tx, tx_ids) if tx]
+
+
+def measure(name: str, fn, loops: int) -> None:
+    best = None
+    for _ in range(loops):
+        start = time.perf_counter()
+        txs = fn()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    print(f"{name:<46} {best * 1000:10.1f}ms  {len(txs) / best:12,.0f} txs/s  ({len(txs):,} Txs)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=2_000_000)
+    parser.add_argument("--tx-json-size", type=int, default=600)
+    parser.add_argument("--range-blocks", type=int, default=20_000)
+    parser.add_argument("--loops", type=int, default=3)
+    parser.add_argument("--db", type=str, default="", help="reuse (or keep) this data.db instead of a temp one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.db or os.path.join(tmp_dir, "data.db")
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            build(path, args.txs, args.tx_json_size)
+            print(f"built in {time.perf_counter() - start:.1f}s")
+
+        db = Database(path)
+        db.optimize_tables()
+        blocks = db.get_latest_saved_block().height
+        start_height = blocks // 2
+        end_height = start_height + args.range_blocks - 1
+        print(
+            f"{blocks * TXS_PER_BLOCK:,} Txs, {os.path.getsize(path) / 1e9:.2f} GB, "
+            f"range {start_height:,}->{end_height:,}"
+        )
+
+        measure("get_block + get_tx per height", lambda: per_block(db, start_height, end_height), args.loops)
+        measure("get_txs_in_range", lambda: db.get_txs_in_range(start_height, end_height), args.loops)
+        measure(
+            "get_txs_in_range id,height,msg_types,address",
+            lambda: db.get_txs_in_range(start_height, end_height, ["id", "height", "msg_types", "address"]),
+            args.loops,
+        )
+        db.conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Checks that fast_decode.py prints the same Tx JSON as the decoder binary, before trusting it with a chain.
+
+python3 conformance_fast_decode.py --recorded-dir recorded --binary juno-decode  # blocks saved by record_blocks.py
+python3 conformance_fast_decode.py --synthetic 10000  # Txs from proto_tx.py, no binary needed
+python3 conformance_fast_decode.py --recorded-dir recorded --write-corpus ../tests/data/fast_decode_corpus.jsonl
+
+Every Tx the fast path decodes is compared (as parsed JSON, key order included) with the binary's output,
+then byte for byte when it comes from the binary (the stored tx_json is never decoded again). Txs it hands
+off to the binary are counted by reason. Exits 1 on any mismatch.
+
+--write-corpus saves up to --corpus-per-type of those Txs per message type with the binary's exact output,
+as JSON lines {"tx", "tx_json"}. tests/test_fast_decode.py checks the fast path against that file.
+"""
+
+import argparse
+import glob
+import os
+import random
+import shutil
+import sys
+import tempfile
+from collections import Counter
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import codec
+from decoding import run_decoder
+from fast_decode import FastDecodeError, decode_tx, decode_tx_dict
+from proto_tx import TIP_RATE, synthetic_tx
+
+BINARY_BATCH = 1_000
+
+
+def recorded_txs(recorded_dir: str) -> list[str]:
+    txs = []
+    for path in sorted(glob.glob(os.path.join(recorded_dir, "*.json"))):
+        with open(path, "rb") as f:
+            block = codec.loads(f.read())["result"]["block"]
+        txs.extend(block["data"]["txs"] or [])
+    return txs
+
+
+def binary_decode(binary: str, txs: list[str]) -> dict[int, str]:
+    """Tx index: the binary's Tx JSON, of every Tx it could decode"""
+    tmp_dir = tempfile.mkdtemp()
+    decoded = {}
+    try:
+        for i in range(0, len(txs), BINARY_BATCH):
+            batch = [{"id": i + j, "tx": tx} for j, tx in enumerate(txs[i : i + BINARY_BATCH])]
+            for value in run_decoder(binary, batch, tmp_dir):
+                if "tx" in value:
+                    decoded[value["id"]] = value["tx"]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return decoded
+
+
+def first_byte_difference(a: str, b: str) -> str:
+    i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+    return f"same JSON, bytes differ at {i}: {a[max(0, i - 30) : i + 30]!r} != {b[max(0, i - 30) : i + 30]!r}"
+
+
+def write_corpus(path: str, txs: list[str], binary_json: dict[int, str], per_type: int):
+    """The Txs the fast path decodes + the binary's output, up to per_type per first message type"""
+    counts: Counter[str] = Counter()
+    written = 0
+    with open(path, "w") as f:
+        for i, tx in enumerate(txs):
+            if i not in binary_json:
+                continue
+            try:
+                decoded = decode_tx_dict(tx)
+            except FastDecodeError:
+                continue
+
+            kind = decoded["body"]["messages"][0]["@type"]
+            if counts[kind] >= per_type:
+                continue
+            counts[kind] += 1
+            f.write(codec.dumps({"tx": tx, "tx_json": binary_json[i]}) + "\n")
+            written += 1
+    print(f"Wrote {written:,} Txs to {path}: {dict(counts)}")
+
+
+def ordered(value):
+    """value with its dicts as lists of (key, value), so == also compares the key order"""
+    if isinstance(value, dict):
+        return [(k, ordered(v)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [ordered(v) for v in value]
+    return value
+
+
+def first_difference(a, b, path: str = "") -> str:
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in list(a) + [k for k in b if k not in a]:
+            if key not in a or key not in b:
+                return f"{path}.{key}: {a.get(key, '<missing>')!r} != {b.get(key, '<missing>')!r}"
+            if ordered(a[key]) != ordered(b[key]):
+                return first_difference(a[key], b[key], f"{path}.{key}")
+        if list(a) != list(b):
+            return f"{path}: key order {list(a)} != {list(b)}"
+    if isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            if ordered(x) != ordered(y):
+                return first_difference(x, y, f"{path}[{i}]")
+    return f"{path}: {a!r} != {b!r}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recorded-dir", type=str, default="")
+    parser.add_argument("--binary", type=str, default="juno-decode")
+    parser.add_argument("--synthetic", type=int, default=0, help="check N proto_tx.py Txs instead")
+    parser.add_argument("--show", type=int, default=10, help="mismatches to print")
+    parser.add_argument("--write-corpus", type=str, default="", help="JSON lines file for the tests")
+    parser.add_argument("--corpus-per-type", type=int, default=20)
+    args = parser.parse_args()
+
+    # Tx index: the binary's exact output, only with --recorded-dir
+    binary_json: dict[int, str] = {}
+
+    if args.synthetic > 0:
+        rng = random.Random(1)
+        txs, expected = [], {}
+        for i in range(args.synthetic):
+            tx, decoded = synthetic_tx(rng, tip_rate=TIP_RATE)
+            txs.append(tx)
+            if decoded is not None:
+                expected[i] = decoded
+        source = f"{args.synthetic:,} synthetic Txs"
+    elif args.recorded_dir != "":
+        txs = recorded_txs(args.recorded_dir)
+        binary_json = binary_decode(args.binary, txs)
+        expected = {i: codec.loads(tx_json) for i, tx_json in binary_json.items()}
+        source = f"{len(txs):,} Txs of {args.recorded_dir}, {args.binary}"
+    else:
+        parser.error("set --recorded-dir or --synthetic")
+
+    matches, mismatches = 0, []
+    handed_off: Counter[str] = Counter()
+    for i, tx in enumerate(txs):
+        try:
+            decoded = decode_tx_dict(tx)
+        except FastDecodeError as e:
+            handed_off[str(e)] += 1
+            continue
+
+        if i not in expected:
+            mismatches.append((i, "fast path decoded a Tx the binary could not"))
+        elif ordered(decoded) != ordered(expected[i]):
+            mismatches.append((i, first_difference(decoded, expected[i])))
+        elif i in binary_json and decode_tx(tx) != binary_json[i]:
+            mismatches.append((i, first_byte_difference(decode_tx(tx), binary_json[i])))
+        else:
+            matches += 1
+
+    fast = matches + len(mismatches)
+    print(source)
+    print(f"fast path: {fast:,} / {len(txs):,} Txs ({fast / max(1, len(txs)) * 100:.1f}%), {matches:,} match, {len(mismatches):,} mismatch")
+    for reason, count in handed_off.most_common(10):
+        print(f"    binary: {count:>8,}  {reason}")
+    for i, difference in mismatches[: args.show]:
+        print(f"[!] Tx {i}: {difference}")
+
+    if args.write_corpus != "":
+        if len(binary_json) == 0:
+            parser.error("--write-corpus needs --recorded-dir (the binary's output)")
+        write_corpus(args.write_corpus, txs, binary_json, args.corpus_per_type)
+
+    if len(mismatches) > 0:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
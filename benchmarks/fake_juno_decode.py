@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the juno-decode binary (https://github.com/Reecepbcups/juno-decode), for benchmarks.
+
+fake_juno_decode.py tx decode-file <in.json> <out.json>
+in:  [{"id": 1, "tx": "<base64 amino>"}]
+out: [{"id": 1, "tx": "<decoded Tx json string>"}]
+
+fake_juno_decode.py tx decode-stream
+stdin:  {"id": 1, "tx": "<base64 amino>"}\n per Tx
+stdout: {"id": 1, "tx": "<decoded Tx json string>"}\n per Tx ({"id": 1, "error": "..."} if it can not)
+
+Each Tx is turned into a deterministic, realistic looking Tx (bank send, delegate, wasm execute or vote)
+picked from a hash of its amino. FAKE_DECODE_US_PER_TX=<microseconds> adds CPU time per Tx, to model
+the cost of the real protobuf decoding. FAKE_DECODE_FAIL_RATE=<0..1> answers that share of Txs (picked
+from their hash, so always the same ones) with an error, like Txs of a type the binary does not know.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import sys
+import time
+
+US_PER_TX = float(os.environ.get("FAKE_DECODE_US_PER_TX", "0"))
+FAIL_RATE = float(os.environ.get("FAKE_DECODE_FAIL_RATE", "0"))
+
+
+def address(digest: bytes, prefix: str = "juno1") -> str:
+    return prefix + digest.hex()[:38]
+
+
+def decode(amino: str) -> dict:
+    digest = hashlib.sha256(amino.encode()).digest()
+    sender = address(digest)
+    kind = digest[0] % 4
+
+    if kind == 0:
+        msg = {
+            "@type": "/cosmos.bank.v1beta1.MsgSend",
+            "from_address": sender,
+            "to_address": address(digest[1:]),
+            "amount": [{"denom": "ujuno", "amount": str(int.from_bytes(digest[2:6], "big"))}],
+        }
+    elif kind == 1:
+        msg = {
+            "@type": "/cosmos.staking.v1beta1.MsgDelegate",
+            "delegator_address": sender,
+            "validator_address": address(digest[1:], "junovaloper1"),
+            "amount": {"denom": "ujuno", "amount": str(int.from_bytes(digest[2:5], "big"))},
+        }
+    elif kind == 2:
+        msg = {
+            "@type": "/cosmwasm.wasm.v1.MsgExecuteContract",
+            "sender": sender,
+            "contract": "juno1" + digest.hex()[:58],
+            "msg": {"transfer": {"recipient": address(digest[3:]), "amount": "1000"}},
+            "funds": [],
+        }
+    else:
+        msg = {
+            "@type": "/cosmos.gov.v1beta1.MsgVote",
+            "proposal_id": str(digest[1]),
+            "voter": sender,
+            "option": "VOTE_OPTION_YES",
+        }
+
+    return {
+        "body": {
+            "messages": [msg],
+            "memo": "",
+            "timeout_height": "0",
+            "extension_options": [],
+            "non_critical_extension_options": [],
+        },
+        "auth_info": {
+            "signer_infos": [],
+            "fee": {"amount": [{"denom": "ujuno", "amount": "5000"}], "gas_limit": "200000"},
+        },
+        "signatures": [digest.hex()],
+    }
+
+
+def burn(microseconds: float):
+    end = time.perf_counter() + microseconds / 1_000_000
+    while time.perf_counter() < end:
+        pass
+
+
+def decode_one(value: dict) -> dict:
+    if US_PER_TX > 0:
+        burn(US_PER_TX)
+    try:
+        base64.b64decode(value["tx"], validate=True)
+    except (binascii.Error, ValueError) as e:
+        return {"id": value["id"], "error": str(e)}
+    if FAIL_RATE > 0 and hashlib.sha256(value["tx"].encode()).digest()[31] < FAIL_RATE * 256:
+        return {"id": value["id"], "error": "unable to resolve type URL /fake.v1.MsgUnknown: tx parse error"}
+    return {"id": value["id"], "tx": json.dumps(decode(value["tx"]))}
+
+
+def decode_stream():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    partial = b""
+    while True:
+        # whatever the client has sent so far (blocks only when there is nothing)
+        data = stdin.read1(1 << 16)
+        if data == b"":
+            break
+
+        lines = (partial + data).split(b"\n")
+        partial = lines.pop()
+        stdout.write(
+            b"".join(json.dumps(decode_one(json.loads(line))).encode() + b"\n" for line in lines if line)
+        )
+        # answered everything we were sent, the client may be waiting on it
+        stdout.flush()
+
+
+def main():
+    if sys.argv[1:] == ["tx", "decode-stream"]:
+        decode_stream()
+        return
+
+    if len(sys.argv) != 5 or sys.argv[1:3] != ["tx", "decode-file"]:
+        print("usage: fake_juno_decode.py tx decode-file <in.json> <out.json> | tx decode-stream")
+        exit(1)
+
+    with open(sys.argv[3], "r") as f:
+        to_decode = json.load(f)
+
+    decoded = [d for d in map(decode_one, to_decode) if "tx" in d]
+
+    with open(sys.argv[4], "w") as f:
+        json.dump(decoded, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Builds real protobuf TxRaw Txs (base64, as they are in a /block response) together with the JSON juno-decode
+prints for them, for the stub RPC, the fast decode conformance check and benchmarks.
+
+Written from the cosmos-sdk / wasmd .proto files, on purpose without sharing anything with fast_decode.py.
+"""
+
+import base64
+import json
+import random
+
+# share of Txs with a message fast_decode.py does not know (they go to the binary)
+UNKNOWN_RATE = 0.1
+# share of Txs paying a tip (AuthInfo.tip), in 1 or 2 denoms
+TIP_RATE = 0.1
+
+
+def varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def field_bytes(number: int, value: bytes) -> bytes:
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def field_str(number: int, value: str) -> bytes:
+    return field_bytes(number, value.encode()) if value != "" else b""
+
+
+def field_int(number: int, value: int) -> bytes:
+    return varint(number << 3) + varint(value) if value != 0 else b""
+
+
+def any_(type_url: str, value: bytes) -> bytes:
+    return field_str(1, type_url) + field_bytes(2, value)
+
+
+def coin(denom: str, amount: int) -> tuple[bytes, dict]:
+    return field_str(1, denom) + field_str(2, str(amount)), {"denom": denom, "amount": str(amount)}
+
+
+def address(rng: random.Random, prefix: str = "juno1", length: int = 38) -> str:
+    return prefix + "".join(rng.choice("qpzry9x8gf2tvdw0s3jn54khce6mua7l") for _ in range(length))
+
+
+def msg_send(rng: random.Random) -> tuple[str, bytes, dict]:
+    sender, to = address(rng), address(rng)
+    c, c_json = coin("ujuno", rng.randrange(1, 10**9))
+    return (
+        "/cosmos.bank.v1beta1.MsgSend",
+        field_str(1, sender) + field_str(2, to) + field_bytes(3, c),
+        {"from_address": sender, "to_address": to, "amount": [c_json]},
+    )
+
+
+def msg_delegate(rng: random.Random) -> tuple[str, bytes, dict]:
+    delegator, validator = address(rng), address(rng, "junovaloper1")
+    c, c_json = coin("ujuno", rng.randrange(1, 10**9))
+    type_url = rng.choice(
+        ["/cosmos.staking.v1beta1.MsgDelegate", "/cosmos.staking.v1beta1.MsgUndelegate"]
+    )
+    return (
+        type_url,
+        field_str(1, delegator) + field_str(2, validator) + field_bytes(3, c),
+        {"delegator_address": delegator, "validator_address": validator, "amount": c_json},
+    )
+
+
+def msg_withdraw_reward(rng: random.Random) -> tuple[str, bytes, dict]:
+    delegator, validator = address(rng), address(rng, "junovaloper1")
+    return (
+        "/cosmos.distribution.v1beta1.MsgWithdrawDelegatorReward",
+        field_str(1, delegator) + field_str(2, validator),
+        {"delegator_address": delegator, "validator_address": validator},
+    )
+
+
+def msg_vote(rng: random.Random) -> tuple[str, bytes, dict]:
+    voter = address(rng)
+    proposal, option = rng.randrange(1, 300), rng.randrange(1, 5)
+    options = ["", "VOTE_OPTION_YES", "VOTE_OPTION_ABSTAIN", "VOTE_OPTION_NO", "VOTE_OPTION_NO_WITH_VETO"]
+    return (
+        "/cosmos.gov.v1beta1.MsgVote",
+        field_int(1, proposal) + field_str(2, voter) + field_int(3, option),
+        {"proposal_id": str(proposal), "voter": voter, "option": options[option]},
+    )
+
+
+def msg_execute_contract(rng: random.Random) -> tuple[str, bytes, dict]:
+    sender, contract = address(rng), address(rng, length=58)
+    msg = {"transfer": {"recipient": address(rng), "amount": str(rng.randrange(1, 10**6))}}
+    funds, funds_json = b"", []
+    if rng.random() < 0.3:
+        c, c_json = coin("ujuno", rng.randrange(1, 10**6))
+        funds, funds_json = field_bytes(5, c), [c_json]
+    return (
+        "/cosmwasm.wasm.v1.MsgExecuteContract",
+        field_str(1, sender) + field_str(2, contract) + field_bytes(3, json.dumps(msg).encode()) + funds,
+        {"sender": sender, "contract": contract, "msg": msg, "funds": funds_json},
+    )
+
+
+def msg_exec(rng: random.Random) -> tuple[str, bytes, dict]:
+    grantee = address(rng)
+    type_url, value, inner = msg_delegate(rng)
+    return (
+        "/cosmos.authz.v1beta1.MsgExec",
+        field_str(1, grantee) + field_bytes(2, any_(type_url, value)),
+        {"grantee": grantee, "msgs": [{"@type": type_url, **inner}]},
+    )
+
+
+# (builder, weight)
+KNOWN = [
+    (msg_send, 35),
+    (msg_execute_contract, 30),
+    (msg_delegate, 15),
+    (msg_withdraw_reward, 10),
+    (msg_vote, 7),
+    (msg_exec, 3),
+]
+
+
+def tip(rng: random.Random) -> tuple[bytes, dict]:
+    tipper = address(rng)
+    amount, amount_json = b"", []
+    for denom in rng.sample(["ujuno", "uatom"], rng.randint(1, 2)):
+        c, c_json = coin(denom, rng.randrange(1, 10_000))
+        amount += field_bytes(1, c)
+        amount_json.append(c_json)
+    return amount + field_str(2, tipper), {"amount": amount_json, "tipper": tipper}
+
+
+def synthetic_tx(
+    rng: random.Random,
+    unknown_rate: float = UNKNOWN_RATE,
+    unknown_size: int = 400,
+    tip_rate: float = 0.0,
+) -> tuple[str, dict | None]:
+    """
+    (base64 TxRaw, decoded Tx). The decoded Tx is None for Txs with an unknown message
+    (an IBC client update with `unknown_size` random bytes). tip_rate of them pay a tip (ex: TIP_RATE).
+    """
+    builders, weights = zip(*KNOWN)
+    messages, messages_json = b"", []
+
+    known = rng.random() >= unknown_rate
+    if known:
+        type_url, value, msg_json = rng.choices(builders, weights)[0](rng)
+        messages_json.append({"@type": type_url, **msg_json})
+    else:
+        type_url, value = "/ibc.core.client.v1.MsgUpdateClient", rng.randbytes(unknown_size)
+    messages += field_bytes(1, any_(type_url, value))
+
+    memo = rng.choice(["", "", "", "memo " + str(rng.randrange(10**6))])
+    body = messages + field_str(2, memo)
+
+    pubkey = rng.randbytes(33)
+    sequence = rng.randrange(0, 5_000)
+    fee, fee_json = coin("ujuno", rng.randrange(1_000, 100_000))
+    gas = rng.randrange(80_000, 2_000_000)
+    signer_info = (
+        field_bytes(1, any_("/cosmos.crypto.secp256k1.PubKey", field_bytes(1, pubkey)))
+        + field_bytes(2, field_bytes(1, field_int(1, 1)))
+        + field_int(3, sequence)
+    )
+    auth_info = field_bytes(1, signer_info) + field_bytes(2, field_bytes(1, fee) + field_int(2, gas))
+    tip_json = None
+    if tip_rate > 0 and rng.random() < tip_rate:
+        t, tip_json = tip(rng)
+        auth_info += field_bytes(3, t)
+
+    signature = rng.randbytes(64)
+    raw = field_bytes(1, body) + field_bytes(2, auth_info) + field_bytes(3, signature)
+
+    decoded = None
+    if known:
+        decoded = {
+            "body": {
+                "messages": messages_json,
+                "memo": memo,
+                "timeout_height": "0",
+                "extension_options": [],
+                "non_critical_extension_options": [],
+            },
+            "auth_info": {
+                "signer_infos": [
+                    {
+                        "public_key": {
+                            "@type": "/cosmos.crypto.secp256k1.PubKey",
+                            "key": base64.b64encode(pubkey).decode(),
+                        },
+                        "mode_info": {"single": {"mode": "SIGN_MODE_DIRECT"}},
+                        "sequence": str(sequence),
+                    }
+                ],
+                "fee": {"amount": [fee_json], "gas_limit": str(gas), "payer": "", "granter": ""},
+                "tip": tip_json,
+            },
+            "signatures": [base64.b64encode(signature).decode()],
+        }
+
+    return base64.b64encode(raw).decode(), decoded
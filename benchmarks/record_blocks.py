@@ -0,0 +1,41 @@
+"""
+Saves real /block responses from an RPC, so the stub RPC can serve them (stub_rpc.py --recorded-dir).
+
+python3 record_blocks.py --rpc https://rpc-v2-archive.junonetwork.io:443 --start 2578000 --end 2578999 --out recorded
+"""
+
+import argparse
+import os
+
+import httpx
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rpc", type=str, required=True)
+    parser.add_argument("--start", type=int, required=True)
+    parser.add_argument("--end", type=int, required=True)
+    parser.add_argument("--out", type=str, default="recorded")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    with httpx.Client(timeout=30) as client:
+        for height in range(args.start, args.end + 1):
+            path = os.path.join(args.out, f"{height}.json")
+            if os.path.exists(path):
+                continue
+
+            r = client.get(f"{args.rpc.rstrip('/')}/block?height={height}")
+            if r.status_code != 200:
+                print(f"Error: {r.status_code} @ height {height}")
+                continue
+
+            with open(path, "wb") as f:
+                f.write(r.content)
+
+            if height % 100 == 0:
+                print(f"Recorded {height:,}")
+
+
+if __name__ == "__main__":
+    main()
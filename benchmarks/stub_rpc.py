@@ -0,0 +1,361 @@
+"""
+Local stub of a Tendermint / CometBFT RPC, used by the benchmarks so we do not hammer real archive nodes.
+
+Serves:
+- GET /block?height=N
+- GET /abci_info
+- POST / (JSON-RPC, single or batch, methods: block, abci_info)
+- /websocket (subscribe to tm.event='NewBlock', pushes each block `produce` makes)
+
+Every HTTP request sleeps `latency` seconds first (think: round trip to an archive node across an ocean).
+`error_rate` of heights return an error instead of a block.
+Blocks are synthetic (protobuf Txs from proto_tx.py, `tx_size` bytes for the ones with an unknown
+message), or real ones recorded with record_blocks.py (`recorded_dir`, 1 <height>.json
+/block response per file).
+`capacity` > 0 models an overloaded node: past `capacity` open requests the latency grows with the
+queue, past 2x `capacity` requests are refused with a 429.
+
+python3 stub_rpc.py --port 26657 --latency 0.1 --txs-per-block 10
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from proto_tx import synthetic_tx
+
+GENESIS_TIME = datetime(2021, 10, 1, 15, 0, 0, tzinfo=timezone.utc)
+
+
+class StubChain:
+    def __init__(
+        self,
+        latest_height: int = 10_000_000,
+        txs_per_block: int = 10,
+        tx_size: int = 400,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 1,
+        validators: int = 150,
+        capacity: int = 0,
+        recorded_dir: str = "",
+    ):
+        self.latest_height = latest_height
+        self.txs_per_block = txs_per_block
+        self.tx_size = tx_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.validators = validators
+        self.capacity = capacity
+        self.recorded_dir = recorded_dir
+        self.recorded: set[int] = set()
+        if recorded_dir != "":
+            self.recorded = {
+                int(name[: -len(".json")])
+                for name in os.listdir(recorded_dir)
+                if name.endswith(".json")
+            }
+            self.latest_height = max(self.recorded, default=0)
+        self.active = 0
+        self.rejected = 0
+        self.requests = 0
+        # height: block requests for it
+        self.block_requests: dict[int, int] = {}
+        self.lock = threading.Lock()
+        # height: time.time() it was produced (see produce)
+        self.produced_at: dict[int, float] = {}
+        # websocket connections are closed after this many events (0 = never), to test reconnects
+        self.disconnect_after = 0
+
+    def produce(self, blocks: int, block_interval: float):
+        """Makes a new block every block_interval seconds (in a background thread)."""
+
+        def run():
+            for _ in range(blocks):
+                time.sleep(block_interval)
+                with self.lock:
+                    self.latest_height += 1
+                    self.produced_at[self.latest_height] = time.time()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def tx(self, height: int, index: int) -> str:
+        rng = random.Random(height * 1_000 + index + self.seed)
+        return synthetic_tx(rng, unknown_size=self.tx_size)[0]
+
+    def block_time(self, height: int) -> str:
+        t = GENESIS_TIME + timedelta(seconds=height * 6)
+        return t.strftime("%Y-%m-%dT%H:%M:%S.") + f"{height % 10**9:09d}Z"
+
+    def block_result(self, height: int) -> dict:
+        if self.recorded_dir != "":
+            with open(os.path.join(self.recorded_dir, f"{height}.json"), "r") as f:
+                return json.load(f)["result"]
+
+        txs = [self.tx(height, i) for i in range(self.txs_per_block)]
+        return {
+            "block_id": {"hash": f"{height:064X}", "parts": {"total": 1, "hash": ""}},
+            "block": {
+                "header": {
+                    "version": {"block": "11"},
+                    "chain_id": "juno-1",
+                    "height": str(height),
+                    "time": self.block_time(height),
+                    "proposer_address": "A" * 40,
+                },
+                "data": {"txs": txs},
+                "evidence": {"evidence": []},
+                "last_commit": {
+                    "height": str(height - 1),
+                    "round": 0,
+                    "signatures": [
+                        {
+                            "block_id_flag": 2,
+                            "validator_address": f"{v:040X}",
+                            "timestamp": self.block_time(height - 1),
+                            "signature": "C" * 88,
+                        }
+                        for v in range(self.validators)
+                    ],
+                },
+            },
+        }
+
+    def should_fail(self, height: int) -> bool:
+        if self.recorded_dir != "" and height not in self.recorded:
+            return True
+        if self.error_rate <= 0:
+            return False
+        return random.Random(height + self.seed * 7).random() < self.error_rate
+
+    def abci_info_result(self) -> dict:
+        return {
+            "response": {
+                "data": "juno",
+                "last_block_height": str(self.latest_height),
+            }
+        }
+
+    def rpc(self, request: dict) -> dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id", -1)}
+        method = request.get("method")
+        params = request.get("params") or {}
+
+        if method == "block":
+            height = int(params.get("height", self.latest_height))
+            with self.lock:
+                self.block_requests[height] = self.block_requests.get(height, 0) + 1
+            if height > self.latest_height or self.should_fail(height):
+                response["error"] = {
+                    "code": -32603,
+                    "message": "Internal error",
+                    "data": f"height {height} is not available",
+                }
+            else:
+                response["result"] = self.block_result(height)
+        elif method == "abci_info":
+            response["result"] = self.abci_info_result()
+        else:
+            response["error"] = {"code": -32601, "message": "Method not found"}
+
+        return response
+
+
+class StubRPCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    chain: StubChain
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _wait(self) -> bool:
+        """False if the request is rate limited (429 already sent)."""
+        chain = self.chain
+        with chain.lock:
+            chain.requests += 1
+            if chain.capacity > 0 and chain.active >= chain.capacity * 2:
+                chain.rejected += 1
+                overloaded = True
+            else:
+                chain.active += 1
+                overloaded = False
+            active = chain.active
+
+        if overloaded:
+            self._send(429, {"error": "too many requests"})
+            return False
+
+        try:
+            latency = chain.latency
+            if chain.capacity > 0 and active > chain.capacity:
+                # queued behind the requests the node can actually work on
+                latency *= active / chain.capacity
+            if latency > 0:
+                time.sleep(latency)
+        finally:
+            with chain.lock:
+                chain.active -= 1
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/websocket":
+            self._websocket()
+            return
+
+        if not self._wait():
+            return
+        query = parse_qs(url.query)
+
+        if url.path == "/abci_info":
+            self._send(200, self.chain.rpc({"method": "abci_info", "id": -1}))
+            return
+
+        if url.path == "/block":
+            height = int(query.get("height", [self.chain.latest_height])[0])
+            response = self.chain.rpc({"method": "block", "id": -1, "params": {"height": height}})
+            self._send(500 if "error" in response else 200, response)
+            return
+
+        self._send(404, {"error": "not found"})
+
+    def _websocket(self):
+        # Just enough of RFC 6455 for the tip follower: 1 subscribe request in, text frames out.
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(
+            hashlib.sha1((key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode()).digest()
+        ).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        subscribe = json.loads(self._read_frame())
+        self._send_frame({"jsonrpc": "2.0", "id": subscribe.get("id", 1), "result": {}})
+
+        height = self.chain.latest_height
+        sent = 0
+        try:
+            while True:
+                if self.chain.latest_height <= height:
+                    time.sleep(0.002)
+                    continue
+
+                height += 1
+                block = self.chain.block_result(height)
+                self._send_frame(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": subscribe.get("id", 1),
+                        "result": {
+                            "query": "tm.event='NewBlock'",
+                            "data": {
+                                "type": "tendermint/event/NewBlock",
+                                "value": {"block": block["block"]},
+                            },
+                        },
+                    }
+                )
+                sent += 1
+                if self.chain.disconnect_after > 0 and sent >= self.chain.disconnect_after:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+        self.close_connection = True
+
+    def _read_frame(self) -> bytes:
+        header = self.rfile.read(2)
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(self.rfile.read(2), "big")
+        elif length == 127:
+            length = int.from_bytes(self.rfile.read(8), "big")
+        mask = self.rfile.read(4) if header[1] & 0x80 else b"\x00" * 4
+        payload = self.rfile.read(length)
+        return bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+    def _send_frame(self, body: dict):
+        data = json.dumps(body).encode()
+        header = bytes([0x81])
+        if len(data) < 126:
+            header += bytes([len(data)])
+        elif len(data) < 2**16:
+            header += bytes([126]) + len(data).to_bytes(2, "big")
+        else:
+            header += bytes([127]) + len(data).to_bytes(8, "big")
+        self.wfile.write(header + data)
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        if not self._wait():
+            return
+
+        if isinstance(body, list):
+            self._send(200, [self.chain.rpc(request) for request in body])
+        else:
+            self._send(200, self.chain.rpc(body))
+
+
+class StubRPCServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # default of 5 refuses connections once the downloader opens its whole window
+    request_queue_size = 1024
+
+
+def start_stub_rpc(chain: StubChain, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """Starts the stub in a background thread. Returns the server and its url."""
+    handler = type("Handler", (StubRPCHandler,), {"chain": chain})
+    server = StubRPCServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=26657)
+    parser.add_argument("--latest-height", type=int, default=10_000_000)
+    parser.add_argument("--txs-per-block", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=0)
+    parser.add_argument("--recorded-dir", type=str, default="", help="serve blocks from record_blocks.py")
+    args = parser.parse_args()
+
+    chain = StubChain(
+        args.latest_height,
+        args.txs_per_block,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        capacity=args.capacity,
+        recorded_dir=args.recorded_dir,
+    )
+    server, url = start_stub_rpc(chain, args.port)
+    print(f"Stub RPC listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,300 @@
+"""
+Local archive of raw /block responses, used as a read-through cache in front of the RPCs.
+
+Re-indexing (new schema, decoder upgrade, lost data.db) reads blocks from disk instead of downloading
+millions of them from public archive nodes again. Only heights which are not archived go to an RPC.
+
+Layout (BLOCK_ARCHIVE_DIR):
+- archive.json: {"segment_size": N}, fixed once the archive is created.
+- seg-<first height>.blk: every height in [first, first + N). Append only, records of
+  HEADER (magic, height, length) + zlib compressed /block response.
+
+New blocks are buffered in memory and appended in height ordered chunks on flush(). Appends hold an
+flock on the segment so the orchestrator's worker processes can share an archive. A torn record at
+the end of a segment (crash during a write) is cut off by the next writer.
+The downloaders use put_async() / flush_async(), which compress and append in a thread so the event
+loop keeps its requests going.
+
+read_many() reads runs of heights from several segments at once (os.pread + zlib release the GIL),
+so a full rebuild is limited by the disk, not by a single core or the network.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # not on windows, a single process can still use the archive
+    fcntl = None
+
+MAGIC = b"BLK1"
+HEADER = struct.Struct("<4sQI")  # magic, height, compressed length
+
+COMPRESSION_LEVEL = 6
+# pending puts are appended once they use this much memory
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+# heights per read task, keeps read_many memory bounded
+READ_CHUNK = 256
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.path = path
+        self.fd: int | None = None
+        self.index: dict[int, tuple[int, int]] = {}  # height: (payload offset, length)
+        self.end = 0  # offset after the last complete record
+
+    def open(self) -> bool:
+        if self.fd is None:
+            if not os.path.exists(self.path):
+                return False
+            self.fd = os.open(self.path, os.O_RDWR | os.O_APPEND)
+        return True
+
+    def refresh(self):
+        """Indexes records appended since the last scan (by us or another process)."""
+        if not self.open():
+            return
+
+        size = os.fstat(self.fd).st_size
+        while self.end + HEADER.size <= size:
+            magic, height, length = HEADER.unpack(os.pread(self.fd, HEADER.size, self.end))
+            payload = self.end + HEADER.size
+            if magic != MAGIC or payload + length > size:
+                # torn record, fixed by the next writer (under the lock)
+                break
+
+            self.index[height] = (payload, length)
+            self.end = payload + length
+
+    def read(self, height: int) -> bytes | None:
+        location = self.index.get(height)
+        if location is None:
+            return None
+
+        offset, length = location
+        return zlib.decompress(os.pread(self.fd, length, offset))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class BlockArchive:
+    def __init__(self, path: str, segment_size: int = 10_000):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "archive.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["segment_size"] != segment_size:
+                print(
+                    f"Block archive {path} uses segment_size {meta['segment_size']}, ignoring {segment_size}"
+                )
+            segment_size = meta["segment_size"]
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"segment_size": segment_size}, f)
+
+        self.segment_size = segment_size
+        self.segments: dict[int, Segment] = {}
+        self.pending: dict[int, bytes] = {}  # height: compressed response
+        self.pending_bytes = 0
+        # pending blocks a flush_async() thread is appending, still readable meanwhile
+        self.flushing: dict[int, bytes] = {}
+        # 1 appending thread at a time (an flock does not exclude threads sharing the fd)
+        self.append_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _segment(self, height: int) -> Segment:
+        first = height - height % self.segment_size
+        segment = self.segments.get(first)
+        if segment is None:
+            segment = Segment(os.path.join(self.path, f"seg-{first:012d}.blk"))
+            segment.refresh()
+            self.segments[first] = segment
+        return segment
+
+    def has(self, height: int) -> bool:
+        if height in self.pending or height in self.flushing:
+            return True
+
+        segment = self._segment(height)
+        if height not in segment.index:
+            segment.refresh()
+        return height in segment.index
+
+    def get(self, height: int) -> bytes | None:
+        """The raw /block response for height, or None if it is not archived."""
+        compressed = self.pending.get(height, self.flushing.get(height))
+        if compressed is not None:
+            self.hits += 1
+            return zlib.decompress(compressed)
+
+        raw = None
+        if self.has(height):
+            raw = self._segment(height).read(height)
+
+        if raw is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return raw
+
+    def _archived(self, height: int) -> bool:
+        return (
+            height in self.pending
+            or height in self.flushing
+            or height in self._segment(height).index
+        )
+
+    def _add(self, height: int, compressed: bytes):
+        self.pending[height] = compressed
+        self.pending_bytes += len(compressed)
+
+    def put(self, height: int, raw: bytes):
+        if self._archived(height):
+            return
+
+        self._add(height, zlib.compress(raw, COMPRESSION_LEVEL))
+        if self.pending_bytes >= MAX_PENDING_BYTES:
+            self.flush()
+
+    async def put_async(self, height: int, raw: bytes):
+        """put() for the event loop, zlib runs in a thread."""
+        if self._archived(height):
+            return
+
+        compressed = await asyncio.to_thread(zlib.compress, raw, COMPRESSION_LEVEL)
+        if self._archived(height):
+            return
+        self._add(height, compressed)
+        if self.pending_bytes >= MAX_PENDING_BYTES:
+            await self.flush_async()
+
+    def _take_pending(self) -> dict[int, bytes]:
+        pending = self.pending
+        self.pending = {}
+        self.pending_bytes = 0
+        return pending
+
+    def flush(self):
+        """Appends pending blocks to their segments, in height order."""
+        if len(self.pending) > 0:
+            self._write(self._take_pending())
+
+    async def flush_async(self):
+        """flush() for the event loop, the appends (and waiting on other processes' flocks) run in a thread."""
+        if len(self.pending) == 0:
+            return
+
+        pending = self._take_pending()
+        self.flushing.update(pending)
+        try:
+            await asyncio.to_thread(self._write, pending)
+        finally:
+            for height in pending:
+                self.flushing.pop(height, None)
+
+    def _write(self, pending: dict[int, bytes]):
+        by_segment: dict[int, list[int]] = {}
+        for height in sorted(pending):
+            first = height - height % self.segment_size
+            by_segment.setdefault(first, []).append(height)
+
+        with self.append_lock:
+            for heights in by_segment.values():
+                self._append(self._segment(heights[0]), heights, pending)
+
+    def _append(self, segment: Segment, heights: list[int], pending: dict[int, bytes]):
+        if not segment.open():
+            fd = os.open(segment.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            os.close(fd)
+            segment.open()
+
+        if fcntl is not None:
+            fcntl.flock(segment.fd, fcntl.LOCK_EX)
+        try:
+            # another process may have appended (or crashed mid record) since we last looked
+            segment.refresh()
+            if os.fstat(segment.fd).st_size > segment.end:
+                os.truncate(segment.path, segment.end)
+
+            chunk = bytearray()
+            offset = segment.end
+            for height in heights:
+                if height in segment.index:
+                    continue
+
+                compressed = pending[height]
+                chunk += HEADER.pack(MAGIC, height, len(compressed))
+                chunk += compressed
+                segment.index[height] = (offset + len(chunk) - len(compressed), len(compressed))
+
+            if len(chunk) > 0:
+                os.write(segment.fd, chunk)
+                segment.end = offset + len(chunk)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(segment.fd, fcntl.LOCK_UN)
+
+    def archived(self, heights: list[int]) -> list[int]:
+        """The heights (in the given order) which can be read from the archive."""
+        return [h for h in heights if self.has(h)]
+
+    def read_many(self, heights: list[int], workers: int = 4) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields (height, raw /block response) for archived heights, in the given order.
+        Runs of up to READ_CHUNK heights are read by `workers` threads at once.
+        """
+        self.flush()
+
+        # runs of heights which are next to each other on disk
+        chunks: list[list[int]] = []
+        for height in self.archived(heights):
+            first = height - height % self.segment_size
+            if (
+                len(chunks) == 0
+                or len(chunks[-1]) >= READ_CHUNK
+                or chunks[-1][0] - chunks[-1][0] % self.segment_size != first
+            ):
+                chunks.append([])
+            chunks[-1].append(height)
+
+        def read_chunk(chunk: list[int]) -> list[tuple[int, bytes]]:
+            segment = self._segment(chunk[0])
+            return [(h, segment.read(h)) for h in chunk]
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            queued: deque[Future] = deque()
+            next_chunk = 0
+            while next_chunk < len(chunks) or len(queued) > 0:
+                # keep 2 chunks per worker in flight so the disk is never idle
+                while next_chunk < len(chunks) and len(queued) < workers * 2:
+                    queued.append(pool.submit(read_chunk, chunks[next_chunk]))
+                    next_chunk += 1
+
+                for height, raw in queued.popleft().result():
+                    self.hits += 1
+                    yield height, raw
+
+    def summary(self) -> str:
+        return f"archive {self.path}: {self.hits:,} hits, {self.misses:,} misses"
+
+    def close(self):
+        self.flush()
+        for segment in self.segments.values():
+            segment.close()
@@ -1,4 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+# txs.decode_status. "" is decoded (or not tried yet)
+DECODE_POLICY = "policy"  # saved raw on purpose, decoding.TypePolicy
+DECODE_FAILED = "failed"  # the decoder could not, tried again once decoder_version changes
 
 
 @dataclass
@@ -30,3 +34,18 @@ class Tx:
     tx_json: str
     address: str
     tx_hash: str
+
+
+@dataclass
+class TxDecode:
+    """The decode columns of 1 Tx (decoding.py), saved by Database.insert_block_rows / update_txs."""
+
+    height: int
+    tx_json: str = ""
+    msg_types: str = ""  # JSON list
+    sender: str = ""
+    fields: list[tuple] = field(default_factory=list)  # msg_fields rows, extractors.extract_fields
+    messages: list[tuple] = field(default_factory=list)  # messages rows, extractors.extract_fields
+    status: str = ""
+    error: str = ""
+    decoder_version: str = ""
@@ -0,0 +1,76 @@
+"""
+JSON codec shared by the downloader, the SQL layer, decoding and the scripts.
+
+JSON parsing is the biggest CPU cost of the indexer (multi MB /block responses, every decoded Tx).
+orjson is used when it is installed (pip install orjson), the stdlib json module otherwise.
+
+block_time_and_txs pulls just header.time and data.txs out of a raw /block response without building
+the whole object tree (last_commit signatures, evidence, ...).
+"""
+
+import json
+import re
+
+try:
+    # pip install orjson
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: str | bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """Compact JSON as a str (SQLite TEXT columns)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+_HEADER = re.compile(rb'"header"\s*:\s*\{')
+_TIME = re.compile(rb'"time"\s*:\s*"([^"]*)"')
+_DATA_TXS = re.compile(rb'"data"\s*:\s*\{\s*"txs"\s*:\s*(null|\[)')
+
+
+def block_time_and_txs(raw: bytes) -> tuple[str, list[str]] | None:
+    """
+    Returns (header.time, data.txs) from a raw /block JSON response, or None if it is not a block
+    (ex: an error response). Txs are base64, so they never contain quotes, commas or brackets.
+    Anything unexpected falls back to a full parse.
+    """
+    header = _HEADER.search(raw)
+    if header is None:
+        return _block_time_and_txs_slow(raw)
+
+    block_time = _TIME.search(raw, header.end())
+    if block_time is None:
+        return _block_time_and_txs_slow(raw)
+
+    txs_start = _DATA_TXS.search(raw, block_time.end())
+    if txs_start is None:
+        return _block_time_and_txs_slow(raw)
+
+    if txs_start.group(1) == b"null":
+        return block_time.group(1).decode(), []
+
+    txs_end = raw.find(b"]", txs_start.end())
+    if txs_end < 0 or raw.find(b"\\", txs_start.end(), txs_end) >= 0:
+        return _block_time_and_txs_slow(raw)
+
+    # ["tx1", "tx2"] -> split on quotes, every odd part is a Tx
+    txs = raw[txs_start.end() : txs_end].decode().split('"')[1::2]
+    return block_time.group(1).decode(), txs
+
+
+def _block_time_and_txs_slow(raw: bytes) -> tuple[str, list[str]] | None:
+    try:
+        v = loads(raw)["result"]["block"]
+        return v["header"]["time"], v["data"]["txs"] or []
+    except (KeyError, TypeError, ValueError):
+        return None
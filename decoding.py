@@ -0,0 +1,522 @@
+"""
+Shared decode helpers for main.py and the orchestrator.
+
+Runs the cosmos proto decoder binary (https://github.com/Reecepbcups/juno-decode) over a batch of
+amino Txs, and turns each decoded Tx into the columns we save (msg_types & sender).
+
+StreamDecoder keeps 1 decoder process alive (`<binary> tx decode-stream`): newline delimited
+{"id", "tx"} requests on stdin, {"id", "tx"} (or {"id", "error"}) results on stdout. No temp files,
+no process spawn and no full file JSON load per batch. At most `max_pending` requests are unanswered
+at once, a crashed decoder is restarted and the unanswered Txs sent again. Binaries without
+decode-stream fall back to the decode-file round trip (run_decoder).
+
+DecoderPool runs N decoders at once (COSMOS_PROTO_DECODE_WORKERS) over independent batches, and hands
+the results back in the order the batches were given, so a single writer can save them. Common Tx types
+are decoded in process first (fast_decode.py, COSMOS_PROTO_FAST_DECODE), only the rest reach a decoder.
+
+TypePolicy (DECODE_INCLUDE_TYPES / DECODE_EXCLUDE_TYPES) skips Txs by their message type URLs, read from
+the TxRaw bytes before anything is decoded. They are saved raw with decode_status "policy".
+
+Txs no decoder could handle are saved with decode_status "failed", their error and the pool's
+decoder_version, so they are not sent to the decoder again until the decoder (binary or fast_decode.py)
+changes.
+"""
+
+import asyncio
+import hashlib
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+import codec
+import fast_decode
+from chain_types import DECODE_FAILED, DECODE_POLICY, BlockData, TxDecode
+from extractors import extract_fields
+from fast_decode import decode_tx, message_type_urls
+from util import run_decode_file
+
+# requests written to (and acknowledged by) the stream decoder at once
+STREAM_CHUNK = 256
+
+# decoder errors are saved up to this many characters
+MAX_ERROR_LENGTH = 500
+
+
+def decoder_version(decoder_binary: str, fast: bool = True) -> str:
+    """
+    Hash of the decoder binary (+ fast_decode.py when the fast path is on), stamped on every Tx the pool
+    decodes or fails to.
+    """
+    digest = hashlib.sha256()
+    paths = [shutil.which(decoder_binary) or decoder_binary]
+    if fast:
+        paths.append(fast_decode.__file__)
+
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    digest.update(chunk)
+        except OSError:
+            digest.update(path.encode())
+
+    return digest.hexdigest()[:16]
+
+
+def error_class(error: str) -> str:
+    """Groups decoder errors for the missing report: the text before the first ':', numbers as N."""
+    head = error.split(":")[0].strip()
+    return re.sub(r"\d+", "N", head)[:120] or "unknown"
+
+
+def run_decoder(decoder_binary: str, to_decode: list[dict], tmp_dir: str) -> list[dict]:
+    """
+    to_decode: [{"id": int, "tx": amino}]. Returns [{"id": int, "tx": tx json string}].
+    Txs the decoder could not handle are not in the output.
+    """
+    _rand = str(uuid.uuid4())
+    DUMPFILE = os.path.join(tmp_dir, f"in-{_rand}.json")
+    OUTFILE = os.path.join(tmp_dir, f"out-{_rand}.json")
+
+    # Dump our amino to file so the juno-decoder can pick it up (decodes in chunks)
+    with open(DUMPFILE, "w") as f:
+        f.write(codec.dumps(to_decode))
+
+    try:
+        # Decodes this file, and saves to the output file (from the chain-decoder binary)
+        # Calls syncronously, since we handle so many decodes in 1 call.
+        return run_decode_file(decoder_binary, DUMPFILE, OUTFILE)
+    finally:
+        os.remove(DUMPFILE)
+        if os.path.exists(OUTFILE):
+            os.remove(OUTFILE)
+
+
+def decoded_tx_columns(
+    height: int,
+    tx_id: int,
+    tx_json: str,
+    wallet_prefix: str = "juno",
+    valoper_prefix: str = "junovaloper",
+) -> tuple[str, str, list[tuple], list[tuple]]:
+    """
+    Returns (msg_types json, sender, msg fields, messages) for a decoded Tx, from extractors.py.
+    msg fields: [(msg_index, nested, msg_type, field, value)], saved in msg_fields.
+    messages: [(msg_index, nested, msg_type, signer)], saved in messages.
+    """
+    tx_data = codec.loads(tx_json)
+
+    sender, fields, messages = extract_fields(
+        height, tx_data["body"]["messages"], wallet_prefix, valoper_prefix
+    )
+    if sender is None:
+        print("No sender found for tx: ", tx_id, "at height: ", height)
+        sender = "UNKNOWN"
+
+    # get message types
+    msg_types = {}
+    for msg in tx_data["body"]["messages"]:
+        _type = msg["@type"]
+        if _type not in msg_types:
+            msg_types[_type] = 0
+
+        msg_types[_type] += 1
+
+    msg_types_list = list(msg_types.keys())
+    msg_types_list.sort()
+    # for msg_type, count in msg_types.items():
+    #     # putting in just count is dumb
+    #     db.insert_msg_type_count(msg_type, count, tx.height)
+
+    return codec.dumps(msg_types_list), sender, fields, messages
+
+
+def tx_decode(height: int, tx_id: int, value: dict, version: str) -> TxDecode:
+    """The TxDecode of 1 DecoderPool.decode value."""
+    tx_json = value.get("tx", "")
+    if tx_json == "":
+        return TxDecode(
+            height,
+            status=value.get("status", DECODE_FAILED),
+            error=value.get("error", ""),
+            decoder_version=version,
+        )
+
+    msg_types, sender, fields, messages = decoded_tx_columns(height, tx_id, tx_json)
+    return TxDecode(height, tx_json, msg_types, sender, fields, messages, decoder_version=version)
+
+
+def decoded_rows(values: list[dict], heights: dict[int, int], version: str) -> list[tuple[int, TxDecode]]:
+    """
+    Database.update_txs rows (id, TxDecode) of the decoded `values` of a batch.
+    heights: tx id -> height, values of ids not in it are left out.
+    """
+    rows = []
+    for value in values:
+        tx_id = value["id"]
+        height = heights.get(tx_id)
+        if height is None:
+            continue
+        rows.append((tx_id, tx_decode(height, tx_id, value, version)))
+
+    return rows
+
+
+def blocks_to_decode(blocks: list[BlockData]) -> list[dict]:
+    """[{"id", "tx"}] of every Tx in blocks. Ids are the Tx's index across all of them."""
+    to_decode = []
+    for bd in blocks:
+        for amino in bd.encoded_txs:
+            to_decode.append({"id": len(to_decode), "tx": amino})
+    return to_decode
+
+
+def block_rows(blocks: list[BlockData], values: list[dict], version: str = "") -> list[tuple]:
+    """
+    (height, time, [(amino, TxDecode | None)]) per block, from the decoded `values` of
+    blocks_to_decode(blocks). Txs which were not sent to a decoder are None.
+    """
+    decoded = {value["id"]: value for value in values}
+
+    rows = []
+    index = 0
+    for bd in blocks:
+        txs = []
+        for amino in bd.encoded_txs:
+            value = decoded.get(index)
+            txs.append((amino, None if value is None else tx_decode(bd.height, index, value, version)))
+            index += 1
+        rows.append((bd.height, bd.block_time, txs))
+
+    return rows
+
+
+class StreamDecoder:
+    def __init__(
+        self,
+        decoder_binary: str,
+        tmp_dir: str,
+        max_pending: int = 1_000,
+        max_restarts: int = 3,
+    ):
+        self.decoder_binary = decoder_binary
+        self.tmp_dir = tmp_dir
+        self.max_pending = max(1, max_pending)
+        self.max_restarts = max_restarts
+
+        self.proc: subprocess.Popen | None = None
+        self.streaming = True  # False once the binary turned out to not support decode-stream
+        self.answered = 0
+        self.lock = threading.Lock()
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            [self.decoder_binary, "tx", "decode-stream"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=1 << 16,
+        )
+
+    def _stop(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+    def decode(self, to_decode: list[dict]) -> list[dict]:
+        """
+        Same as run_decoder: [{"id", "tx"}] in, [{"id", "tx"}] out for every Tx which decoded, + the
+        {"id", "error"} the decoder sent back for Txs it could not decode.
+        """
+        with self.lock:
+            if not self.streaming:
+                return run_decoder(self.decoder_binary, to_decode, self.tmp_dir)
+
+            remaining = {value["id"]: value for value in to_decode}
+            results: list[dict] = []
+            restarts = 0
+            while len(remaining) > 0:
+                if self.proc is None or self.proc.poll() is not None:
+                    self._start()
+
+                if not self._stream(list(remaining.values()), remaining, results):
+                    print(
+                        f"{self.decoder_binary} does not support decode-stream, using decode-file"
+                    )
+                    self._stop()
+                    self.streaming = False
+                    return results + run_decoder(
+                        self.decoder_binary, list(remaining.values()), self.tmp_dir
+                    )
+                if len(remaining) == 0:
+                    break
+
+                # the decoder died mid batch
+                self._stop()
+                restarts += 1
+                if restarts <= self.max_restarts:
+                    print(f"Decoder exited, restarting ({restarts}/{self.max_restarts})")
+                    continue
+
+                print(f"Error: decoder keeps exiting, skipping {len(remaining):,} Txs")
+                results += [{"id": _id, "error": "decoder keeps exiting"} for _id in remaining]
+                break
+
+            return results
+
+    async def decode_async(self, to_decode: list[dict]) -> list[dict]:
+        return await asyncio.to_thread(self.decode, to_decode)
+
+    def _stream(self, values: list[dict], remaining: dict[int, dict], results: list[dict]) -> bool:
+        """
+        Returns False if the binary does not speak decode-stream: it answered with something which is not a
+        JSON object (ex: a cobra binary printing its usage), or exited before its first answer ever.
+        """
+        proc = self.proc
+        # backpressure in chunks of lines, a semaphore per line costs more than the decoding
+        chunk_size = min(STREAM_CHUNK, self.max_pending)
+        chunks = [values[i : i + chunk_size] for i in range(0, len(values), chunk_size)]
+        pending = threading.Semaphore(max(1, self.max_pending // chunk_size))
+        stopped = threading.Event()
+
+        def write():
+            try:
+                for chunk in chunks:
+                    if not pending.acquire(blocking=False):
+                        # the decoder is max_pending behind, let it see what it has then wait
+                        proc.stdin.flush()
+                        pending.acquire()
+                    if stopped.is_set():
+                        return
+                    proc.stdin.write(b"".join(codec.dumps(v).encode() + b"\n" for v in chunk))
+                proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                # decoder exited, the reader sees EOF
+                pass
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+
+        answered = 0
+        supported = True
+        partial = b""
+        while answered < len(values) and supported:
+            # everything the decoder has flushed so far, not 1 readline per Tx
+            data = proc.stdout.read1(1 << 16)
+            if data == b"":
+                supported = self.answered + answered > 0
+                break
+
+            lines = (partial + data).split(b"\n")
+            partial = lines.pop()
+            for line in lines:
+                try:
+                    value = codec.loads(line)
+                except ValueError:
+                    value = None
+                if not isinstance(value, dict):
+                    supported = False
+                    break
+
+                answered += 1
+                if answered % chunk_size == 0:
+                    pending.release()
+
+                if remaining.pop(value.get("id"), None) is not None:
+                    results.append(value)
+
+        self.answered += answered
+        stopped.set()
+        if not supported:
+            # it may still be running (ex: waiting on stdin), the writer could block on a full pipe
+            proc.kill()
+        # wake the writer if it waits on a decoder which is gone
+        pending.release(len(chunks))
+        writer.join()
+        return supported
+
+    def close(self):
+        with self.lock:
+            self._stop()
+
+
+class TypePolicy:
+    """
+    Which Txs are decoded, by the type URLs of their messages (+ the ones inside authz MsgExec).
+    A Tx is skipped if any of its types is in `exclude`, or if `include` is set and none of them are in it.
+    Patterns are full type URLs, or prefixes ending in * ("/ibc.core.*").
+    Txs we can not read the types of (legacy amino) are always decoded.
+    """
+
+    def __init__(self, include: list[str] | None = None, exclude: list[str] | None = None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+
+    @staticmethod
+    def _matches(patterns: list[str], type_url: str) -> bool:
+        for pattern in patterns:
+            if pattern.endswith("*"):
+                if type_url.startswith(pattern[:-1]):
+                    return True
+            elif type_url == pattern:
+                return True
+        return False
+
+    def allows(self, tx_b64: str) -> bool:
+        type_urls = message_type_urls(tx_b64)
+        if type_urls is None:
+            return True
+
+        if any(self._matches(self.exclude, url) for url in type_urls):
+            return False
+        if len(self.include) > 0:
+            return any(self._matches(self.include, url) for url in type_urls)
+        return True
+
+
+def type_policy(config: dict) -> TypePolicy | None:
+    """TypePolicy of DECODE_INCLUDE_TYPES / DECODE_EXCLUDE_TYPES, None when both are empty."""
+    include = config.get("DECODE_INCLUDE_TYPES", [])
+    exclude = config.get("DECODE_EXCLUDE_TYPES", [])
+    if len(include) == 0 and len(exclude) == 0:
+        return None
+    return TypePolicy(include, exclude)
+
+
+class DecoderPool:
+    def __init__(
+        self,
+        decoder_binary: str,
+        tmp_dir: str,
+        workers: int = 1,
+        stream: bool = True,
+        fast: bool = False,
+        policy: TypePolicy | None = None,
+    ):
+        self.decoder_binary = decoder_binary
+        self.tmp_dir = tmp_dir
+        self.workers = max(1, workers)
+        self.fast = fast
+        self.policy = policy
+        self.version = decoder_version(decoder_binary, fast)
+
+        # Txs decoded in process / sent to the binary / skipped by the policy / no decoder could handle
+        self.fast_decoded = 0
+        self.binary_decoded = 0
+        self.policy_skipped = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+        # None = no stream decoder, a decode-file process per batch
+        self.idle: queue.Queue[StreamDecoder | None] = queue.Queue()
+        for _ in range(self.workers):
+            self.idle.put(StreamDecoder(decoder_binary, tmp_dir) if stream else None)
+
+    def decode(self, to_decode: list[dict]) -> list[dict]:
+        """
+        Decodes 1 batch on whichever decoder is free. Safe to call from many threads.
+        Every Tx gets a value: {"id", "tx"}, or {"id", "status": DECODE_POLICY} when the policy skips it,
+        or {"id", "status": DECODE_FAILED, "error"} when no decoder could handle it.
+        """
+        if len(to_decode) == 0:
+            return []
+
+        skipped = []
+        if self.policy is not None:
+            rest = []
+            for value in to_decode:
+                if self.policy.allows(value["tx"]):
+                    rest.append(value)
+                else:
+                    skipped.append({"id": value["id"], "status": DECODE_POLICY})
+
+            to_decode = rest
+
+        values = []
+        if self.fast:
+            rest = []
+            for value in to_decode:
+                tx = decode_tx(value["tx"])
+                if tx is None:
+                    rest.append(value)
+                else:
+                    values.append({"id": value["id"], "tx": tx})
+
+            to_decode = rest
+
+        with self.lock:
+            self.fast_decoded += len(values)
+            self.binary_decoded += len(to_decode)
+            self.policy_skipped += len(skipped)
+        if len(to_decode) == 0:
+            return skipped + values
+
+        answers = {value["id"]: value for value in self._decode_binary(to_decode)}
+        failed = []
+        for value in to_decode:
+            answer = answers.get(value["id"], {})
+            if "tx" in answer:
+                values.append(answer)
+            else:
+                error = answer.get("error", "no output from the decoder")
+                failed.append(
+                    {"id": value["id"], "status": DECODE_FAILED, "error": error[:MAX_ERROR_LENGTH]}
+                )
+
+        with self.lock:
+            self.failed += len(failed)
+        return skipped + values + failed
+
+    def _decode_binary(self, to_decode: list[dict]) -> list[dict]:
+        decoder = self.idle.get()
+        try:
+            if decoder is None:
+                return run_decoder(self.decoder_binary, to_decode, self.tmp_dir)
+            return decoder.decode(to_decode)
+        finally:
+            self.idle.put(decoder)
+
+    def imap(
+        self, batches: Iterable[list[dict]]
+    ) -> Iterator[tuple[list[dict], list[dict], float]]:
+        """
+        Yields (batch, decoded values, decode seconds) in the order of `batches`, while up to `workers`
+        batches decode at once. At most 2x workers batches are pulled from `batches` ahead of the caller.
+        """
+
+        def decode_timed(batch: list[dict]) -> tuple[list[dict], list[dict], float]:
+            start = time.perf_counter()
+            values = self.decode(batch)
+            return batch, values, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running: deque[Future] = deque()
+            for batch in batches:
+                running.append(executor.submit(decode_timed, batch))
+                while len(running) >= self.workers * 2:
+                    yield running.popleft().result()
+
+            while len(running) > 0:
+                yield running.popleft().result()
+
+    def close(self):
+        for _ in range(self.workers):
+            decoder = self.idle.get()
+            if decoder is not None:
+                decoder.close()
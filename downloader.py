@@ -0,0 +1,356 @@
+"""
+Sliding window block downloader.
+
+Instead of splitting a range into GROUPING sized lists and gathering each one (where a single
+slow height stalls the whole group), we keep `max_in_flight` requests open across the entire range.
+Finished blocks are held in a small re-order buffer and handed to the writer in height order
+as soon as a contiguous run of `batch_size` blocks is available.
+
+Blocks are fetched either one GET /block?height= per height, or many heights per HTTP round trip
+with Tendermint JSON-RPC batches (fetch_blocks_batch). Heights which fail inside a batch are
+re-queued on their own, the rest of the batch is kept.
+
+If a BlockArchive is given, archived heights are read from disk and every downloaded response is
+added to it (block_archive.py).
+"""
+
+import asyncio
+import time
+import traceback
+from collections import deque
+from typing import Awaitable, Callable
+
+import httpx
+
+import codec
+from autotune import BatchSizeTuner
+from block_archive import BlockArchive
+from chain_types import BlockData
+from rpc_pool import EndpointPool, endpoint_ok
+from util import log_rpc_error
+
+
+class BlockFetchError(Exception):
+    def __init__(self, height: int, rpc_url: str, error: str):
+        super().__init__(f"height {height} @ {rpc_url}: {error}")
+        self.height = height
+        self.rpc_url = rpc_url
+
+
+FetchBlock = Callable[[int], Awaitable[BlockData | None]]
+# Returns the heights which were fetched. Heights missing from the result are re-queued.
+FetchBlocks = Callable[[list[int]], Awaitable[dict[int, BlockData | None]]]
+# may be async (ex: waits for room in main.py's pipeline), fetching carries on meanwhile
+WriteBlocks = Callable[[list[BlockData | None]], None | Awaitable[None]]
+# Called with the height and the last error once a height is given up on.
+FailedBlock = Callable[[int, Exception], None]
+
+
+def block_data(
+    height: int, block_time: str, encoded_block_txs: list[str], amino_length_cutoff: int = 0
+) -> BlockData:
+    # Removes CosmWasm store_codes
+    if amino_length_cutoff <= 0:
+        amino_txs = encoded_block_txs
+    else:
+        amino_txs = [x for x in encoded_block_txs if len(x) <= amino_length_cutoff]
+
+    return BlockData(height, block_time, amino_txs)
+
+
+def parse_block_result(
+    height: int, result: dict, amino_length_cutoff: int = 0
+) -> BlockData | None:
+    """Builds BlockData from the `result` of a /block response."""
+    try:
+        v = result["block"]
+        block_time = v["header"]["time"]  # 2023-04-13T17:46:31.898429796Z
+        encoded_block_txs = v["data"]["txs"] or []  # ["amino1"]
+    except (KeyError, TypeError):
+        return None
+
+    return block_data(height, block_time, encoded_block_txs, amino_length_cutoff)
+
+
+def parse_block_response(
+    height: int, raw: bytes, amino_length_cutoff: int = 0
+) -> BlockData | None:
+    """Builds BlockData from a raw /block response (RPC or archive)."""
+    # Only header.time & data.txs are read out of the (multi MB) response
+    values = codec.block_time_and_txs(raw)
+    if values is None:
+        return None
+
+    block_time, encoded_block_txs = values
+    return block_data(height, block_time, encoded_block_txs, amino_length_cutoff)
+
+
+async def fetch_block(
+    client: httpx.AsyncClient,
+    pool: EndpointPool,
+    height: int,
+    amino_length_cutoff: int = 0,
+    timeout: float = 30,
+    exclude: tuple[str, ...] = (),
+    archive: BlockArchive | None = None,
+) -> BlockData | None:
+    """Raises BlockFetchError if the RPC could not be reached or did not return the block."""
+    if archive is not None:
+        raw = archive.get(height)
+        if raw is not None:
+            return parse_block_response(height, raw, amino_length_cutoff)
+
+    endpoint = await pool.acquire(exclude)
+    url = f"{endpoint.url}/block?height={height}"
+    start = time.monotonic()
+    try:
+        r = await client.get(url, timeout=timeout)
+    except Exception as e:
+        pool.release(endpoint, ok=False)
+        raise BlockFetchError(height, endpoint.url, repr(e)) from e
+    if r.status_code == 200:
+        pool.release(endpoint, ok=True, latency=time.monotonic() - start)
+    else:
+        # a bad height (ex: pruned) goes to the retry queue, it does not take the endpoint out of rotation
+        pool.release(endpoint, ok=endpoint_ok(r.status_code))
+        log_rpc_error(height, r.status_code, endpoint.url, r.text)
+        raise BlockFetchError(height, endpoint.url, f"status {r.status_code}")
+
+    bd = parse_block_response(height, r.content, amino_length_cutoff)
+    if bd is not None and archive is not None:
+        await archive.put_async(height, r.content)
+    return bd
+
+
+async def fetch_blocks_batch(
+    client: httpx.AsyncClient,
+    pool: EndpointPool,
+    heights: list[int],
+    amino_length_cutoff: int = 0,
+    timeout: float = 60,
+    archive: BlockArchive | None = None,
+    tuner: BatchSizeTuner | None = None,
+    exclude: tuple[str, ...] = (),
+    failed_on: dict[int, str] | None = None,
+) -> dict[int, BlockData | None]:
+    """
+    Fetches many heights in 1 round trip with a JSON-RPC batch POST.
+    Only heights which came back without an error are returned, the RPC the others failed on is
+    set in `failed_on` (so a retry can ask another one).
+    The round trip time is given to `tuner`, which sizes the next batches. Only a 200 which parsed as a
+    batch counts as a good round for it.
+    """
+    payload = [
+        {"jsonrpc": "2.0", "id": h, "method": "block", "params": {"height": str(h)}}
+        for h in heights
+    ]
+
+    endpoint = await pool.acquire(exclude)
+    if failed_on is not None:
+        # the ones which come back are popped below
+        failed_on.update((h, endpoint.url) for h in heights)
+    start = time.monotonic()
+    # the slot is always given back, a garbage answer (ex: a proxy's 200 HTML page) fails the whole batch
+    released = False
+    try:
+        try:
+            r = await client.post(endpoint.url, json=payload, timeout=timeout)
+        except Exception as e:
+            if tuner is not None:
+                tuner.observe(ok=False)
+            raise BlockFetchError(heights[0], endpoint.url, repr(e)) from e
+
+        elapsed = time.monotonic() - start
+        if r.status_code != 200:
+            # a 400 / 413 / 500 for the whole batch is not the endpoint's fault (breaker), but it is the size's
+            if tuner is not None:
+                tuner.observe(ok=False)
+            released = True
+            pool.release(endpoint, ok=endpoint_ok(r.status_code))
+            print(f"Error: {r.status_code} @ batch {heights[0]}->{heights[-1]}")
+            log_rpc_error(heights[0], r.status_code, endpoint.url, r.text)
+            return {}
+
+        responses = codec.loads(r.content)
+        if isinstance(responses, dict):
+            # some nodes answer a batch with a single error object
+            responses = [responses]
+        if not isinstance(responses, list):
+            raise ValueError(f"not a JSON-RPC batch response: {type(responses).__name__}")
+
+        blocks: dict[int, BlockData | None] = {}
+        for response in responses:
+            if not isinstance(response, dict):
+                continue
+            try:
+                height = int(response.get("id", -1))
+            except (TypeError, ValueError):
+                continue
+
+            if "error" in response or "result" not in response:
+                log_rpc_error(height, r.status_code, endpoint.url, str(response.get("error")))
+                continue
+
+            blocks[height] = parse_block_result(
+                height, response["result"], amino_length_cutoff
+            )
+            if failed_on is not None:
+                failed_on.pop(height, None)
+            if blocks[height] is not None and archive is not None:
+                # same shape as a /block response, so it reads back like one
+                await archive.put_async(height, codec.dumps({"result": response["result"]}).encode())
+
+        if tuner is not None:
+            tuner.observe(ok=True, latency=elapsed)
+    except BlockFetchError:
+        released = True
+        pool.release(endpoint, ok=False)
+        raise
+    except Exception as e:
+        # the heights are re-queued by download_in_order, like any other failed batch
+        if tuner is not None:
+            tuner.observe(ok=False)
+        released = True
+        pool.release(endpoint, ok=False)
+        print(f"Error: batch {heights[0]}->{heights[-1]} @ {endpoint.url}: {e!r}")
+        return {}
+    finally:
+        if not released:
+            # errors inside the batch are about specific heights (ex: pruned), the endpoint itself answered
+            # fine. Latency per height, so endpoints (and their AIMD windows) compare the same across sizes.
+            pool.release(endpoint, ok=True, latency=elapsed / len(heights))
+
+    return blocks
+
+
+async def download_in_order(
+    heights: list[int],
+    fetch: FetchBlock,
+    write: WriteBlocks,
+    max_in_flight: int = 100,
+    batch_size: int = 1_000,
+    max_buffered: int = 0,
+    fetch_many: FetchBlocks | None = None,
+    fetch_many_size: int | Callable[[], int] = 1,
+    max_requeue: int = 3,
+    on_failed: FailedBlock | None = None,
+) -> int:
+    """
+    Downloads every height with `fetch`, never having more than max_in_flight requests open.
+
+    `write` receives lists of results (None for already saved / failed heights) strictly in the
+    order of `heights`. If it is async, it is awaited before the next list. A list is released once batch_size results are contiguous, and whatever
+    is left is flushed at the end. If a single height is slow, other workers keep downloading until
+    max_buffered results are waiting on it (defaults to 10x batch_size), then pause.
+
+    If `fetch_many` is given, each request asks for up to fetch_many_size heights at once (a callable
+    is asked before every request, ex: autotune.BatchSizeTuner). Heights it does not return are
+    re-queued (max_requeue times) before being given up as None.
+
+    Heights which are given up on are passed to on_failed (ex: to persist them for a later retry).
+
+    Returns the number of results handed to write.
+    """
+    if len(heights) == 0:
+        return 0
+
+    def job_size() -> int:
+        if fetch_many is None:
+            return 1
+        if callable(fetch_many_size):
+            return max(1, fetch_many_size())
+        return max(1, fetch_many_size)
+
+    max_in_flight = max(1, min(max_in_flight, -(-len(heights) // job_size())))
+    batch_size = max(1, batch_size)
+    if max_buffered <= 0:
+        max_buffered = max(batch_size * 10, max_in_flight * job_size())
+
+    pending: deque[tuple[int, int]] = deque(enumerate(heights))
+    requeued: dict[int, int] = {}
+    finished: dict[int, BlockData | None] = {}
+    ready: list[BlockData | None] = []
+    next_index = 0
+    written = 0
+    has_room = asyncio.Condition()
+    # an async write lets other workers release meanwhile, they queue up behind it to keep the order
+    writing = asyncio.Lock()
+
+    async def release(final: bool = False):
+        nonlocal next_index, written
+
+        while next_index in finished:
+            ready.append(finished.pop(next_index))
+            next_index += 1
+
+        async with writing:
+            while len(ready) >= batch_size or (final and len(ready) > 0):
+                values = ready[:batch_size]
+                del ready[:batch_size]
+                result = write(values)
+                if result is not None:
+                    await result
+                written += len(values)
+
+    def give_up(height: int, error: Exception):
+        print(f"Error: download_in_order(): giving up on height {height}: {error}")
+        if on_failed is not None:
+            on_failed(height, error)
+
+    async def fetch_job(job: list[tuple[int, int]]) -> dict[int, BlockData | None]:
+        job_heights = [height for _, height in job]
+        try:
+            if fetch_many is not None:
+                return await fetch_many(job_heights)
+            return {job_heights[0]: await fetch(job_heights[0])}
+        except Exception as e:
+            if fetch_many is not None:
+                print(f"Error: download_in_order(): heights {job_heights[0]}->{job_heights[-1]}: {e}")
+                return {}
+            give_up(job_heights[0], e)
+            return {job_heights[0]: None}
+
+    async def worker():
+        while len(pending) > 0:
+            job = [pending.popleft() for _ in range(min(job_size(), len(pending)))]
+            first_index = min(index for index, _ in job)
+
+            async with has_room:
+                # Only wait if this job does not hold the height everyone else is waiting on.
+                await has_room.wait_for(
+                    lambda: first_index <= next_index or len(finished) < max_buffered
+                )
+
+            values = await fetch_job(job)
+
+            failed = []
+            for index, height in job:
+                if height in values:
+                    finished[index] = values[height]
+                    continue
+
+                requeued[index] = requeued.get(index, 0) + 1
+                if requeued[index] > max_requeue:
+                    give_up(height, Exception(f"failed in {requeued[index]} batches"))
+                    finished[index] = None
+                else:
+                    failed.append((index, height))
+
+            # failed heights go to the front so they do not hold the writer back for long
+            pending.extendleft(reversed(failed))
+            await release()
+
+            async with has_room:
+                has_room.notify_all()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max_in_flight)]
+    try:
+        await asyncio.gather(*workers)
+    except Exception:
+        traceback.print_exc()
+        for w in workers:
+            w.cancel()
+        raise
+
+    await release(final=True)
+    return written
@@ -0,0 +1,292 @@
+"""
+Per message type extractors, run once on every decoded Tx.
+
+Each message @type maps to a function pulling its normalized fields out of the decoded message:
+(field, value) pairs such as sender, recipient, contract, validator, proposal_id, option, source_channel.
+They are saved in the msg_fields table next to the Tx (SQL.py), so scripts query them directly instead of
+re-parsing every tx_json. Every message also gets a row in the messages table (type + signer).
+
+authz MsgExec messages are walked into and flattened: msg_index is the position in the depth first list of
+all messages (the MsgExec, then its inner messages, then the next top level one), nested is how many
+MsgExecs a message is inside of.
+
+Types without an extractor fall back to util.get_sender (known keys, then any address looking value). Each
+type which still has no sender is logged once to no_sender_error.txt (MissLog), so an extractor can be added.
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Callable
+
+from util import get_sender
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+
+# message: [(field, value)], the first "sender" is the message's sender
+Extractor = Callable[[dict], list[tuple[str, str]]]
+
+EXTRACTORS: dict[str, Extractor] = {}
+
+
+def extractor(*type_urls: str):
+    def register(fn: Extractor) -> Extractor:
+        for type_url in type_urls:
+            EXTRACTORS[type_url] = fn
+        return fn
+
+    return register
+
+
+def _fields(msg: dict, **keys: str) -> list[tuple[str, str]]:
+    """(field, msg[key]) for each field=key, skipping keys which are missing or empty."""
+    out = []
+    for field, key in keys.items():
+        value = msg.get(key)
+        if value not in (None, ""):
+            out.append((field, str(value)))
+    return out
+
+
+@extractor("/cosmos.bank.v1beta1.MsgSend")
+def bank_send(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="from_address", recipient="to_address")
+
+
+@extractor("/cosmos.bank.v1beta1.MsgMultiSend")
+def bank_multi_send(msg: dict) -> list[tuple[str, str]]:
+    out = [("sender", i["address"]) for i in msg.get("inputs", [])]
+    out += [("recipient", o["address"]) for o in msg.get("outputs", [])]
+    return out
+
+
+@extractor(
+    "/cosmos.staking.v1beta1.MsgDelegate",
+    "/cosmos.staking.v1beta1.MsgUndelegate",
+    "/cosmos.staking.v1beta1.MsgCancelUnbondingDelegation",
+    "/cosmos.distribution.v1beta1.MsgWithdrawDelegatorReward",
+    "/cosmos.staking.v1beta1.MsgCreateValidator",
+)
+def delegation(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="delegator_address", validator="validator_address")
+
+
+@extractor("/cosmos.staking.v1beta1.MsgBeginRedelegate")
+def redelegate(msg: dict) -> list[tuple[str, str]]:
+    return _fields(
+        msg,
+        sender="delegator_address",
+        validator="validator_src_address",
+        validator_dst="validator_dst_address",
+    )
+
+
+@extractor(
+    "/cosmos.distribution.v1beta1.MsgWithdrawValidatorCommission",
+    "/cosmos.staking.v1beta1.MsgEditValidator",
+)
+def validator(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="validator_address", validator="validator_address")
+
+
+@extractor("/cosmos.slashing.v1beta1.MsgUnjail")
+def unjail(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="validator_addr", validator="validator_addr")
+
+
+@extractor("/cosmos.distribution.v1beta1.MsgSetWithdrawAddress")
+def set_withdraw_address(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="delegator_address", recipient="withdraw_address")
+
+
+@extractor("/cosmos.distribution.v1beta1.MsgFundCommunityPool")
+def fund_community_pool(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="depositor")
+
+
+@extractor("/cosmos.gov.v1beta1.MsgVote", "/cosmos.gov.v1.MsgVote")
+def vote(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="voter", proposal_id="proposal_id", option="option")
+
+
+@extractor("/cosmos.gov.v1beta1.MsgVoteWeighted", "/cosmos.gov.v1.MsgVoteWeighted")
+def vote_weighted(msg: dict) -> list[tuple[str, str]]:
+    out = _fields(msg, sender="voter", proposal_id="proposal_id")
+    out += [("option", o["option"]) for o in msg.get("options", [])]
+    return out
+
+
+@extractor("/cosmos.gov.v1beta1.MsgDeposit", "/cosmos.gov.v1.MsgDeposit")
+def deposit(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="depositor", proposal_id="proposal_id")
+
+
+@extractor("/cosmos.gov.v1beta1.MsgSubmitProposal", "/cosmos.gov.v1.MsgSubmitProposal")
+def submit_proposal(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="proposer")
+
+
+@extractor(
+    "/cosmwasm.wasm.v1.MsgExecuteContract",
+    "/cosmwasm.wasm.v1.MsgUpdateAdmin",
+    "/cosmwasm.wasm.v1.MsgClearAdmin",
+)
+def contract(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="sender", contract="contract")
+
+
+@extractor("/cosmwasm.wasm.v1.MsgMigrateContract")
+def migrate_contract(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="sender", contract="contract", code_id="code_id")
+
+
+@extractor(
+    "/cosmwasm.wasm.v1.MsgInstantiateContract", "/cosmwasm.wasm.v1.MsgInstantiateContract2"
+)
+def instantiate_contract(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="sender", code_id="code_id")
+
+
+@extractor("/cosmwasm.wasm.v1.MsgStoreCode")
+def store_code(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="sender")
+
+
+@extractor("/cosmos.authz.v1beta1.MsgExec")
+def authz_exec(msg: dict) -> list[tuple[str, str]]:
+    # the inner msgs are extracted on their own (extract_fields)
+    return _fields(msg, sender="grantee")
+
+
+@extractor(
+    "/cosmos.authz.v1beta1.MsgGrant",
+    "/cosmos.authz.v1beta1.MsgRevoke",
+    "/cosmos.feegrant.v1beta1.MsgGrantAllowance",
+    "/cosmos.feegrant.v1beta1.MsgRevokeAllowance",
+)
+def grant(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="granter", recipient="grantee")
+
+
+@extractor("/ibc.applications.transfer.v1.MsgTransfer")
+def ibc_transfer(msg: dict) -> list[tuple[str, str]]:
+    return _fields(
+        msg,
+        sender="sender",
+        recipient="receiver",
+        source_port="source_port",
+        source_channel="source_channel",
+    )
+
+
+@extractor(
+    "/ibc.core.channel.v1.MsgRecvPacket",
+    "/ibc.core.channel.v1.MsgAcknowledgement",
+    "/ibc.core.channel.v1.MsgTimeout",
+    "/ibc.core.channel.v1.MsgTimeoutOnClose",
+)
+def ibc_packet(msg: dict) -> list[tuple[str, str]]:
+    packet = msg.get("packet") or {}
+    return _fields(msg, sender="signer") + _fields(
+        packet,
+        source_channel="source_channel",
+        destination_channel="destination_channel",
+        sequence="sequence",
+    )
+
+
+@extractor(
+    "/ibc.core.client.v1.MsgCreateClient",
+    "/ibc.core.client.v1.MsgUpdateClient",
+)
+def ibc_client(msg: dict) -> list[tuple[str, str]]:
+    return _fields(msg, sender="signer", client_id="client_id")
+
+
+class MissLog:
+    """
+    Message types we found no sender for, written to `path` once per type (with the first height it was
+    seen at). Buffered, flushed every `flush_every` new types, `flush_seconds` after the last flush and at exit.
+    """
+
+    def __init__(self, path: str, flush_every: int = 20, flush_seconds: float = 60):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.seen: set[str] = set()
+        self.buffer: list[str] = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, height: int, msg: dict):
+        msg_type = msg.get("@type", "")
+        with self.lock:
+            if msg_type in self.seen:
+                return
+            self.seen.add(msg_type)
+            self.buffer.append(f"{msg_type} - Height:{height} - {msg}\n\n")
+            if (
+                len(self.buffer) >= self.flush_every
+                or time.monotonic() - self.last_flush >= self.flush_seconds
+            ):
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if len(self.buffer) == 0:
+            return
+        with open(self.path, "a") as f:
+            f.write("".join(self.buffer))
+        self.buffer = []
+
+
+miss_log = MissLog(os.path.join(current_dir, "no_sender_error.txt"))
+atexit.register(miss_log.flush)
+
+
+def extract_fields(
+    height: int, messages: list[dict], wallet_prefix: str, valoper_prefix: str
+) -> tuple[str | None, list[tuple[int, int, str, str, str]], list[tuple[int, int, str, str]]]:
+    """
+    (sender of the first message, fields, messages) of a decoded Tx's messages.
+    fields: [(msg_index, nested, msg_type, field, value)], messages: [(msg_index, nested, msg_type, signer)]
+    """
+    sender = None
+    fields = []
+    flat = []
+
+    def walk(nested: int, msg: dict):
+        nonlocal sender
+        msg_index = len(flat)
+        msg_type = msg.get("@type", "")
+        fn = EXTRACTORS.get(msg_type)
+
+        msg_fields = fn(msg) if fn is not None else []
+        msg_sender = next((value for field, value in msg_fields if field == "sender"), None)
+        if msg_sender is None:
+            msg_sender = get_sender(height, msg, wallet_prefix, valoper_prefix)
+            if msg_sender is None:
+                miss_log.record(height, msg)
+            else:
+                msg_fields.insert(0, ("sender", msg_sender))
+
+        if msg_index == 0:
+            sender = msg_sender
+
+        flat.append((msg_index, nested, msg_type, msg_sender or ""))
+        for field, value in msg_fields:
+            fields.append((msg_index, nested, msg_type, field, value))
+
+        if msg_type == "/cosmos.authz.v1beta1.MsgExec":
+            for inner in msg.get("msgs", []):
+                walk(nested + 1, inner)
+
+    for msg in messages:
+        walk(0, msg)
+
+    return sender, fields, flat
@@ -0,0 +1,434 @@
+"""
+In process decoder for the most common Cosmos Tx messages, so they skip the juno-decode binary.
+
+Txs are saved as base64 TxRaw protobuf. For Txs where every message (and pubkey) is in MESSAGES we walk the
+protobuf wire format ourselves and build the same JSON the binary prints (the cosmos-sdk ProtoMarshalJSON
+shape: fields in .proto order & named as in it, 64 bit ints as strings, bytes as base64, enums by name,
+defaults included). Anything else (unknown type, unknown field, legacy amino, multi sign mode, ...) returns
+None and goes to the binary, so the fast path never guesses.
+
+Checked against the binary with benchmarks/conformance_fast_decode.py.
+"""
+
+import base64
+import binascii
+
+import codec
+
+# field kinds
+STRING = "string"
+UINT64 = "uint64"  # JSON string
+INT64 = "int64"  # JSON string
+UINT32 = "uint32"  # JSON number
+BOOL = "bool"
+BYTES = "bytes"  # base64
+JSON = "json"  # bytes holding JSON (cosmwasm RawContractMessage), inlined
+ANY = "any"  # google.protobuf.Any of a type in MESSAGES, {"@type": ..., fields}
+
+# field labels
+SINGLE = 0
+REPEATED = 1
+ONEOF = 2  # only in the JSON when it is set
+
+
+class FastDecodeError(Exception):
+    pass
+
+
+def message(fields: dict) -> tuple:
+    return ("message", fields)
+
+
+def enum(values: dict) -> tuple:
+    return ("enum", values)
+
+
+# {field number: (json name, kind, label)}
+COIN = message(
+    {
+        1: ("denom", STRING, SINGLE),
+        2: ("amount", STRING, SINGLE),
+    }
+)
+
+VOTE_OPTION = enum(
+    {
+        0: "VOTE_OPTION_UNSPECIFIED",
+        1: "VOTE_OPTION_YES",
+        2: "VOTE_OPTION_ABSTAIN",
+        3: "VOTE_OPTION_NO",
+        4: "VOTE_OPTION_NO_WITH_VETO",
+    }
+)
+
+SIGN_MODE = enum(
+    {
+        0: "SIGN_MODE_UNSPECIFIED",
+        1: "SIGN_MODE_DIRECT",
+        2: "SIGN_MODE_TEXTUAL",
+        127: "SIGN_MODE_LEGACY_AMINO_JSON",
+    }
+)
+
+BANK_IO = message(
+    {
+        1: ("address", STRING, SINGLE),
+        2: ("coins", COIN, REPEATED),
+    }
+)
+
+DELEGATE = {
+    1: ("delegator_address", STRING, SINGLE),
+    2: ("validator_address", STRING, SINGLE),
+    3: ("amount", COIN, SINGLE),
+}
+
+PUBKEY = {1: ("key", BYTES, SINGLE)}
+
+# type url: fields. Messages and pubkeys (both are packed in an Any).
+MESSAGES: dict[str, dict] = {
+    "/cosmos.bank.v1beta1.MsgSend": {
+        1: ("from_address", STRING, SINGLE),
+        2: ("to_address", STRING, SINGLE),
+        3: ("amount", COIN, REPEATED),
+    },
+    "/cosmos.bank.v1beta1.MsgMultiSend": {
+        1: ("inputs", BANK_IO, REPEATED),
+        2: ("outputs", BANK_IO, REPEATED),
+    },
+    "/cosmos.staking.v1beta1.MsgDelegate": DELEGATE,
+    "/cosmos.staking.v1beta1.MsgUndelegate": DELEGATE,
+    "/cosmos.staking.v1beta1.MsgBeginRedelegate": {
+        1: ("delegator_address", STRING, SINGLE),
+        2: ("validator_src_address", STRING, SINGLE),
+        3: ("validator_dst_address", STRING, SINGLE),
+        4: ("amount", COIN, SINGLE),
+    },
+    "/cosmos.distribution.v1beta1.MsgWithdrawDelegatorReward": {
+        1: ("delegator_address", STRING, SINGLE),
+        2: ("validator_address", STRING, SINGLE),
+    },
+    "/cosmos.distribution.v1beta1.MsgWithdrawValidatorCommission": {
+        1: ("validator_address", STRING, SINGLE),
+    },
+    "/cosmos.distribution.v1beta1.MsgSetWithdrawAddress": {
+        1: ("delegator_address", STRING, SINGLE),
+        2: ("withdraw_address", STRING, SINGLE),
+    },
+    "/cosmos.gov.v1beta1.MsgVote": {
+        1: ("proposal_id", UINT64, SINGLE),
+        2: ("voter", STRING, SINGLE),
+        3: ("option", VOTE_OPTION, SINGLE),
+    },
+    "/cosmos.authz.v1beta1.MsgExec": {
+        1: ("grantee", STRING, SINGLE),
+        2: ("msgs", ANY, REPEATED),
+    },
+    "/cosmwasm.wasm.v1.MsgExecuteContract": {
+        1: ("sender", STRING, SINGLE),
+        2: ("contract", STRING, SINGLE),
+        3: ("msg", JSON, SINGLE),
+        5: ("funds", COIN, REPEATED),
+    },
+    "/cosmwasm.wasm.v1.MsgInstantiateContract": {
+        1: ("sender", STRING, SINGLE),
+        2: ("admin", STRING, SINGLE),
+        3: ("code_id", UINT64, SINGLE),
+        4: ("label", STRING, SINGLE),
+        5: ("msg", JSON, SINGLE),
+        6: ("funds", COIN, REPEATED),
+    },
+    # pubkeys
+    "/cosmos.crypto.secp256k1.PubKey": PUBKEY,
+    "/cosmos.crypto.ed25519.PubKey": PUBKEY,
+    "/cosmos.crypto.multisig.LegacyAminoPubKey": {
+        1: ("threshold", UINT32, SINGLE),
+        2: ("public_keys", ANY, REPEATED),
+    },
+}
+
+TX_BODY = {
+    1: ("messages", ANY, REPEATED),
+    2: ("memo", STRING, SINGLE),
+    3: ("timeout_height", UINT64, SINGLE),
+    1023: ("extension_options", ANY, REPEATED),
+    2047: ("non_critical_extension_options", ANY, REPEATED),
+}
+
+AUTH_INFO = {
+    1: (
+        "signer_infos",
+        message(
+            {
+                1: ("public_key", ANY, SINGLE),
+                2: (
+                    "mode_info",
+                    message({1: ("single", message({1: ("mode", SIGN_MODE, SINGLE)}), ONEOF)}),
+                    SINGLE,
+                ),
+                3: ("sequence", UINT64, SINGLE),
+            }
+        ),
+        REPEATED,
+    ),
+    2: (
+        "fee",
+        message(
+            {
+                1: ("amount", COIN, REPEATED),
+                2: ("gas_limit", UINT64, SINGLE),
+                3: ("payer", STRING, SINGLE),
+                4: ("granter", STRING, SINGLE),
+            }
+        ),
+        SINGLE,
+    ),
+    3: (
+        "tip",
+        message(
+            {
+                1: ("amount", COIN, REPEATED),
+                2: ("tipper", STRING, SINGLE),
+            }
+        ),
+        SINGLE,
+    ),
+}
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise FastDecodeError("varint too long")
+
+
+def _fields(data: bytes):
+    """(field number, wire type, value) of every field. Varints are ints, the rest bytes."""
+    pos, end = 0, len(data)
+    while pos < end:
+        # nearly every key / length is 1 byte
+        key = data[pos]
+        if key < 0x80:
+            pos += 1
+        else:
+            key, pos = _varint(data, pos)
+
+        wire = key & 7
+        if wire == 2:
+            length = data[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = _varint(data, pos)
+            if pos + length > end:
+                raise FastDecodeError("truncated field")
+            yield key >> 3, 2, data[pos : pos + length]
+            pos += length
+        elif wire == 0:
+            value, pos = _varint(data, pos)
+            yield key >> 3, 0, value
+        else:
+            # fixed32 / fixed64 / groups are not used by any message we decode
+            raise FastDecodeError(f"wire type {wire}")
+
+
+def _varint_value(convert):
+    def value(wire: int, v):
+        if wire != 0:
+            raise FastDecodeError("field is not a varint")
+        return convert(v)
+
+    return value
+
+
+def _delimited_value(convert):
+    def value(wire: int, v):
+        if wire != 2:
+            raise FastDecodeError("field is not length delimited")
+        return convert(v)
+
+    return value
+
+
+# kind: (JSON default, (wire type, value) -> JSON value)
+_KINDS = {
+    STRING: ("", _delimited_value(lambda v: v.decode("utf-8"))),
+    UINT64: ("0", _varint_value(str)),
+    INT64: ("0", _varint_value(lambda v: str(v - (1 << 64) if v >= 1 << 63 else v))),
+    UINT32: (0, _varint_value(int)),
+    BOOL: (False, _varint_value(bool)),
+    BYTES: (None, _delimited_value(lambda v: base64.b64encode(v).decode())),
+    JSON: (None, _delimited_value(codec.loads)),
+    ANY: (None, _delimited_value(lambda v: _any(v))),
+}
+
+
+def _enum_value(values: dict):
+    def value(wire: int, v):
+        if wire != 0 or v not in values:
+            raise FastDecodeError(f"enum value {v}")
+        return values[v]
+
+    return value
+
+
+def _kind(kind) -> tuple:
+    if not isinstance(kind, tuple):
+        return _KINDS[kind]
+    if kind[0] == "enum":
+        return kind[1][0], _enum_value(kind[1])
+    fields = kind[1]
+    return None, _delimited_value(lambda v: _message(v, fields))
+
+
+# id(fields): (JSON defaults, repeated names, {field number: (name, value fn, repeated)})
+# The defaults hold every field but the oneofs, in the order of `fields` (the binary prints them in .proto order).
+_compiled: dict[int, tuple[dict, list[str], dict]] = {}
+
+
+def _compile(fields: dict) -> tuple[dict, list[str], dict]:
+    defaults, repeated, by_number = {}, [], {}
+    for number, (name, kind, label) in fields.items():
+        default, value = _kind(kind)
+        if label == REPEATED:
+            repeated.append(name)
+            # a new list per message, this only keeps the field's place
+            defaults[name] = None
+        elif label == SINGLE:
+            defaults[name] = default
+        by_number[number] = (name, value, label == REPEATED)
+
+    _compiled[id(fields)] = (defaults, repeated, by_number)
+    return _compiled[id(fields)]
+
+
+def _message(data: bytes, fields: dict) -> dict:
+    compiled = _compiled.get(id(fields))
+    defaults, repeated, by_number = compiled if compiled is not None else _compile(fields)
+
+    out = defaults.copy()
+    for name in repeated:
+        out[name] = []
+
+    for number, wire, value in _fields(data):
+        field = by_number.get(number)
+        if field is None:
+            raise FastDecodeError(f"unknown field {number}")
+
+        name, value_fn, is_repeated = field
+        if is_repeated:
+            out[name].append(value_fn(wire, value))
+        else:
+            out[name] = value_fn(wire, value)
+
+    return out
+
+
+def _any(data: bytes) -> dict:
+    type_url, value = "", b""
+    for number, wire, v in _fields(data):
+        if wire != 2:
+            raise FastDecodeError("Any field is not length delimited")
+        if number == 1:
+            type_url = v.decode("utf-8")
+        elif number == 2:
+            value = v
+        else:
+            raise FastDecodeError(f"unknown Any field {number}")
+
+    fields = MESSAGES.get(type_url)
+    if fields is None:
+        raise FastDecodeError(f"unsupported type {type_url}")
+
+    out = {"@type": type_url}
+    out.update(_message(value, fields))
+    return out
+
+
+def decode_tx_dict(tx_b64: str) -> dict:
+    """The decoded Tx of a base64 TxRaw. Raises FastDecodeError if the binary has to decode it."""
+    try:
+        raw = base64.b64decode(tx_b64, validate=True)
+        body, auth_info, signatures = b"", b"", []
+        for number, wire, value in _fields(raw):
+            if wire != 2:
+                raise FastDecodeError("TxRaw field is not length delimited")
+            if number == 1:
+                body = value
+            elif number == 2:
+                auth_info = value
+            elif number == 3:
+                signatures.append(base64.b64encode(value).decode())
+            else:
+                raise FastDecodeError(f"unknown TxRaw field {number}")
+
+        tx_body = _message(body, TX_BODY)
+        if len(tx_body["messages"]) == 0:
+            # every real Tx has a message, more likely bytes that only look like protobuf
+            raise FastDecodeError("no messages")
+
+        return {
+            "body": tx_body,
+            "auth_info": _message(auth_info, AUTH_INFO),
+            "signatures": signatures,
+        }
+    except (IndexError, ValueError, UnicodeDecodeError, binascii.Error) as e:
+        # truncated / not protobuf (ex: legacy amino Txs) / bad utf-8 or JSON
+        raise FastDecodeError(repr(e)) from e
+
+
+def decode_tx(tx_b64: str) -> str | None:
+    """The decoded Tx JSON string (same as the binary), or None if the binary has to decode it."""
+    try:
+        return codec.dumps(decode_tx_dict(tx_b64))
+    except FastDecodeError:
+        return None
+
+
+AUTHZ_EXEC = "/cosmos.authz.v1beta1.MsgExec"
+
+
+def _any_type_urls(data: bytes, urls: list[str]):
+    type_url, value = "", b""
+    for number, wire, v in _fields(data):
+        if wire != 2:
+            raise FastDecodeError("Any field is not length delimited")
+        if number == 1:
+            type_url = v.decode("utf-8")
+        elif number == 2:
+            value = v
+
+    urls.append(type_url)
+    if type_url == AUTHZ_EXEC:
+        # MsgExec.msgs
+        for number, wire, v in _fields(value):
+            if number == 2 and wire == 2:
+                _any_type_urls(v, urls)
+
+
+def message_type_urls(tx_b64: str) -> list[str] | None:
+    """
+    Type URLs of a base64 TxRaw's messages (+ the ones inside authz MsgExec), read from the Any headers
+    only, nothing else is decoded. None if it is not a protobuf TxRaw (ex: legacy amino Txs).
+    """
+    try:
+        raw = base64.b64decode(tx_b64, validate=True)
+        urls: list[str] = []
+        for number, wire, body in _fields(raw):
+            if number == 1 and wire == 2:
+                # TxBody.messages, memo & the rest are skipped over
+                for body_number, body_wire, value in _fields(body):
+                    if body_number == 1 and body_wire == 2:
+                        _any_type_urls(value, urls)
+                break
+        return urls if len(urls) > 0 else None
+    except (FastDecodeError, IndexError, ValueError, UnicodeDecodeError, binascii.Error):
+        return None
@@ -1,5 +1,6 @@
 """
-We subscribe to check when the latest block is updated, then we query it normally via the RPC & save it
+We bulk download every missing block up to the tip, then (sync task) subscribe to NewBlock events over the
+RPC websocket and save / decode each new block the moment it arrives (tip_follower.py).
 
 Flow:
 - Async save to JSON files (each are unique so its good)
@@ -8,19 +9,33 @@ Flow:
 """
 
 import asyncio
+import contextlib
 import json
 import os
-import random
 import sys
 import time
 import traceback
-import uuid
 
 import httpx
 
+import codec
+from autotune import BatchSizeTuner
+from block_archive import BlockArchive
 from chain_types import BlockData, DecodeGroup
+from decoding import DecoderPool, decoded_rows, error_class, type_policy
+from downloader import (
+    download_in_order,
+    fetch_block,
+    fetch_blocks_batch,
+    parse_block_response,
+    parse_block_result,
+)
+from pipeline import Pipeline
+from rpc_pool import EndpointPool
 from SQL import Database
-from util import command_exists, get_latest_chain_height, get_sender, run_decode_file
+from stats import stats
+from tip_follower import TipFollower
+from util import command_exists, get_latest_chain_height_async
 
 current_dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -53,11 +68,51 @@ COSMOS_PROTO_DECODE_BLOCK_LIMIT = chain_config.get(
 if not command_exists(COSMOS_PROTO_DECODER_BINARY_FILE):
     print(f"Command {COSMOS_PROTO_DECODER_BINARY_FILE} not found")
     exit(1)
+# Keeps 1 decoder process running (`tx decode-stream`) instead of temp files + a process per batch.
+# Binaries without decode-stream fall back to decode-file on their own.
+COSMOS_PROTO_DECODE_STREAM = chain_config.get("COSMOS_PROTO_DECODE_STREAM", True)
+# Decoders running at once over independent batches of DECODE_LIMIT Txs (1 per core for a full decode).
+COSMOS_PROTO_DECODE_WORKERS = chain_config.get("COSMOS_PROTO_DECODE_WORKERS", 1)
+# Decodes common Tx types (bank, staking, gov, wasm execute, ...) in process, the rest go to the binary.
+# Off until tests/data/fast_decode_corpus.jsonl (real Txs + juno-decode's output) is checked in: its tx_json
+# is saved and never decoded again.
+COSMOS_PROTO_FAST_DECODE = chain_config.get("COSMOS_PROTO_FAST_DECODE", False)
+
+# Message type URLs (or "prefix*") to decode / not decode. Skipped Txs are still saved, raw with
+# decode_status "policy". Checked on the TxRaw bytes, before anything is decoded.
+DECODE_INCLUDE_TYPES = chain_config.get("DECODE_INCLUDE_TYPES", [])
+DECODE_EXCLUDE_TYPES = chain_config.get("DECODE_EXCLUDE_TYPES", [])
 
 # The length of amino to cut off at. If it is longer than this, it will not be decoded.
-# This helps to ignore large msgs such as IBC Txs and store codes
+# This helps to ignore large msgs such as IBC Txs and store codes (they are not saved at all,
+# DECODE_EXCLUDE_TYPES keeps them)
 TX_AMINO_LENGTH_CUTTOFF_LIMIT = chain_config.get("TX_AMINO_LENGTH_CUTTOFF_LIMIT", 0)
 
+# download & sync: groups of blocks waiting between the fetch -> decode -> persist stages (pipeline.py).
+# Downloaded Txs are decoded in memory before they are saved in sync (or with DECODE_ON_DOWNLOAD).
+PIPELINE_QUEUE_SIZE = chain_config.get("PIPELINE_QUEUE_SIZE", 4)
+DECODE_ON_DOWNLOAD = TASK == "sync" or chain_config.get("DECODE_ON_DOWNLOAD", False)
+
+# Heights which fail to download are retried with exponential backoff (+ jitter) on another RPC.
+# After RETRY_MAX_ATTEMPTS they are dead lettered in the retry_queue table (see the `missing` task).
+RETRY_MAX_ATTEMPTS = chain_config.get("RETRY_MAX_ATTEMPTS", 8)
+RETRY_BASE_SECONDS = chain_config.get("RETRY_BASE_SECONDS", 5)
+RETRY_MAX_SECONDS = chain_config.get("RETRY_MAX_SECONDS", 3600)
+# Due retries are downloaded by a background task this often, never in front of new work (a height which
+# always fails would hold up every tip).
+RETRY_INTERVAL_SECONDS = chain_config.get("RETRY_INTERVAL_SECONDS", 30)
+
+# Raw /block responses are kept in a local compressed archive, so a re-index reads them from disk
+# instead of the RPCs. "" disables it.
+BLOCK_ARCHIVE_DIR = chain_config.get("BLOCK_ARCHIVE_DIR", "")
+BLOCK_ARCHIVE_SEGMENT_SIZE = chain_config.get("BLOCK_ARCHIVE_SEGMENT_SIZE", 10_000)
+BLOCK_ARCHIVE_READ_WORKERS = chain_config.get("BLOCK_ARCHIVE_READ_WORKERS", 4)
+
+# p50 / p99 per stage + peak RSS are written here (benchmarks/bench_indexer.py). "" disables it.
+STATS_FILE = chain_config.get("STATS_FILE", "")
+if STATS_FILE != "":
+    STATS_FILE = os.path.join(current_dir, STATS_FILE)
+
 WALLET_PREFIX = chain_config.get("WALLET_PREFIX", "juno1")
 VALOPER_PREFIX = chain_config.get("VALOPER_PREFIX", "junovaloper1")
 
@@ -69,17 +124,54 @@ if specific_section == {}:
 START_BLOCK = specific_section.get("start", -1)
 END_BLOCK = specific_section.get("end", -1)
 GROUPING = specific_section.get("grouping", 10_000)
+# How many /block requests are kept open at once across the whole range.
+MAX_IN_FLIGHT = specific_section.get("max_in_flight", 100)
 if START_BLOCK < 0 or END_BLOCK < 0:
     print("START_BLOCK or END_BLOCK is not set correctly")
     exit(1)
+# START_BLOCK moves in sync mode, failed heights are retried from the configured start.
+SECTION_START_BLOCK = START_BLOCK
 RPC_ARCHIVE_LINKS: list[str] = specific_section.get("rpc_endpoints", [])
 if len(RPC_ARCHIVE_LINKS) == 0:
     print(f"RPC_ARCHIVE_LINKS is empty")
     exit(1)
+# Cap per RPC so one node is not rate limited while a slower one holds the rest of the window.
+MAX_IN_FLIGHT_PER_ENDPOINT = specific_section.get(
+    "max_in_flight_per_endpoint", MAX_IN_FLIGHT
+)
+# > 1 fetches this many heights per HTTP request with JSON-RPC batches. (1 = GET /block per height)
+RPC_BATCH_SIZE = specific_section.get("rpc_batch_size", 1)
+# AIMD: open requests per RPC (and heights per batch) are tuned from latencies & failures,
+# max_in_flight_per_endpoint / rpc_batch_size become the ceilings.
+ADAPTIVE = specific_section.get("adaptive", True)
+RPC_BATCH_TARGET_SECONDS = specific_section.get("rpc_batch_target_seconds", 5)
+rpc_pool = EndpointPool(
+    RPC_ARCHIVE_LINKS, MAX_IN_FLIGHT_PER_ENDPOINT, adaptive=ADAPTIVE
+)
+batch_tuner: BatchSizeTuner | None = None
+if ADAPTIVE and RPC_BATCH_SIZE > 1:
+    batch_tuner = BatchSizeTuner(
+        min(10, RPC_BATCH_SIZE), RPC_BATCH_SIZE, RPC_BATCH_TARGET_SECONDS
+    )
+
+block_archive: BlockArchive | None = None
+if BLOCK_ARCHIVE_DIR != "":
+    block_archive = BlockArchive(
+        os.path.join(current_dir, BLOCK_ARCHIVE_DIR), BLOCK_ARCHIVE_SEGMENT_SIZE
+    )
 
 tmp_decode_dir = os.path.join(current_dir, "tmp_decode")
 os.makedirs(tmp_decode_dir, exist_ok=True)
 
+decoder_pool = DecoderPool(
+    COSMOS_PROTO_DECODER_BINARY_FILE,
+    tmp_decode_dir,
+    COSMOS_PROTO_DECODE_WORKERS,
+    stream=COSMOS_PROTO_DECODE_STREAM,
+    fast=COSMOS_PROTO_FAST_DECODE,
+    policy=type_policy(chain_config),
+)
+
 built_in_print = print
 
 
@@ -96,210 +188,338 @@ print(f"Starting {TASK} task")
 
 # Initialized below
 db: Database
+pipeline: Pipeline
+
+# height: RPC it last failed on, for retries from the retry_queue
+retry_endpoints: dict[int, str] = {}
 
 
 async def download_block(client: httpx.AsyncClient, height: int) -> BlockData | None:
-    if db.get_block(height) != None:
-        if height % (GROUPING * 5) == 0:
-            print(f"Block {height} is already saved.")
-        return None
-
-    RPC_ARCHIVE_URL = random.choice(RPC_ARCHIVE_LINKS)
-    REAL_URL = f"{RPC_ARCHIVE_URL}/block?height={height}"
-    # TODO: on SSL / error, retry 1 time? (without inf loop)
-    r = await client.get(REAL_URL, timeout=30)
-    if r.status_code != 200:
-        print(f"Error: {r.status_code} @ height {height}")
-        with open(os.path.join(current_dir, f"errors.txt"), "a") as f:
-            f.write(
-                f"Height: {height};{r.status_code} @ {RPC_ARCHIVE_URL} @ {time.time()};{r.text}\n\n"
-            )
-        return None
+    # Already saved heights are filtered out before scheduling (do_mass_url_download_and_decode)
+    exclude = ()
+    if height in retry_endpoints:
+        exclude = (retry_endpoints.pop(height),)
+
+    with stats.timed("fetch"):
+        return await fetch_block(
+            client,
+            rpc_pool,
+            height,
+            TX_AMINO_LENGTH_CUTTOFF_LIMIT,
+            exclude=exclude,
+            archive=block_archive,
+        )
 
-    block_time = ""
-    encoded_block_txs: list = []
-    try:
-        v = r.json()["result"]["block"]
-        block_time = v["header"]["time"]  # 2023-04-13T17:46:31.898429796Z
-        encoded_block_txs = v["data"]["txs"]  # ["amino1"]
-    except KeyError:
-        return None
-
-    # Removes CosmWasm store_codes
-    amino_txs = []
-    if TX_AMINO_LENGTH_CUTTOFF_LIMIT <= 0:
-        amino_txs = encoded_block_txs
-    else:
-        for x in encoded_block_txs:
-            if len(x) <= TX_AMINO_LENGTH_CUTTOFF_LIMIT:
-                amino_txs.append(x)
-                continue
 
-    return BlockData(height, block_time, amino_txs)
+async def download_blocks(
+    client: httpx.AsyncClient, heights: list[int], failed_on: dict[int, str]
+) -> dict[int, BlockData | None]:
+    # JSON-RPC batch of heights. Heights missing from the result are re-queued by the downloader.
+    # Retried heights avoid the RPCs they failed on, like download_block.
+    exclude = tuple(
+        sorted({retry_endpoints.pop(h) for h in heights if h in retry_endpoints})
+    )
 
+    with stats.timed("fetch_batch"):
+        return await fetch_blocks_batch(
+            client,
+            rpc_pool,
+            heights,
+            TX_AMINO_LENGTH_CUTTOFF_LIMIT,
+            archive=block_archive,
+            tuner=batch_tuner,
+            exclude=exclude,
+            failed_on=failed_on,
+        )
 
-# TODO: change to block range already calulated?
-# async def do_mass_url_download_and_decode(i: int, httpx_client):
-async def do_mass_url_download_and_decode(block_range: list[int] | range, httpx_client):
-    if isinstance(block_range, range):
-        block_range = list(block_range)
 
-    tasks = {}
-    start_time = time.time()
-    for block in block_range:
-        if block > END_BLOCK:
-            break
+def queue_failed_height(height: int, error: Exception, rpc_url: str = ""):
+    attempts = db.queue_retry(
+        height,
+        str(error),
+        getattr(error, "rpc_url", rpc_url),
+        RETRY_MAX_ATTEMPTS,
+        RETRY_BASE_SECONDS,
+        RETRY_MAX_SECONDS,
+    )
+    db.commit()
 
-        if block != 0:
-            tasks[block] = asyncio.create_task(download_block(httpx_client, block))
+    if attempts >= RETRY_MAX_ATTEMPTS:
+        print(f"Height {height} failed {attempts} times, dead lettered in retry_queue")
 
-    # This should never happen, just a precaution.
-    # When this does happen nothing works (ex: node down, no binary to decode)
-    try:
-        values = await asyncio.gather(*tasks.values())
-        if not all(x is None for x in values):
-            save_values_to_sql(values)
-            print(
-                f"Finished #{len(block_range)} blocks in {round(time.time() - start_time, 4)} seconds ({block_range[0]}->{block_range[-1]})"
-            )
-    except Exception as e:
-        print(f"Erorr: main(): {e}")
-        traceback.print_exc()
 
+async def do_mass_url_download_and_decode(block_range: range, httpx_client):
+    start = max(block_range.start, 1)
+    end = min(block_range.stop - 1, END_BLOCK)
 
-async def main():
-    global START_BLOCK, END_BLOCK
+    heights: list[int] = []
+    if end >= start:
+        # Only schedule heights which are not already saved (1 query for the whole range)
+        heights = db.get_missing_blocks(start, end)
+        already_saved = (end - start + 1) - len(heights)
+        if already_saved > 0:
+            print(f"Skipping {already_saved:,} already saved blocks in {start:,}->{end:,}")
 
-    while True:
-        last_saved_block = db.get_latest_saved_block()
-        latest_saved_height = 0
-        if last_saved_block is not None:
-            latest_saved_height = last_saved_block.height
+    # Failed heights are left to retry_failed_heights
+    queued = db.get_queued_retries()
+    if len(queued) > 0:
+        heights = [h for h in heights if h not in queued]
 
-        current_chain_height = get_latest_chain_height(RPC_ARCHIVE=RPC_ARCHIVE_LINKS[0])
-        print(
-            f"Last saved: {latest_saved_height:,} & Chain height: {current_chain_height:,}"
-        )
+    if len(heights) == 0:
+        return
 
-        if END_BLOCK > current_chain_height:
-            END_BLOCK = current_chain_height
+    await download_and_save(heights, httpx_client)
 
-        if TASK == "sync":
-            START_BLOCK = latest_saved_height
-            END_BLOCK = current_chain_height
 
-        # ensure end is a multiple of grouping
-        GROUP_END_BLOCK = END_BLOCK - (END_BLOCK % GROUPING)
-        print(f"Bulk Blocks: {START_BLOCK:,}->{END_BLOCK:,}")
+async def retry_failed_heights(httpx_client: httpx.AsyncClient):
+    """Downloads the heights of the retry queue whose backoff is over (on another RPC if we have one)."""
+    due = db.get_due_retries(time.time(), SECTION_START_BLOCK, END_BLOCK)
+    if len(due) == 0:
+        return
 
-        # This is a list of list of tasks to do. Each task should be done on its own thread\
-        async with httpx.AsyncClient() as httpx_client:
-            # if the range is less than GROUPING, we run through that range only
-            if END_BLOCK - START_BLOCK <= GROUPING:
-                await do_mass_url_download_and_decode(
-                    range(START_BLOCK, current_chain_height + 1), httpx_client
-                )
-            else:
-                num_groups = (GROUP_END_BLOCK - START_BLOCK) // GROUPING + 1
-                for i in range(num_groups):
-                    block_heights = [
-                        bh
-                        for bh in range(
-                            START_BLOCK + i * GROUPING, START_BLOCK + (i + 1) * GROUPING
-                        )
-                    ]
-                    await do_mass_url_download_and_decode(block_heights, httpx_client)
-
-                # Do we miss the start block with this?
-                remainder_blocks = range(GROUP_END_BLOCK, END_BLOCK + 1)
-                if remainder_blocks != []:
-                    await do_mass_url_download_and_decode(
-                        remainder_blocks, httpx_client
-                    )
-
-                # print(f"early return on purpose for testing"); exit(1)
-
-        print("Sleeping for more blocks.")
-        time.sleep(10)
-        # exit(1)
-
-
-def decode_and_save_updated(to_decode: list[dict]):
-    global db
+    print(f"Retrying {len(due):,} failed heights from the retry queue")
+    retry_endpoints.update(due)
+    try:
+        await download_and_save(sorted(due), httpx_client)
+    finally:
+        # heights which were not fetched (ex: read from the block archive) do not stay in it forever
+        for height in due:
+            retry_endpoints.pop(height, None)
 
-    start_time = time.time()
 
-    _rand = str(uuid.uuid4())
-    DUMPFILE = os.path.join(tmp_decode_dir, f"in-{_rand}.json")
-    OUTFILE = os.path.join(tmp_decode_dir, f"out-{_rand}.json")
+async def retry_loop(httpx_client: httpx.AsyncClient):
+    """Background task of the download & sync tasks, see RETRY_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(RETRY_INTERVAL_SECONDS)
+        try:
+            await retry_failed_heights(httpx_client)
+        except Exception as e:
+            print(f"Error: retry_loop(): {e}")
+            traceback.print_exc()
+
 
-    # Dump our amino to file so the juno-decoder can pick it up (decodes in chunks)
-    with open(DUMPFILE, "w") as f:
-        json.dump(to_decode, f)
+async def download_and_save(heights: list[int], httpx_client: httpx.AsyncClient):
+    start_time = time.time()
 
-    # Decodes this file, and saves to the output file (from the chain-decoder binary)
-    # Calls syncronously, since we handle so many decodes in 1 call.
-    values = run_decode_file(COSMOS_PROTO_DECODER_BINARY_FILE, DUMPFILE, OUTFILE)
+    async def fetch(height: int) -> BlockData | None:
+        return await download_block(httpx_client, height)
 
-    for data in values:
-        tx_id = data["id"]
-        tx_data = json.loads(data["tx"])
+    # height: RPC its last batch failed on, download_in_order only tells us the height it gave up on
+    failed_on: dict[int, str] = {}
 
-        tx = db.get_tx(tx_id)
-        if tx is None:
-            continue
+    async def fetch_many(batch: list[int]) -> dict[int, BlockData | None]:
+        return await download_blocks(httpx_client, batch, failed_on)
 
-        height = tx.height
+    def on_failed(height: int, error: Exception):
+        queue_failed_height(height, error, failed_on.pop(height, ""))
 
-        sender = get_sender(
-            height, tx_data["body"]["messages"][0], "juno", "junovaloper"
+    def on_saved(blocks: list[BlockData]):
+        print(
+            f"Saved #{len(blocks)} blocks ({blocks[0].height}->{blocks[-1].height}). {round(time.time() - start_time, 4)} seconds since start"
         )
-        if sender is None:
-            print("No sender found for tx: ", tx_id, "at height: ", height)
-            sender = "UNKNOWN"
-
-        # get message types
-        msg_types = {}
-        for msg in tx_data["body"]["messages"]:
-            _type = msg["@type"]
-            if _type not in msg_types:
-                msg_types[_type] = 0
-
-            msg_types[_type] += 1
-
-        msg_types_list = list(msg_types.keys())
-        msg_types_list.sort()
-        # for msg_type, count in msg_types.items():
-        #     # putting in just count is dumb
-        #     db.insert_msg_type_count(msg_type, count, tx.height)
-
-        for i in range(60):
-            try:
-                # 'hacky' way to bypass database is locked issue. Really should use 'BEGIN IMMEDIATE' here
-                db.update_tx(
-                    tx_id, json.dumps(tx_data), json.dumps(msg_types_list), sender
+        if batch_tuner is not None:
+            print(f"RPCs: {rpc_pool.summary()} | {batch_tuner} heights per batch | {pipeline.summary()}")
+        else:
+            print(f"RPCs: {rpc_pool.summary()} | {pipeline.summary()}")
+
+    async def write(values: list[BlockData | None]):
+        blocks = [x for x in values if x is not None]
+        if len(blocks) == 0:
+            return
+
+        # Decoded & saved by the pipeline's threads, downloading carries on meanwhile
+        await pipeline.put_async(blocks, on_saved)
+
+        # Raw responses of these blocks are appended to the archive in height order
+        if block_archive is not None:
+            await block_archive.flush_async()
+
+    total = 0
+    if block_archive is not None:
+        # Archived heights are read from disk (several segments at once), only the rest is downloaded.
+        archived = set(block_archive.archived(heights))
+        if len(archived) > 0:
+            print(f"Reading {len(archived):,} blocks from the block archive")
+            values: list[BlockData | None] = []
+            for height, raw in block_archive.read_many(
+                [h for h in heights if h in archived], BLOCK_ARCHIVE_READ_WORKERS
+            ):
+                values.append(
+                    parse_block_response(height, raw, TX_AMINO_LENGTH_CUTTOFF_LIMIT)
                 )
-                break
-            except Exception as e:
-                # Sleeps between 0.5 and 1.5
-                random_sleep = random.random() + 0.5
+                if len(values) >= GROUPING:
+                    await write(values)
+                    values = []
+            await write(values)
+
+            total += len(archived)
+            heights = [h for h in heights if h not in archived]
+            if len(heights) == 0:
+                await pipeline.drain_async()
+                stats.dump(STATS_FILE)
                 print(
-                    f"[!] Error: decode_and_save_updated(): {e}. Waiting {random_sleep} seconds to try again"
+                    f"Finished #{total} blocks in {round(time.time() - start_time, 4)} seconds ({block_archive.summary()})"
                 )
-                # traceback.print_exc()
-                time.sleep(random_sleep)
-                continue
+                return
+
+    total += await download_in_order(
+        heights,
+        fetch,
+        write,
+        max_in_flight=MAX_IN_FLIGHT,
+        batch_size=GROUPING,
+        fetch_many=fetch_many if RPC_BATCH_SIZE > 1 else None,
+        fetch_many_size=batch_tuner or RPC_BATCH_SIZE,
+        on_failed=on_failed,
+    )
+    await pipeline.drain_async()
+    stats.dump(STATS_FILE)
+    print(
+        f"Finished #{total} blocks in {round(time.time() - start_time, 4)} seconds ({heights[0]}->{heights[-1]})"
+    )
 
-    db.commit()
 
-    if TASK == "decode":
+async def get_chain_height(httpx_client: httpx.AsyncClient) -> int:
+    # Asks the healthiest RPC first, falling over to the others if it fails.
+    for endpoint in rpc_pool.ranked():
+        start = time.monotonic()
+        height = await get_latest_chain_height_async(httpx_client, endpoint.url)
+        rpc_pool.record(endpoint, ok=height > 0, latency=time.monotonic() - start)
+        if height > 0:
+            return height
+
+    return -1
+
+
+async def save_tip(
+    httpx_client: httpx.AsyncClient, height: int, block_result: dict | None
+) -> bool:
+    """
+    Saves & decodes a new tip height, downloading any heights we missed before it first.
+    Returns False if we are more than GROUPING blocks behind (the bulk downloader should catch up).
+    """
+    global END_BLOCK
+    END_BLOCK = max(END_BLOCK, height)
+
+    # heights still in the pipeline count as saved
+    last_saved_block = db.get_latest_saved_block()
+    latest_saved_height = max(
+        last_saved_block.height if last_saved_block else 0, pipeline.highest_height
+    )
+
+    if height - latest_saved_height > GROUPING:
+        print(f"Tip {height:,} is too far ahead of {latest_saved_height:,}, bulk downloading")
+        return False
+
+    # Missed heights (reconnects / polling) are downloaded before the new tip.
+    await do_mass_url_download_and_decode(
+        range(latest_saved_height + 1, height), httpx_client
+    )
+
+    if height <= pipeline.highest_height or len(db.get_saved_heights(height, height)) > 0:
+        return True
+
+    start_time = time.time()
+    if block_result is not None:
+        bd = parse_block_result(height, block_result, TX_AMINO_LENGTH_CUTTOFF_LIMIT)
+        if bd is not None and block_archive is not None:
+            await block_archive.put_async(
+                height, codec.dumps({"result": block_result}).encode()
+            )
+    else:
+        try:
+            bd = await download_block(httpx_client, height)
+        except Exception as e:
+            print(f"Error: save_tip(): {e}")
+            queue_failed_height(height, e)
+            return True
+
+    if bd is None:
+        return True
+
+    def on_saved(blocks: list[BlockData]):
+        stats.dump(STATS_FILE)
         print(
-            f"Time: Decoded & stored ({len(to_decode)} Txs): {time.time() - start_time}"
+            f"Tip {height:,} saved & decoded ({len(bd.encoded_txs)} Txs) in {round(time.time() - start_time, 4)} seconds"
         )
 
-    os.remove(DUMPFILE)
-    os.remove(OUTFILE)
-    pass
+    # the next tip can download while this one decodes & saves
+    await pipeline.put_async([bd], on_saved)
+    if block_archive is not None:
+        await block_archive.flush_async()
+    return True
+
+
+async def follow_tip(httpx_client: httpx.AsyncClient):
+    """
+    Saves & decodes each new block as soon as the RPC tells us about it.
+    Returns when we fall more than GROUPING blocks behind, so the bulk downloader can catch up.
+    """
+    follower = TipFollower(rpc_pool, httpx_client, poll_interval=10)
+
+    async with contextlib.aclosing(follower.follow()) as tips:
+        async for height, block_result in tips:
+            if not await save_tip(httpx_client, height, block_result):
+                return
+
+
+async def main():
+    global START_BLOCK, END_BLOCK
+
+    # One continuous window over the whole range, written every GROUPING contiguous blocks.
+    limits = httpx.Limits(max_connections=MAX_IN_FLIGHT)
+    async with httpx.AsyncClient(limits=limits) as httpx_client:
+        # kept so the task is not garbage collected, it runs until the indexer exits
+        retries = asyncio.create_task(retry_loop(httpx_client))
+        while True:
+            # everything downloaded so far is saved before we look at the database
+            await pipeline.drain_async()
+            last_saved_block = db.get_latest_saved_block()
+            latest_saved_height = 0
+            if last_saved_block is not None:
+                latest_saved_height = last_saved_block.height
+
+            current_chain_height = await get_chain_height(httpx_client)
+            if current_chain_height < 0:
+                print("Error: no RPC returned the chain height. Trying again in 10 seconds.")
+                await asyncio.sleep(10)
+                continue
+
+            print(
+                f"Last saved: {latest_saved_height:,} & Chain height: {current_chain_height:,}"
+            )
+
+            if END_BLOCK > current_chain_height:
+                END_BLOCK = current_chain_height
+
+            if TASK == "sync":
+                START_BLOCK = latest_saved_height
+                END_BLOCK = current_chain_height
+
+            print(f"Bulk Blocks: {START_BLOCK:,}->{END_BLOCK:,}")
+
+            await do_mass_url_download_and_decode(
+                range(START_BLOCK, END_BLOCK + 1), httpx_client
+            )
+
+            if TASK == "sync":
+                # Caught up, stay on the tip.
+                await follow_tip(httpx_client)
+                continue
+
+            print("Sleeping for more blocks.")
+            await asyncio.sleep(10)
+            # exit(1)
+
+
+def save_decoded(values: list[dict], heights: dict[int, int]):
+    """Saves the decoded Txs of 1 batch at once. heights: tx id -> height of every Tx in the batch."""
+    global db
+
+    save_start = time.perf_counter()
+
+    db.update_txs(decoded_rows(values, heights, decoder_pool.version))
+    stats.record("decode_save", time.perf_counter() - save_start)
 
 
 def do_decode(lowest_height: int, highest_height: int):
@@ -340,74 +560,60 @@ def do_decode(lowest_height: int, highest_height: int):
         print("No latest block found. Can not decode. Exiting.")
         exit(1)
 
-    for group in groups:
-        start_height = group.start
-        end_height = group.end
-        print(
-            f"Decoding Group: {start_height:,}->{end_height:,} ({(end_height - start_height):,} blocks)"
-        )
-
-        txs = db.get_non_decoded_txs_in_range(start_height, end_height)
-        print(
-            f"Total non decoded Txs in Blocks: {start_height:,}->{end_height:,}: Txs #:{len(txs):,}"
-        )
-
-        # Get what Txs we need to decode for the custom -decode binary
-        to_decode = []
-        for tx in txs:
-            # One run and commit then we see if it persisted correctly with the update and saved data.
-            if len(tx.tx_json) == 0:
-                to_decode.append({"id": tx.id, "tx": tx.tx_amino})
-
-            if len(to_decode) >= DECODE_LIMIT:
-                # early decode if Txs hit a large number.
-                decode_and_save_updated(to_decode)
-                to_decode.clear()
-
-        if len(to_decode) > 0:
-            decode_and_save_updated(to_decode)
-            to_decode.clear()
+    # tx id -> height, for the batches handed to the decoders but not saved yet
+    heights: dict[int, int] = {}
 
+    def batches():
+        for group in groups:
+            start_height = group.start
+            end_height = group.end
+            print(
+                f"Decoding Group: {start_height:,}->{end_height:,} ({(end_height - start_height):,} blocks)"
+            )
 
-def save_values_to_sql(values: list[BlockData]):
-    global db
-
-    for bd in values:
-        if bd == None:  # if we already downloaded or there was an error
-            continue
-
-        height = bd.height
-        block_time = bd.block_time
-        amino_txs: list[str] = bd.encoded_txs
-
-        sql_tx_ids: list[int] = []
-        for amino_tx in amino_txs:
-            # Amino encoded Tx string in the databse
-            # NOTE: insert multiple any faster?  then return rows in the same order
-            unique_id = db.insert_tx(height, amino_tx)
-            sql_tx_ids.append(unique_id)
-
-        db.insert_block(height, block_time, sql_tx_ids)
-
-        # print(f"save_values_to_sql. Exited early")
-        # exit(1)
+            # DECODE_LIMIT Txs at a time, Txs which failed on this decoder version are not tried again
+            total = 0
+            for chunk in db.iter_txs_to_decode(
+                start_height, end_height, decoder_pool.version, DECODE_LIMIT
+            ):
+                # groups share their edge height, its Txs may still be decoding in an earlier batch
+                to_decode = []
+                for tx_id, height, tx_amino in chunk:
+                    if tx_id not in heights:
+                        to_decode.append({"id": tx_id, "tx": tx_amino})
+                        heights[tx_id] = height
+
+                total += len(to_decode)
+                if len(to_decode) > 0:
+                    yield to_decode
 
-    # Saves to it after we go through all group of blocks
-    db.commit()
+            print(
+                f"Total non decoded Txs in Blocks: {start_height:,}->{end_height:,}: Txs #:{total:,}"
+            )
 
-    # move task = "decode" here?
-    if TASK == "sync":
-        heights = [v.height for v in values if v is not None]
-        if not heights:
-            print("Error: no heights found in range")
-            return
+    # COSMOS_PROTO_DECODE_WORKERS batches decode at once, this thread saves them in order.
+    start_time = time.time()
+    for to_decode, values, decode_seconds in decoder_pool.imap(batches()):
+        stats.record("decode", decode_seconds)
+        save_decoded(values, heights)
+        for value in to_decode:
+            heights.pop(value["id"], None)
 
-        lowest_height = min(heights)
-        latest_height = max(heights)
+        if TASK == "decode":
+            print(
+                f"Time: Decoded & stored ({len(to_decode)} Txs): {round(decode_seconds, 4)}s decode. {round(time.time() - start_time, 4)} seconds since start"
+            )
 
-        do_decode(lowest_height, latest_height)
+    if decoder_pool.fast_decoded > 0:
+        print(
+            f"Decoded {decoder_pool.fast_decoded:,} Txs in process, {decoder_pool.binary_decoded:,} with {COSMOS_PROTO_DECODER_BINARY_FILE}"
+        )
+    if decoder_pool.failed > 0:
+        print(
+            f"{decoder_pool.failed:,} Txs could not be decoded (decoder {decoder_pool.version}), see the missing task"
+        )
 
-    pass
+    stats.dump(STATS_FILE)
 
 
 if __name__ == "__main__":
@@ -424,6 +630,7 @@ if __name__ == "__main__":
             )
         )
         do_decode(START_BLOCK, END_BLOCK)
+        decoder_pool.close()
         exit(1)
 
     elif TASK == "missing":
@@ -455,25 +662,79 @@ if __name__ == "__main__":
 
         # To-Decode Txs
         print("Waitng on non decoded txs in range query...")
-        failed_to_decode_txs = db.get_non_decoded_txs_in_range(
-            earliest_block.height, latest_saved_block.height
-        )
-        if len(failed_to_decode_txs) > 0:
-            print("Missing txs (ones which are failed to be decoded)...")
+        heights_set: set[int] = set()
+        tx_ids: list[int] = []
+        for chunk in db.iter_txs_to_decode(
+            earliest_block.height, latest_saved_block.height, decoder_pool.version, DECODE_LIMIT
+        ):
+            for tx_id, height, _ in chunk:
+                tx_ids.append(tx_id)
+                heights_set.add(height)
 
-            heights = sorted(set(tx.height for tx in failed_to_decode_txs))
-            tx_ids = sorted(set(tx.id for tx in failed_to_decode_txs))
+        if len(tx_ids) > 0:
+            print("Missing txs (ones which are not decoded yet)...")
+
+            heights = sorted(heights_set)
+            tx_ids.sort()
 
             with open(os.path.join(current_dir, "missing_txs.json"), "w") as f:
                 json.dump({"heights": heights, "tx_ids": tx_ids}, f)
         else:
             print("No missing decoded txs")
 
+        # Txs the decoder could not handle, skipped until the decoder version changes
+        failed_decodes = db.get_failed_decodes(earliest_block.height, latest_saved_block.height)
+        if len(failed_decodes) > 0:
+            # error class: {"count", "tx_ids", "heights", "example"}
+            by_class: dict[str, dict] = {}
+            for tx_id, height, attempts, version, error in failed_decodes:
+                group = by_class.setdefault(
+                    error_class(error), {"count": 0, "tx_ids": [], "heights": [], "example": error}
+                )
+                group["count"] += 1
+                group["tx_ids"].append(tx_id)
+                group["heights"].append(height)
+
+            print(f"{len(failed_decodes):,} Txs failed to decode (decoder {decoder_pool.version}):")
+            for name, group in sorted(by_class.items(), key=lambda item: -item[1]["count"]):
+                print(f"  {group['count']:>8,}  {name}")
+            with open(os.path.join(current_dir, "failed_decodes.json"), "w") as f:
+                json.dump(by_class, f, indent=2)
+
+        # Heights which failed to download RETRY_MAX_ATTEMPTS times
+        dead_blocks = db.get_dead_retries()
+        if len(dead_blocks) > 0:
+            print(f"{len(dead_blocks):,} dead lettered blocks (failed to download)")
+            with open(os.path.join(current_dir, "dead_blocks.json"), "w") as f:
+                json.dump(
+                    [
+                        {"height": h, "attempts": a, "error": err, "rpc": rpc}
+                        for h, a, err, rpc in dead_blocks
+                    ],
+                    f,
+                    indent=2,
+                )
+
         # Requests to download and decode here?
 
         exit(1)
 
+    pipeline = Pipeline(
+        os.path.join(current_dir, "data.db"),
+        decoder_pool if DECODE_ON_DOWNLOAD else None,
+        PIPELINE_QUEUE_SIZE,
+        RETRY_MAX_ATTEMPTS,
+        RETRY_BASE_SECONDS,
+        RETRY_MAX_SECONDS,
+    )
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(main())
-    loop.close()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        pipeline.close()
+        if block_archive is not None:
+            block_archive.close()
+        decoder_pool.close()
+        loop.close()
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+"""
+The messages table (1 row per message, interned type_id + signer) is filled as Txs are decoded. This script
+fills it for Txs which were decoded before it existed. Safe to run again, Txs with messages already saved
+are skipped.
+
+SQLite cmds:
+
+sqlite3 data.db
+SELECT t.type_url, COUNT(*) FROM messages m JOIN msg_type_ids t ON t.id=m.type_id GROUP BY 1 ORDER BY 2 DESC;
+.exit
+
+"""
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from decoding import decoded_tx_columns
+from SQL import Database
+
+db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
+# creates messages, msg_type_ids & their indexes if they do not exist yet
+db.create_tables()
+db.optimize_tables()
+
+BATCH_SIZE = 10_000
+
+
+def main():
+    messages_update_all()
+
+
+def messages_update_all():
+    start = time.time()
+    last_id = 0
+    done = 0
+    while True:
+        db.cur.execute(
+            """SELECT id, height, tx_json FROM txs WHERE id>? AND tx_json!='' AND id NOT IN (SELECT tx_id FROM messages) ORDER BY id LIMIT ?""",
+            (last_id, BATCH_SIZE),
+        )
+        batch = db.cur.fetchall()
+        if len(batch) == 0:
+            break
+
+        for tx_id, height, tx_json in batch:
+            _, _, _, messages = decoded_tx_columns(height, tx_id, db.tx_json_text(tx_json, cached=False))
+            db.insert_messages(tx_id, height, messages)
+        db.commit()
+
+        last_id = batch[-1][0]
+        done += len(batch)
+        print(f"{done:,} Txs (id {last_id:,})", time.time() - start)
+
+    print(time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
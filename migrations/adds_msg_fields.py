@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+"""
+The msg_fields table (extractors.py) is filled as Txs are decoded. This script fills it for Txs which were
+decoded before it existed. Safe to run again, Txs with fields already saved are skipped.
+
+SQLite cmds:
+
+sqlite3 data.db
+SELECT COUNT(*) FROM msg_fields;
+SELECT field, COUNT(*) FROM msg_fields GROUP BY field;
+.exit
+
+"""
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from decoding import decoded_tx_columns
+from SQL import Database
+
+db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
+# creates msg_fields & its indexes if they do not exist yet
+db.create_tables()
+db.optimize_tables()
+
+BATCH_SIZE = 10_000
+
+
+def main():
+    msg_fields_update_all()
+
+
+def msg_fields_update_all():
+    start = time.time()
+    last_id = 0
+    done = 0
+    while True:
+        db.cur.execute(
+            """SELECT id, height, tx_json FROM txs WHERE id>? AND tx_json!='' AND id NOT IN (SELECT tx_id FROM msg_fields) ORDER BY id LIMIT ?""",
+            (last_id, BATCH_SIZE),
+        )
+        batch = db.cur.fetchall()
+        if len(batch) == 0:
+            break
+
+        for tx_id, height, tx_json in batch:
+            _, _, fields, _ = decoded_tx_columns(height, tx_id, db.tx_json_text(tx_json, cached=False))
+            db.insert_msg_fields(tx_id, height, fields)
+        db.commit()
+
+        last_id = batch[-1][0]
+        done += len(batch)
+        print(f"{done:,} Txs (id {last_id:,})", time.time() - start)
+
+    print(time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+"""
+Compresses txs.tx_json with zlib and a dictionary trained on a sample of the stored tx_json
+(tx_json_codec.py). The Database API decompresses it again, scripts do not change.
+
+python3 migrations/compress_tx_json.py        # train a dictionary on 2,000 Txs & compress every tx_json with it
+python3 migrations/compress_tx_json.py 5000   # train on 5,000 Txs (run again later to retrain, as the chain's Txs change)
+python3 migrations/compress_tx_json.py off    # back to TEXT
+
+Online, like migrations/tx_blobs.py: new Txs are compressed as soon as it starts (restart running
+indexers, they load the setting & dictionaries when they open data.db), old ones are converted 10k at
+a time in short transactions. Safe to stop & run again. VACUUM afterwards to shrink the file.
+
+SQLite cmds:
+
+sqlite3 data.db
+SELECT typeof(tx_json), COUNT(*), SUM(length(tx_json)) FROM txs GROUP BY 1;
+SELECT id, length(dict), samples, datetime(created, 'unixepoch') FROM tx_json_dicts;
+.exit
+
+"""
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from SQL import Database
+from tx_json_codec import train_dictionary
+
+db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
+# creates the settings & tx_json_dicts tables if they do not exist yet
+db.create_tables()
+
+BATCH_SIZE = 10_000
+
+
+def main():
+    arg = sys.argv[1] if len(sys.argv) > 1 else "2000"
+    if arg == "off":
+        db.set_setting("tx_json_dict", "")
+    else:
+        samples = db.sample_tx_json(int(arg))
+        if len(samples) == 0:
+            print("No decoded Txs to train a dictionary on")
+            exit(1)
+
+        start = time.time()
+        dictionary = train_dictionary(samples)
+        dict_id = db.add_tx_json_dict(dictionary, len(samples))
+        db.set_setting("tx_json_dict", str(dict_id))
+        print(f"Dictionary {dict_id}: {len(dictionary):,} bytes from {len(samples):,} Txs", time.time() - start)
+
+    db.commit()
+    db.tx_json_codec = db.load_tx_json_codec()
+
+    tx_json_update_all()
+
+
+def tx_json_update_all():
+    start = time.time()
+    last_id = 0
+    while True:
+        last = db.convert_tx_json(last_id, BATCH_SIZE)
+        if last is None:
+            break
+
+        last_id = last
+        print(f"Txs up to id {last_id:,}", time.time() - start)
+
+    print(time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+"""
+Stores txs.tx_amino as the raw TxRaw bytes and txs.tx_hash as the 32 byte sha256, as BLOBs, instead of
+base64 / hex TEXT (~25% smaller tx_amino, 32 instead of 64 bytes per hash, in the table & txs_data_index).
+The Database API still takes and returns base64 / hex, scripts do not change.
+
+python3 migrations/tx_blobs.py        # to BLOBs
+python3 migrations/tx_blobs.py text   # back to TEXT
+
+Online: new Txs are written in the new format as soon as it starts (restart running indexers, they read
+the setting when they open data.db), old ones are converted 10k at a time in short transactions. Safe to
+stop & run again. The freed pages are reused by new Txs, VACUUM (optimize_db(vacuum=True)) to shrink the file.
+
+SQLite cmds:
+
+sqlite3 data.db
+SELECT typeof(tx_amino), typeof(tx_hash), COUNT(*) FROM txs GROUP BY 1, 2;
+.exit
+
+"""
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+from SQL import TX_STORAGE_BLOB, TX_STORAGE_TEXT, Database
+
+db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
+# creates the settings table if it does not exist yet
+db.create_tables()
+
+BATCH_SIZE = 10_000
+
+
+def main():
+    storage = sys.argv[1] if len(sys.argv) > 1 else TX_STORAGE_BLOB
+    if storage not in (TX_STORAGE_BLOB, TX_STORAGE_TEXT):
+        print(f"Unknown storage {storage}, use {TX_STORAGE_BLOB} or {TX_STORAGE_TEXT}")
+        exit(1)
+
+    db.set_setting("tx_storage", storage)
+    db.commit()
+    db.tx_blobs = storage == TX_STORAGE_BLOB
+
+    tx_storage_update_all()
+
+
+def tx_storage_update_all():
+    start = time.time()
+    last_id = 0
+    while True:
+        last = db.convert_tx_storage(last_id, BATCH_SIZE)
+        if last is None:
+            break
+
+        last_id = last
+        print(f"Txs up to id {last_id:,}", time.time() - start)
+
+    print(time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""
+Runs every section of chain_config.json at once, instead of `python3 main.py 0`, `python3 main.py 1`, ... by hand.
+
+python3 orchestrator.py
+
+Each section gets its own worker process (or ORCHESTRATOR_WORKERS processes in total, each section split
+between them). Workers download and / or decode, but never write to data.db. They stream their results
+over a queue to a single writer process, which owns the only write connection. So there is no lock
+contention and no "database is locked" sleep / retry loop.
+
+Tasks:
+- download: workers download missing blocks (+ decode them in memory when DECODE_ON_DOWNLOAD is true)
+- decode: workers decode the non decoded Txs of their range
+(sync & missing still run through main.py)
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+import httpx
+
+from autotune import BatchSizeTuner
+from block_archive import BlockArchive
+from chain_types import BlockData
+from decoding import (
+    DecoderPool,
+    block_rows,
+    blocks_to_decode,
+    decoded_rows,
+    type_policy,
+)
+from downloader import (
+    download_in_order,
+    fetch_block,
+    fetch_blocks_batch,
+    parse_block_response,
+)
+from rpc_pool import EndpointPool
+from SQL import Database
+from util import command_exists, get_latest_chain_height
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+DB_PATH = os.path.join(current_dir, "data.db")
+tmp_decode_dir = os.path.join(current_dir, "tmp_decode")
+
+# Queue messages (kind, ...)
+BLOCKS = "blocks"  # (BLOCKS, [(height, time, [(amino, TxDecode | None)])])
+DECODED = "decoded"  # (DECODED, [(tx_id, TxDecode)])
+FAILED = "failed"  # (FAILED, height, error, rpc_url)
+DONE = "done"  # (DONE, worker_name)
+
+
+# 1 long lived decoder per worker process (see decoder_for)
+_decoder: DecoderPool | None = None
+
+
+def decoder_for(config: dict) -> DecoderPool:
+    global _decoder
+    if _decoder is None:
+        _decoder = DecoderPool(
+            config.get("COSMOS_PROTO_DECODE_BINARY", "juno-decode"),
+            tmp_decode_dir,
+            stream=config.get("COSMOS_PROTO_DECODE_STREAM", True),
+            fast=config.get("COSMOS_PROTO_FAST_DECODE", False),
+            policy=type_policy(config),
+        )
+    return _decoder
+
+
+def decode(to_decode: list[dict], config: dict) -> list[dict]:
+    return decoder_for(config).decode(to_decode)
+
+
+def load_config() -> dict:
+    with open(os.path.join(current_dir, "chain_config.json"), "r") as f:
+        return dict(json.load(f))
+
+
+def worker_ranges(sections: dict, workers: int) -> list[tuple[str, int, int, dict]]:
+    """
+    (name, start, end, section) for every worker process.
+    workers <= 0 is 1 per section, else each section is split into workers / len(sections) ranges.
+    Heights already covered by an earlier section are clipped off (ex: sections sharing their boundary
+    height), 2 workers would both download and send them.
+    """
+    ranges = []
+    per_section = 1 if workers <= 0 else max(1, workers // max(1, len(sections)))
+    covered: list[tuple[int, int]] = []
+
+    for key, section in sections.items():
+        start, end = section.get("start", -1), section.get("end", -1)
+        if start < 0 or end < 0:
+            print(f"Section {key}: start or end is not set correctly, skipping")
+            continue
+
+        parts = uncovered(start, end, covered)
+        covered.append((start, end))
+        if len(parts) == 0:
+            print(f"Section {key}: {start:,}->{end:,} is covered by other sections, skipping")
+            continue
+
+        names = 0
+        for part_start, part_end in parts:
+            size = -(-(part_end - part_start + 1) // per_section)
+            for i in range(per_section):
+                sub_start = part_start + i * size
+                sub_end = min(part_end, sub_start + size - 1)
+                if sub_start > sub_end:
+                    break
+
+                name = key if per_section == 1 and len(parts) == 1 else f"{key}.{names}"
+                ranges.append((name, sub_start, sub_end, section))
+                names += 1
+
+    return ranges
+
+
+def uncovered(start: int, end: int, covered: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """The parts of start->end (inclusive) outside of every covered range."""
+    parts = [(start, end)]
+    for covered_start, covered_end in covered:
+        clipped = []
+        for part_start, part_end in parts:
+            if covered_end < part_start or covered_start > part_end:
+                clipped.append((part_start, part_end))
+                continue
+            if part_start < covered_start:
+                clipped.append((part_start, covered_start - 1))
+            if covered_end < part_end:
+                clipped.append((covered_end + 1, part_end))
+        parts = clipped
+    return parts
+
+
+def decode_blocks(blocks: list[BlockData], config: dict) -> list[tuple]:
+    """Decodes freshly downloaded amino in memory. Returns BLOCKS rows."""
+    return block_rows(blocks, decode(blocks_to_decode(blocks), config), decoder_for(config).version)
+
+
+def download_worker(name: str, start: int, end: int, section: dict, config: dict, queue):
+    archive = None
+    if config.get("BLOCK_ARCHIVE_DIR", "") != "":
+        # segments are flock'ed, workers can share the archive
+        archive = BlockArchive(
+            os.path.join(current_dir, config["BLOCK_ARCHIVE_DIR"]),
+            config.get("BLOCK_ARCHIVE_SEGMENT_SIZE", 10_000),
+        )
+
+    try:
+        asyncio.run(_download(name, start, end, section, config, queue, archive))
+    except Exception:
+        traceback.print_exc()
+    finally:
+        if archive is not None:
+            archive.close()
+        if _decoder is not None:
+            _decoder.close()
+        queue.put((DONE, name))
+
+
+async def _download(
+    name: str,
+    start: int,
+    end: int,
+    section: dict,
+    config: dict,
+    queue,
+    archive: BlockArchive | None,
+):
+    grouping = section.get("grouping", 10_000)
+    max_in_flight = section.get("max_in_flight", 100)
+    rpc_batch_size = section.get("rpc_batch_size", 1)
+    amino_cutoff = config.get("TX_AMINO_LENGTH_CUTTOFF_LIMIT", 0)
+    decode_on_download = config.get("DECODE_ON_DOWNLOAD", False)
+
+    adaptive = section.get("adaptive", True)
+    pool = EndpointPool(
+        section.get("rpc_endpoints", []),
+        section.get("max_in_flight_per_endpoint", max_in_flight),
+        adaptive=adaptive,
+    )
+    batch_tuner = None
+    if adaptive and rpc_batch_size > 1:
+        batch_tuner = BatchSizeTuner(
+            min(10, rpc_batch_size),
+            rpc_batch_size,
+            section.get("rpc_batch_target_seconds", 5),
+        )
+
+    for endpoint in pool.ranked():
+        chain_height = get_latest_chain_height(RPC_ARCHIVE=endpoint.url)
+        if chain_height > 0:
+            end = min(end, chain_height)
+            break
+
+    # Reads only. WAL lets us read while the writer process writes.
+    db = Database(DB_PATH)
+    now = time.time()
+    waiting = db.get_waiting_retries(now)
+    due = db.get_due_retries(now, start, end)
+    heights = sorted(
+        (set(db.get_missing_blocks(max(start, 1), end)) - waiting) | set(due)
+    )
+    db.conn.close()
+
+    print(f"(worker:{name}) {start:,}->{end:,}: {len(heights):,} blocks to download")
+    if len(heights) == 0:
+        return
+
+    start_time = time.time()
+
+    async def write(values: list[BlockData | None]):
+        blocks = [v for v in values if v is not None]
+        if len(blocks) == 0:
+            return
+
+        # off the event loop, so the requests of this worker carry on meanwhile
+        if decode_on_download:
+            rows = await asyncio.to_thread(decode_blocks, blocks, config)
+        else:
+            rows = block_rows(blocks, [])
+
+        # blocks when the writer is behind, which holds the downloader back (but not the event loop)
+        await asyncio.to_thread(queue.put, (BLOCKS, rows))
+        if archive is not None:
+            await archive.flush_async()
+        print(
+            f"(worker:{name}) Sent #{len(blocks)} blocks ({blocks[0].height}->{blocks[-1].height}). {round(time.time() - start_time, 4)} seconds since start"
+        )
+        window = f"(worker:{name}) RPCs: {pool.summary()}"
+        if batch_tuner is not None:
+            window += f" | {batch_tuner} heights per batch"
+        print(window)
+
+    # height: RPC its last batch failed on (fetch_blocks_batch)
+    failed_on: dict[int, str] = {}
+
+    def failed(height: int, error: Exception):
+        rpc_url = getattr(error, "rpc_url", failed_on.pop(height, ""))
+        queue.put((FAILED, height, str(error), rpc_url))
+
+    if archive is not None:
+        archived = set(archive.archived(heights))
+        if len(archived) > 0:
+            print(f"(worker:{name}) Reading {len(archived):,} blocks from the block archive")
+            values: list[BlockData | None] = []
+            for height, raw in archive.read_many(
+                [h for h in heights if h in archived],
+                config.get("BLOCK_ARCHIVE_READ_WORKERS", 4),
+            ):
+                values.append(parse_block_response(height, raw, amino_cutoff))
+                if len(values) >= grouping:
+                    await write(values)
+                    values = []
+            await write(values)
+            heights = [h for h in heights if h not in archived]
+
+    if len(heights) == 0:
+        return
+
+    limits = httpx.Limits(max_connections=max_in_flight)
+    async with httpx.AsyncClient(limits=limits) as client:
+
+        async def fetch(height: int) -> BlockData | None:
+            exclude = (due[height],) if height in due else ()
+            return await fetch_block(
+                client, pool, height, amino_cutoff, exclude=exclude, archive=archive
+            )
+
+        async def fetch_many(batch: list[int]) -> dict[int, BlockData | None]:
+            exclude = tuple(sorted({due[h] for h in batch if h in due}))
+            return await fetch_blocks_batch(
+                client,
+                pool,
+                batch,
+                amino_cutoff,
+                archive=archive,
+                tuner=batch_tuner,
+                exclude=exclude,
+                failed_on=failed_on,
+            )
+
+        await download_in_order(
+            heights,
+            fetch,
+            write,
+            max_in_flight=max_in_flight,
+            batch_size=grouping,
+            fetch_many=fetch_many if rpc_batch_size > 1 else None,
+            fetch_many_size=batch_tuner or rpc_batch_size,
+            on_failed=failed,
+        )
+
+
+def decode_worker(name: str, start: int, end: int, section: dict, config: dict, queue):
+    try:
+        _decode(name, start, end, config, queue)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        if _decoder is not None:
+            _decoder.close()
+        queue.put((DONE, name))
+
+
+def _decode(name: str, start: int, end: int, config: dict, queue):
+    decode_limit = config.get("COSMOS_PROTO_DECODE_LIMIT", 10_000)
+    block_limit = config.get("COSMOS_PROTO_DECODE_BLOCK_LIMIT", 10_000)
+
+    version = decoder_for(config).version
+    db = Database(DB_PATH)
+    for group_start in range(start, end + 1, block_limit):
+        group_end = min(end, group_start + block_limit - 1)
+        # decode_limit Txs at a time, Txs which failed on this decoder version are not tried again
+        total = 0
+        for chunk in db.iter_txs_to_decode(group_start, group_end, version, decode_limit):
+            heights = {tx_id: height for tx_id, height, _ in chunk}
+            values = decode([{"id": tx_id, "tx": tx_amino} for tx_id, _, tx_amino in chunk], config)
+            queue.put((DECODED, decoded_rows(values, heights, version)))
+            total += len(chunk)
+
+        print(
+            f"(worker:{name}) Decoding Group: {group_start:,}->{group_end:,}: Txs #:{total:,}"
+        )
+
+    db.conn.close()
+
+
+def writer(queue, workers: int, config: dict):
+    """The only process which writes to data.db."""
+    db = Database(DB_PATH)
+    db.create_tables()
+    db.optimize_tables()
+    db.optimize_db(vacuum=False)
+
+    retry_max_attempts = config.get("RETRY_MAX_ATTEMPTS", 8)
+    retry_base_seconds = config.get("RETRY_BASE_SECONDS", 5)
+    retry_max_seconds = config.get("RETRY_MAX_SECONDS", 3600)
+
+    def queue_retry(height: int, error: str, rpc_url: str):
+        db.queue_retry(
+            height,
+            error,
+            rpc_url,
+            retry_max_attempts,
+            retry_base_seconds,
+            retry_max_seconds,
+        )
+
+    finished = 0
+    while finished < workers:
+        message = queue.get()
+        kind = message[0]
+
+        if kind == DONE:
+            finished += 1
+            print(f"(writer) worker {message[1]} finished ({finished}/{workers})")
+            continue
+
+        # a bad message is rolled back on its own, the writer keeps going (workers block on a full queue)
+        try:
+            if kind == BLOCKS:
+                db.insert_block_rows(message[1])
+                db.remove_retries([height for height, _, _ in message[1]])
+
+            elif kind == DECODED:
+                db.update_txs(message[1])
+
+            elif kind == FAILED:
+                _, height, error, rpc_url = message
+                queue_retry(height, error, rpc_url)
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"(writer) Error: {kind}: {e}")
+            traceback.print_exc()
+
+            if kind == BLOCKS:
+                # downloaded again from the retry queue. Txs of a failed DECODED are still not decoded,
+                # the next decode run picks them up.
+                heights = [height for height, _, _ in message[1]]
+                saved = db.get_saved_heights(min(heights), max(heights))
+                for height in heights:
+                    if height not in saved:
+                        queue_retry(height, repr(e), "")
+                db.commit()
+
+    db.commit()
+    print("(writer) all workers finished")
+
+
+def wait_for_workers(workers: list, writer_process, queue) -> bool:
+    """
+    Joins the workers, then the writer. If the writer exits early the workers are stopped (they would block
+    on the full queue forever). Returns False if the writer did not finish cleanly.
+    """
+    while any(p.is_alive() for p in workers):
+        if not writer_process.is_alive():
+            print("(orchestrator) Error: the writer exited, stopping the workers")
+            for p in workers:
+                p.terminate()
+            break
+        time.sleep(1)
+
+    for p in workers:
+        p.join()
+        if p.exitcode != 0 and writer_process.is_alive():
+            # killed before it could send DONE (ex: out of memory), the writer would wait for it
+            queue.put((DONE, p.name))
+
+    writer_process.join()
+    return writer_process.exitcode == 0
+
+
+def main():
+    config = load_config()
+
+    TASK = config.get("TASK", "no_impl").lower()
+    tasks = {"download": download_worker, "decode": decode_worker}
+    if TASK not in tasks:
+        print(f"orchestrator.py runs {', '.join(tasks)}. Use main.py for {TASK}")
+        exit(1)
+
+    binary = config.get("COSMOS_PROTO_DECODE_BINARY", "juno-decode")
+    decodes = TASK == "decode" or config.get("DECODE_ON_DOWNLOAD", False)
+    if decodes and not command_exists(binary):
+        print(f"Command {binary} not found")
+        exit(1)
+    os.makedirs(tmp_decode_dir, exist_ok=True)
+
+    ranges = worker_ranges(
+        config.get("sections", {}), config.get("ORCHESTRATOR_WORKERS", 0)
+    )
+    if len(ranges) == 0:
+        print("No sections to run")
+        exit(1)
+
+    # spawn: workers start clean (no inherited sqlite connections / event loops)
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue(maxsize=config.get("ORCHESTRATOR_QUEUE_SIZE", 64))
+
+    writer_process = ctx.Process(target=writer, args=(queue, len(ranges), config))
+    writer_process.start()
+
+    workers = []
+    for name, start, end, section in ranges:
+        print(f"Starting {TASK} worker {name}: {start:,}->{end:,}")
+        p = ctx.Process(
+            target=tasks[TASK], name=name, args=(name, start, end, section, config, queue)
+        )
+        p.start()
+        workers.append(p)
+
+    if not wait_for_workers(workers, writer_process, queue):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
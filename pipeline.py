@@ -0,0 +1,208 @@
+"""
+Staged fetch -> decode -> persist for main.py's download & sync tasks.
+
+The event loop only downloads; each group of blocks it writes is handed over in memory:
+- decode threads: decode the group's amino straight from the downloaded blocks (DecoderPool, N groups at
+  once), handed on in order. Blocks pass through undecoded when there is no decoder (download task).
+- persist thread: the only writer of blocks & Txs. Inserts the already decoded rows (own SQLite connection)
+  and commits once per group. The heights of a group which fails (decode results it can not read, a failed
+  insert) go to the retry_queue.
+
+Bounded queues (`queue_size` groups) sit between the stages, so a slow disk or decoder pushes back on the
+downloader instead of piling up in memory, while all 3 stay busy at once. summary() shows each queue's depth.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from chain_types import BlockData
+from decoding import DecoderPool, block_rows, blocks_to_decode
+from SQL import Database
+from stats import stats
+
+# called by the persist thread once a group is committed
+OnSaved = Callable[[list[BlockData]], None]
+
+
+class Pipeline:
+    def __init__(
+        self,
+        db_path: str,
+        decoder_pool: DecoderPool | None = None,
+        queue_size: int = 4,
+        retry_max_attempts: int = 8,
+        retry_base_seconds: float = 5,
+        retry_max_seconds: float = 3600,
+    ):
+        self.db_path = db_path
+        self.decoder_pool = decoder_pool
+        self.queue_size = max(1, queue_size)
+        self.retry_max_attempts = retry_max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+        # (blocks, on_saved) / (rows or the forward stage's exception, blocks, on_saved), None stops the stage
+        self.to_decode: queue.Queue[tuple | None] = queue.Queue(self.queue_size)
+        self.to_persist: queue.Queue[tuple | None] = queue.Queue(self.queue_size)
+        # (decode future, blocks, on_saved) of the groups being decoded, in order
+        workers = decoder_pool.workers if decoder_pool is not None else 1
+        self.decoding: queue.Queue[tuple | None] = queue.Queue(workers * 2)
+        self.peak = {"decode": 0, "persist": 0}
+
+        # highest height handed to the pipeline (it may not be saved yet)
+        self.highest_height = 0
+
+        self.threads = [
+            threading.Thread(target=self._decode_stage, name="decode", daemon=True),
+            threading.Thread(target=self._forward_stage, name="forward", daemon=True),
+            threading.Thread(target=self._persist_stage, name="persist", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, blocks: list[BlockData], on_saved: OnSaved | None = None):
+        """Queues a group of blocks, waits while the decode queue is full."""
+        if len(blocks) == 0:
+            return
+        self.highest_height = max(self.highest_height, max(bd.height for bd in blocks))
+        self.to_decode.put((blocks, on_saved))
+        self.peak["decode"] = max(self.peak["decode"], self.to_decode.qsize())
+
+    async def put_async(self, blocks: list[BlockData], on_saved: OnSaved | None = None):
+        await asyncio.to_thread(self.put, blocks, on_saved)
+
+    def drain(self):
+        """Waits until everything put so far is saved."""
+        self.to_decode.join()
+        self.to_persist.join()
+
+    async def drain_async(self):
+        await asyncio.to_thread(self.drain)
+
+    def summary(self) -> str:
+        return (
+            f"queues: decode {self.to_decode.qsize()}/{self.queue_size} (peak {self.peak['decode']}), "
+            f"persist {self.to_persist.qsize()}/{self.queue_size} (peak {self.peak['persist']})"
+        )
+
+    def close(self):
+        self.to_decode.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _decode_group(self, blocks: list[BlockData]) -> list[dict]:
+        start = time.perf_counter()
+        values = self.decoder_pool.decode(blocks_to_decode(blocks))
+        stats.record("decode", time.perf_counter() - start)
+        return values
+
+    def _decode_stage(self):
+        """Starts each group's decode as it arrives, up to 2x the decoders at once."""
+        workers = self.decoder_pool.workers if self.decoder_pool is not None else 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                item = self.to_decode.get()
+                if item is None:
+                    self.decoding.put(None)
+                    self.to_decode.task_done()
+                    return
+
+                blocks, on_saved = item
+                future = None
+                if self.decoder_pool is not None:
+                    future = executor.submit(self._decode_group, blocks)
+                self.decoding.put((future, blocks, on_saved))
+
+    def _forward_stage(self):
+        """Hands each group to persist once it is decoded, in the order they were put."""
+        while True:
+            item = self.decoding.get()
+            if item is None:
+                self.to_persist.put(None)
+                return
+
+            future, blocks, on_saved = item
+            try:
+                values = []
+                if future is not None:
+                    try:
+                        values = future.result()
+                    except Exception as e:
+                        # saved undecoded, the decode task picks them up later
+                        print(f"Error: pipeline decode: {e}")
+                        traceback.print_exc()
+
+                version = self.decoder_pool.version if self.decoder_pool is not None else ""
+                rows = block_rows(blocks, values, version)
+            except Exception as e:
+                # ex: a decode result extractors.py can not read. Persist queues the group's heights.
+                print(f"Error: pipeline forward: {e}")
+                traceback.print_exc()
+                rows = e
+
+            try:
+                self.to_persist.put((rows, blocks, on_saved))
+                self.peak["persist"] = max(self.peak["persist"], self.to_persist.qsize())
+            finally:
+                self.to_decode.task_done()
+
+    def _persist_stage(self):
+        db = Database(self.db_path)
+        while True:
+            item = self.to_persist.get()
+            if item is None:
+                self.to_persist.task_done()
+                break
+
+            rows, blocks, on_saved = item
+            if isinstance(rows, Exception):
+                # the forward stage could not build the rows
+                self._queue_retries(db, blocks, rows)
+                self.to_persist.task_done()
+                continue
+
+            try:
+                save_start = time.perf_counter()
+                db.insert_block_rows(rows)
+                # Heights which were retried from the retry_queue are done
+                db.remove_retries([bd.height for bd in blocks])
+                db.commit()
+                stats.record("save", time.perf_counter() - save_start)
+
+                if on_saved is not None:
+                    on_saved(blocks)
+            except Exception as e:
+                db.rollback()
+                print(f"Error: pipeline persist: {e}")
+                traceback.print_exc()
+                self._queue_retries(db, blocks, e)
+            finally:
+                self.to_persist.task_done()
+
+        db.conn.close()
+
+    def _queue_retries(self, db: Database, blocks: list[BlockData], error: Exception):
+        """The heights of a failed group are downloaded again (main.py's retry_loop)."""
+        heights = [bd.height for bd in blocks]
+        try:
+            saved = db.get_saved_heights(min(heights), max(heights))
+            for height in heights:
+                if height not in saved:
+                    db.queue_retry(
+                        height,
+                        repr(error),
+                        "",
+                        self.retry_max_attempts,
+                        self.retry_base_seconds,
+                        self.retry_max_seconds,
+                    )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error: pipeline retry queue: {e}")
+            traceback.print_exc()
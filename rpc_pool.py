@@ -0,0 +1,229 @@
+"""
+Health aware RPC endpoint pool.
+
+Every request asks the pool for the best endpoint instead of random.choice(RPC_ARCHIVE_LINKS).
+Each endpoint tracks a latency EWMA, an error rate EWMA and how many requests it has open.
+Endpoints have their own concurrency cap so a fast node is not rate limited and a slow one can not
+hold more than its share of the window.
+
+Failing endpoints are taken out of rotation (circuit breaker). Only transport errors, timeouts, 429 and
+502/503/504 count as failures, an error about 1 height does not (endpoint_ok):
+- closed: normal routing.
+- open: after `failure_threshold` consecutive failures, no traffic for `open_seconds`.
+- half_open: after the cooldown a single probe request is let through. Success closes the
+  circuit, failure opens it again with a doubled cooldown (up to `max_open_seconds`).
+
+With `adaptive=True` the per endpoint cap is an AIMD window (autotune.py) between
+min_in_flight_per_endpoint and max_in_flight_per_endpoint, found from the latencies & failures of the node.
+"""
+
+import asyncio
+import time
+
+from autotune import AIMDWindow
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# statuses which say the node itself is overloaded or unreachable. Any other error status is about the
+# height asked for (pruned, the node can not build that block, ...), the endpoint answered fine.
+ENDPOINT_FAILURE_STATUSES = {429, 502, 503, 504}
+
+
+def endpoint_ok(status_code: int) -> bool:
+    """If a response with this status counts as a success of the endpoint (EWMA, breaker, AIMD)."""
+    return status_code not in ENDPOINT_FAILURE_STATUSES
+
+
+class Endpoint:
+    def __init__(
+        self,
+        url: str,
+        max_in_flight: int,
+        ewma_alpha: float = 0.2,
+        window: AIMDWindow | None = None,
+    ):
+        self.url = url.rstrip("/")
+        self.max_in_flight = max(1, max_in_flight)
+        self.ewma_alpha = ewma_alpha
+        self.window = window
+
+        self.in_flight = 0
+        self.latency_ewma = 0.0  # seconds, 0 until the first success so new endpoints get tried
+        self.error_rate = 0.0  # EWMA of failures (0.0 -> 1.0)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.open_seconds = 0.0
+
+    def available(self, now: float) -> bool:
+        if self.state == OPEN:
+            if now < self.open_until:
+                return False
+            # cooldown is over, let a single probe through
+            self.state = HALF_OPEN
+
+        if self.state == HALF_OPEN:
+            return self.in_flight == 0
+
+        return self.in_flight < self.limit()
+
+    def limit(self) -> int:
+        """How many requests can be open right now."""
+        if self.window is not None:
+            return self.window.value
+        return self.max_in_flight
+
+    def score(self) -> float:
+        # lower is better. Latency scaled by how loaded it is and how often it fails.
+        load = (self.in_flight + 1) / self.limit()
+        return (self.latency_ewma + 0.001) * (1 + load) / max(0.05, 1 - self.error_rate)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.url} ({self.state}, {round(self.latency_ewma * 1000)}ms, "
+            f"{round(self.error_rate * 100, 1)}% err, {self.in_flight}/{self.limit()} open)"
+        )
+
+
+class EndpointPool:
+    def __init__(
+        self,
+        urls: list[str],
+        max_in_flight_per_endpoint: int = 50,
+        failure_threshold: int = 5,
+        open_seconds: float = 15,
+        max_open_seconds: float = 300,
+        ewma_alpha: float = 0.2,
+        adaptive: bool = False,
+        min_in_flight_per_endpoint: int = 1,
+        initial_in_flight_per_endpoint: int = 4,
+    ):
+        if len(urls) == 0:
+            raise ValueError("EndpointPool needs at least 1 url")
+
+        def window() -> AIMDWindow | None:
+            if not adaptive:
+                return None
+            return AIMDWindow(
+                initial_in_flight_per_endpoint,
+                min_in_flight_per_endpoint,
+                max_in_flight_per_endpoint,
+            )
+
+        self.endpoints = [
+            Endpoint(url, max_in_flight_per_endpoint, ewma_alpha, window())
+            for url in urls
+        ]
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._released: asyncio.Event | None = None
+
+    def _event(self) -> asyncio.Event:
+        # created lazily so the pool can be built before the event loop exists
+        if self._released is None:
+            self._released = asyncio.Event()
+        return self._released
+
+    def ranked(self, exclude: tuple[str, ...] = ()) -> list[Endpoint]:
+        """Usable endpoints, best first. Open circuits are skipped unless nothing else is left."""
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.url not in exclude] or self.endpoints
+        usable = [e for e in candidates if e.state != OPEN or now >= e.open_until]
+        if len(usable) == 0:
+            usable = sorted(candidates, key=lambda e: e.open_until)
+        return sorted(usable, key=lambda e: e.score())
+
+    def _pick(self, exclude: tuple[str, ...]) -> Endpoint | None:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.url not in exclude]
+        if len(candidates) == 0:
+            # every endpoint is excluded (ex: a retry with a single RPC), use any of them
+            candidates = self.endpoints
+
+        available = [e for e in candidates if e.available(now)]
+        if len(available) == 0:
+            return None
+        return min(available, key=lambda e: e.score())
+
+    def _next_reopen_in(self) -> float:
+        now = time.monotonic()
+        waits = [e.open_until - now for e in self.endpoints if e.state == OPEN]
+        if len(waits) == 0:
+            return 1.0
+        return max(0.01, min(waits))
+
+    async def acquire(self, exclude: tuple[str, ...] = ()) -> Endpoint:
+        """Waits until an endpoint has room, then reserves a request slot on it."""
+        released = self._event()
+        while True:
+            endpoint = self._pick(exclude)
+            if endpoint is not None:
+                endpoint.in_flight += 1
+                return endpoint
+
+            released.clear()
+            try:
+                await asyncio.wait_for(released.wait(), self._next_reopen_in())
+            except asyncio.TimeoutError:
+                pass
+
+    def record(self, endpoint: Endpoint, ok: bool, latency: float | None = None):
+        """Updates the health of an endpoint without touching its in flight count."""
+        alpha = endpoint.ewma_alpha
+        endpoint.requests += 1
+        endpoint.error_rate = (1 - alpha) * endpoint.error_rate + alpha * (0 if ok else 1)
+
+        if ok:
+            if latency is not None:
+                if endpoint.latency_ewma == 0:
+                    endpoint.latency_ewma = latency
+                else:
+                    endpoint.latency_ewma = (1 - alpha) * endpoint.latency_ewma + alpha * latency
+
+            endpoint.consecutive_failures = 0
+            if endpoint.state != CLOSED:
+                print(f"RPC {endpoint.url} is healthy again")
+            endpoint.state = CLOSED
+            endpoint.open_seconds = 0
+            return
+
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.state == OPEN:
+            # requests which were already in flight when the circuit opened
+            return
+
+        if (
+            endpoint.state == HALF_OPEN
+            or endpoint.consecutive_failures >= self.failure_threshold
+        ):
+            self._open(endpoint)
+
+    def _open(self, endpoint: Endpoint):
+        if endpoint.open_seconds == 0:
+            endpoint.open_seconds = self.base_open_seconds
+        else:
+            endpoint.open_seconds = min(endpoint.open_seconds * 2, self.max_open_seconds)
+
+        endpoint.state = OPEN
+        endpoint.open_until = time.monotonic() + endpoint.open_seconds
+        print(
+            f"RPC {endpoint.url} removed from rotation for {endpoint.open_seconds}s ({endpoint.consecutive_failures} failures in a row)"
+        )
+
+    def release(self, endpoint: Endpoint, ok: bool, latency: float | None = None):
+        endpoint.in_flight = max(0, endpoint.in_flight - 1)
+        self.record(endpoint, ok, latency)
+        # only requests which held a slot tune the window (not abci_info polls)
+        if endpoint.window is not None:
+            endpoint.window.observe(ok, latency)
+        self._event().set()
+
+    def summary(self) -> str:
+        return ", ".join(repr(e) for e in self.endpoints)
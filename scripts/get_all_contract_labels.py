@@ -16,6 +16,7 @@ current_dir = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current_dir)
 sys.path.append(parent)
 
+import codec
 from SQL import Database
 
 # Configuration
@@ -37,7 +38,7 @@ END_BLOCK = latest_block.height
 # Logic
 
 print(f"Getting all transactions in range of blocks: {START_BLOCK} to {END_BLOCK}")
-all_txs = db.get_txs_in_range(START_BLOCK, END_BLOCK)
+all_txs = db.get_txs_in_range(START_BLOCK, END_BLOCK, ["id", "height", "msg_types", "tx_json"])
 print(f"Total Txs found: {len(all_txs):,}")
 
 
@@ -66,7 +67,7 @@ for tx in all_txs:
     if "MsgExecuteContract" not in tx.msg_types:
         continue
 
-    _json = json.loads(tx.tx_json)
+    _json = codec.loads(tx.tx_json)
     for msg in _json["body"]["messages"]:
         # Add AUTHZ support?
         if msg["@type"] == "/cosmwasm.wasm.v1.MsgExecuteContract":
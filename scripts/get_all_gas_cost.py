@@ -1,4 +1,3 @@
-import json
 import os
 import sys
 
@@ -6,6 +5,7 @@ current_dir = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current_dir)
 sys.path.append(parent)
 
+import codec
 from SQL import Database
 
 db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
@@ -47,7 +47,7 @@ for i in range(last_tx_saved.id-10_000_000, last_tx_saved.id):
         continue
     
     height = tx.height
-    tx_json = json.loads(tx.tx_json)
+    tx_json = codec.loads(tx.tx_json)
     fees = tx_json["auth_info"]["fee"]["amount"]
     # gas_amount = int(tx_json["auth_info"]["fee"]['gas_limit'])
     
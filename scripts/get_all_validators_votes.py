@@ -50,55 +50,40 @@ IGNORE_PROPOSAL_IDS = [
     "94",  # spam
 ]
 
-all_txs = db.get_txs_in_range(START_BLOCK, END_BLOCK)
-
-
 all_proposals_during_time = set()
 
 # valaddr: [proposal_1, proposal_3, ...]
 validator_voters: dict[str, list[int]] = {}
 
-
-for tx in all_txs:
-    if len(tx.msg_types) == 0:
+# Vote & weighted vote messages, both direct & as authz (msg_fields, extractors.py)
+vote_msgs: list[dict[str, list[str]]] = []
+for vote_type in (
+    "/cosmos.gov.v1beta1.MsgVote",
+    "/cosmos.gov.v1beta1.MsgVoteWeighted",
+    "/cosmos.gov.v1.MsgVote",
+    "/cosmos.gov.v1.MsgVoteWeighted",
+):
+    vote_msgs += db.get_msg_fields_in_range(vote_type, START_BLOCK, END_BLOCK)
+
+for msg in vote_msgs:
+    voter = msg["sender"][0]
+    proposal_id = msg["proposal_id"][0]
+
+    if proposal_id in IGNORE_PROPOSAL_IDS:
         continue
 
-    # [{'@type': '/cosmos.gov.v1beta1.MsgVote', 'proposal_id': '57', 'voter': 'juno1k0hmfxjj3thuc47057cxuhxneu8rmseudyg9dd', 'option': 'VOTE_OPTION_YES'}]
-    vote_msgs: list[dict] = []
-
-    # Gets vote messages in this Tx. Both direct & as authz.
-    if "/cosmos.authz.v1beta1.MsgExec" in tx.msg_types or "MsgVote" in tx.msg_types:
-        for msg in json.loads(tx.tx_json)["body"]["messages"]:
-            # print(msg)
-            if "MsgVote" in msg["@type"]:
-                vote_msgs.append(msg)
-
-            elif "/cosmos.authz.v1beta1.MsgExec" in msg["@type"]:
-                # dict_keys(['@type', 'grantee', 'msgs'])
-                for sub_msg in msg["msgs"]:
-                    if "MsgVote" in sub_msg["@type"]:
-                        vote_msgs.append(sub_msg)
-
-    for msg in vote_msgs:
-        voter = msg["voter"]
-        proposal_id = msg["proposal_id"]
-        # option = msg["option"]
-
-        if proposal_id in IGNORE_PROPOSAL_IDS:
-            continue
-
-        if voter not in all_validators.keys():
-            continue
+    if voter not in all_validators.keys():
+        continue
 
-        if voter not in validator_voters.keys():
-            validator_voters[voter] = []
+    if voter not in validator_voters.keys():
+        validator_voters[voter] = []
 
-        if proposal_id not in all_proposals_during_time:
-            all_proposals_during_time.add(int(proposal_id))
+    if proposal_id not in all_proposals_during_time:
+        all_proposals_during_time.add(int(proposal_id))
 
-        # ensure proposal_id is not already in list
-        if proposal_id not in validator_voters[voter]:
-            validator_voters[voter].append(proposal_id)
+    # ensure proposal_id is not already in list
+    if proposal_id not in validator_voters[voter]:
+        validator_voters[voter].append(proposal_id)
 
 # dump voters
 print(f"Validator voters: {len(validator_voters):,}")
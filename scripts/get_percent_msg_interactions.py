@@ -11,6 +11,7 @@ current_dir = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current_dir)
 sys.path.append(parent)
 
+import codec
 from SQL import Database
 
 db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
@@ -26,7 +27,7 @@ START_BLOCK = 1
 END_BLOCK = latest_block.height
 
 print(f"Getting all transactions in range of blocks: {START_BLOCK} to {END_BLOCK}")
-all_txs = db.get_txs_in_range(START_BLOCK, END_BLOCK)
+all_txs = db.get_txs_in_range(START_BLOCK, END_BLOCK, ["id", "height", "msg_types", "tx_json"])
 print(f"Total Txs found: {len(all_txs):,}")
 
 # msg_type: amount
@@ -35,7 +36,7 @@ for tx in all_txs:
     if len(tx.msg_types) == 0:
         continue
 
-    _json = json.loads(tx.tx_json)
+    _json = codec.loads(tx.tx_json)
     for msg in _json["body"]["messages"]:
         if msg["@type"] not in all_interactions:
             all_interactions[msg["@type"]] = 0
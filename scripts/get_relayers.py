@@ -25,6 +25,7 @@ current_dir = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current_dir)
 sys.path.append(parent)
 
+import codec
 from SQL import Database
 
 # 5779678 -> 7990650
@@ -106,7 +107,7 @@ for i in range(1, last_tx_saved.id):
     if tx is None:
         continue
 
-    tx_json = json.loads(tx.tx_json)
+    tx_json = codec.loads(tx.tx_json)
 
     msg: dict
     for msg in list(tx_json["body"]["messages"]):
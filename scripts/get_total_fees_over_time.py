@@ -13,6 +13,7 @@ current_dir = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current_dir)
 sys.path.append(parent)
 
+import codec
 from SQL import Database
 
 db = Database(os.path.join(current_dir, os.path.join(parent, "data.db")))
@@ -74,7 +75,7 @@ for i in range(earliest_tx_id, last_tx_saved_id):
         continue
 
     height = tx.height
-    tx_json = json.loads(tx.tx_json)
+    tx_json = codec.loads(tx.tx_json)
     fees = tx_json["auth_info"]["fee"]["amount"]
 
     if tx.id % 50_000 == 0:
@@ -1,7 +1,6 @@
 """
 Gets validator unjails for soft or hard slashing.
 """
-import json
 import os
 import sys
 
@@ -18,25 +17,13 @@ if latest_block is None:
     print("No blocks found in db")
     exit(1)
 
-# unique_msgs = {}
+# messages table: an index range scan, the signer of a MsgUnjail is its validator_addr
 unjails = []
-for i in range(1, 1_000_000):
-    tx = db.get_tx(i)
-    if tx is None:
-        continue
-
-    if "slashing." not in tx.msg_types:
-        continue
-
-    tx_json = json.loads(tx.tx_json)
-    for msg in tx_json["body"]["messages"]:
-        if msg["@type"] != "/cosmos.slashing.v1beta1.MsgUnjail":
-            continue
-
-        val_addr = msg["validator_addr"]
-        block = tx.height
-        print(f"{val_addr} was unjailed at block {block}")
-        unjails.append((val_addr, block))
+for tx_id, msg_index, nested, block, val_addr in db.get_messages_in_range(
+    "/cosmos.slashing.v1beta1.MsgUnjail", 1, latest_block.height
+):
+    print(f"{val_addr} was unjailed at block {block}")
+    unjails.append((val_addr, block))
 
 print(len(unjails))
 
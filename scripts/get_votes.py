@@ -21,28 +21,20 @@ if latest_block is None:
     exit(1)
 print(latest_block)
 
-# get all transactions in the last 11 days, height 7755721 to 7919651 (April 20th)
-all_txs = db.get_txs_in_range(7755721, 7919651)
-print(f"Total Txs: {len(all_txs):,}")
+# all votes in the last 11 days, height 7755721 to 7919651 (April 20th). From msg_fields (extractors.py),
+# so votes sent through authz MsgExec are included
+votes = db.get_msg_fields_in_range("/cosmos.gov.v1beta1.MsgVote", 7755721, 7919651)
+print(f"Total votes: {len(votes):,}")
 
 
 # address: vote
 voters: dict[str, str] = {}
 proposal_id = "282"
 
-# go through all Txs and get where msg_types is a vote message. If a user revotes, it overrides their last one
-for tx in all_txs:
-    if len(tx.msg_types) == 0:
-        continue
-
-    # print(tx.msg_types)
-    if "MsgVote" in tx.msg_types:
-        _json = json.loads(tx.tx_json)
-        for msg in _json["body"]["messages"]:
-            # Add AUTHZ support?
-            if msg["@type"] == "/cosmos.gov.v1beta1.MsgVote":
-                if msg["proposal_id"] == proposal_id:
-                    voters[msg["voter"]] = msg["option"]
+# votes are in Tx order. If a user revotes, it overrides their last one
+for vote in votes:
+    if vote.get("proposal_id") == [proposal_id]:
+        voters[vote["sender"][0]] = vote["option"][0]
 
 # dump voters
 print(f"Voters: {len(voters):,}")
@@ -27,26 +27,12 @@ START_BLOCK = 1
 END_BLOCK = latest_block.height
 INTERACTION_CUTOFF = 100
 
-print(f"Getting all transactions in range of blocks: {START_BLOCK} to {END_BLOCK}")
-all_txs = db.get_txs_in_range(START_BLOCK, END_BLOCK)
-print(f"Total Txs found: {len(all_txs):,}")
-
-# contract_addr: amount
-contracts: dict[str, int] = {}
-for tx in all_txs:
-    if len(tx.msg_types) == 0:
-        continue
-
-    if "MsgExecuteContract" not in tx.msg_types:
-        continue
-
-    _json = json.loads(tx.tx_json)
-    for msg in _json["body"]["messages"]:
-        # Add AUTHZ support?
-        if msg["@type"] == "/cosmwasm.wasm.v1.MsgExecuteContract":
-            if msg["contract"] not in contracts:
-                contracts[msg["contract"]] = 0
-            contracts[msg["contract"]] += 1
+print(f"Getting all contract executes in range of blocks: {START_BLOCK} to {END_BLOCK}")
+# contract_addr: amount, from msg_fields (extractors.py) so executes through authz MsgExec count too
+contracts: dict[str, int] = db.count_msg_field_values(
+    "contract", "/cosmwasm.wasm.v1.MsgExecuteContract", START_BLOCK, END_BLOCK
+)
+print(f"Total contracts found: {len(contracts):,}")
 
 
 updated_contracts = {k: v for k, v in contracts.items() if v >= INTERACTION_CUTOFF}
@@ -0,0 +1,83 @@
+"""
+Per stage timings (fetch, save, decode, ...) of the indexer, for the benchmarks.
+
+main.py records how long each stage takes and, when STATS_FILE is set in chain_config.json, dumps
+p50 / p99 per stage + the peak RSS of the process to it (see benchmarks/bench_indexer.py).
+"""
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+# samples kept per stage, after that a random sample of them (reservoir) is kept
+MAX_SAMPLES = 100_000
+
+
+class StageStats:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.counts: dict[str, int] = {}
+        self.totals: dict[str, float] = {}
+        # stages record from their own threads (pipeline.py)
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            samples = self.samples.setdefault(stage, [])
+            count = self.counts.get(stage, 0) + 1
+            self.counts[stage] = count
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+            if len(samples) < MAX_SAMPLES:
+                samples.append(seconds)
+            else:
+                i = random.randrange(count)
+                if i < MAX_SAMPLES:
+                    samples[i] = seconds
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        stages = {}
+        with self.lock:
+            samples_by_stage = {stage: list(samples) for stage, samples in self.samples.items()}
+        for stage, samples in samples_by_stage.items():
+            ordered = sorted(samples)
+            stages[stage] = {
+                "count": self.counts[stage],
+                "total": self.totals[stage],
+                "p50": ordered[int(len(ordered) * 0.5)],
+                "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            }
+
+        return {"stages": stages, "peak_rss_mb": peak_rss_mb()}
+
+    def dump(self, path: str):
+        if path == "":
+            return
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # KiB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+stats = StageStats()
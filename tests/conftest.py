@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+sys.path.append(parent)
+
+import util
+
+
+@pytest.fixture(autouse=True)
+def error_logs_in_tmp(tmp_path, monkeypatch):
+    # errors.txt / no_sender_error.txt are written next to util.py
+    monkeypatch.setattr(util, "current_dir", str(tmp_path))
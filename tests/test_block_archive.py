@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+import os
+import zlib
+
+from block_archive import COMPRESSION_LEVEL, HEADER, MAGIC, BlockArchive
+
+SEGMENT_SIZE = 1_000
+
+
+def raw(height: int) -> bytes:
+    return f'{{"result":{{"height":"{height}"}}}}'.encode() * (height % 7 + 1)
+
+
+def segment_path(path: str) -> str:
+    return os.path.join(path, "seg-000000000000.blk")
+
+
+def record_size(height: int) -> int:
+    return HEADER.size + len(zlib.compress(raw(height), COMPRESSION_LEVEL))
+
+
+def test_torn_trailing_record_is_cut_off(tmp_path):
+    path = str(tmp_path)
+    archive = BlockArchive(path, SEGMENT_SIZE)
+    for height in [1, 2, 3]:
+        archive.put(height, raw(height))
+    archive.close()
+    complete = os.path.getsize(segment_path(path))
+
+    heights = [1, 2, 3]
+    for height, torn in [
+        # crashed in the middle of a payload
+        (5, HEADER.pack(MAGIC, 4, 100) + b"x" * 10),
+        # crashed in the middle of a header
+        (6, HEADER.pack(MAGIC, 4, 100)[:7]),
+    ]:
+        with open(segment_path(path), "ab") as f:
+            f.write(torn)
+
+        archive = BlockArchive(path, SEGMENT_SIZE)
+        assert [archive.get(h) for h in heights] == [raw(h) for h in heights]
+        assert not archive.has(4)
+
+        # the next writer cuts it off before appending
+        archive.put(height, raw(height))
+        archive.close()
+        heights.append(height)
+        complete += record_size(height)
+        assert os.path.getsize(segment_path(path)) == complete
+
+        archive = BlockArchive(path, SEGMENT_SIZE)
+        assert archive.archived(list(range(1, 7))) == heights
+        assert archive.get(height) == raw(height)
+        archive.close()
+
+
+def append_every_other_height(path: str, first: int):
+    archive = BlockArchive(path, SEGMENT_SIZE)
+    for height in range(first, 400, 2):
+        archive.put(height, raw(height))
+        # many small flushes, so the 2 processes interleave their appends
+        if height % 10 < 2:
+            archive.flush()
+    archive.close()
+
+
+def test_two_processes_append_to_the_same_segment(tmp_path):
+    path = str(tmp_path)
+    BlockArchive(path, SEGMENT_SIZE).close()
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=append_every_other_height, args=(path, first)) for first in [0, 1]]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    archive = BlockArchive(path, SEGMENT_SIZE)
+    assert archive.archived(list(range(400))) == list(range(400))
+    assert all(archive.get(h) == raw(h) for h in range(400))
+    # no torn or duplicate records in between
+    assert os.path.getsize(segment_path(path)) == sum(record_size(h) for h in range(400))
+    archive.close()
+
+
+def test_async_flush_can_be_read_meanwhile(tmp_path):
+    path = str(tmp_path)
+    archive = BlockArchive(path, SEGMENT_SIZE)
+
+    async def run():
+        for height in range(1, 51):
+            await archive.put_async(height, raw(height))
+        flush = asyncio.create_task(archive.flush_async())
+        await asyncio.sleep(0)
+        # in flight or already appended, never missing
+        assert archive.get(25) == raw(25)
+        await flush
+
+    asyncio.run(run())
+    assert archive.pending == {} and archive.flushing == {}
+    archive.close()
+
+    archive = BlockArchive(path, SEGMENT_SIZE)
+    assert archive.archived(list(range(1, 51))) == list(range(1, 51))
+    archive.close()
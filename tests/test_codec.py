@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import codec
+
+TXS = ["CpIBCo8BChwvY29zbW9zLmJhbmsudjFiZXRhMS5Nc2dTZW5k+/==", "Cp4BCpsBCiQvY29zbXdhc20ud2FzbS52MS5Nc2dFeGVjdXRl"]
+
+
+def block(txs) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": -1,
+        "result": {
+            "block_id": {"hash": "AB" * 32, "parts": {"total": 1, "hash": "CD" * 32}},
+            "block": {
+                "header": {
+                    "version": {"block": "11"},
+                    "chain_id": "juno-1",
+                    "height": "100",
+                    "time": "2023-01-01T00:00:00.123456789Z",
+                    "last_block_id": {"hash": "EF" * 32},
+                    "data_hash": "01" * 32,
+                },
+                "data": {"txs": txs},
+                "evidence": {"evidence": []},
+                "last_commit": {
+                    "height": "99",
+                    "signatures": [{"timestamp": "2022-12-31T23:59:59Z", "signature": "C" * 88}],
+                },
+            },
+        },
+    }
+
+
+def full_parse(raw: bytes):
+    v = codec.loads(raw)["result"]["block"]
+    return v["header"]["time"], v["data"]["txs"] or []
+
+
+@pytest.fixture
+def slow_calls(monkeypatch) -> list[bytes]:
+    calls = []
+    slow = codec._block_time_and_txs_slow
+
+    def spy(raw: bytes):
+        calls.append(raw)
+        return slow(raw)
+
+    monkeypatch.setattr(codec, "_block_time_and_txs_slow", spy)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        json.dumps(block(None)).encode(),
+        json.dumps(block([])).encode(),
+        json.dumps(block(TXS), separators=(",", ":")).encode(),
+        json.dumps(block(TXS), indent=2).encode(),
+    ],
+    ids=["txs-null", "empty-block", "compact", "indented"],
+)
+def test_same_as_a_full_parse(raw, slow_calls):
+    assert codec.block_time_and_txs(raw) == full_parse(raw)
+    # read without building the object tree
+    assert slow_calls == []
+
+
+def test_other_layouts_fall_back_to_a_full_parse(slow_calls):
+    extra_data_key = block(TXS)
+    extra_data_key["result"]["block"]["data"] = {"square_size": "4", "txs": TXS}
+    layouts = [
+        # keys in alphabetical order: data comes before header
+        json.dumps(block(TXS), sort_keys=True).encode(),
+        # data.txs is not the first key of data
+        json.dumps(extra_data_key).encode(),
+        # "/" written as "\/" by some encoders
+        json.dumps(block(TXS)).replace("/", "\\/").encode(),
+    ]
+
+    for raw in layouts:
+        assert codec.block_time_and_txs(raw) == full_parse(raw)
+    assert slow_calls == layouts
+
+
+def test_not_a_block():
+    assert codec.block_time_and_txs(b'{"jsonrpc":"2.0","id":-1,"error":{"code":-32603,"message":"Internal error"}}') is None
+    assert codec.block_time_and_txs(b"<html>Bad gateway</html>") is None
@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from decoding import StreamDecoder, TypePolicy
+from fast_decode import message_type_urls
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+FAKE_DECODER = os.path.join(os.path.dirname(current_dir), "benchmarks", "fake_juno_decode.py")
+sys.path.append(os.path.join(os.path.dirname(current_dir), "benchmarks"))
+
+from proto_tx import any_, field_bytes, field_str
+
+SEND = "/cosmos.bank.v1beta1.MsgSend"
+DELEGATE = "/cosmos.staking.v1beta1.MsgDelegate"
+EXEC = "/cosmos.authz.v1beta1.MsgExec"
+WASM = "/cosmwasm.wasm.v1.MsgExecuteContract"
+UPDATE_CLIENT = "/ibc.core.client.v1.MsgUpdateClient"
+
+# decode-file works, decode-stream is not a command of this binary
+STUB = """#!{python}
+import runpy
+import sys
+import time
+
+if sys.argv[1:3] == ["tx", "decode-stream"]:
+    {stream}
+    sys.exit(0)
+
+sys.argv = [{fake!r}] + sys.argv[1:]
+runpy.run_path({fake!r}, run_name="__main__")
+"""
+
+USAGE = (
+    'print("Usage:\\\\n  juno-decode tx [command]\\\\n\\\\nAvailable Commands:\\\\n'
+    '  decode-file Decode a file of Txs", flush=True)'
+)
+
+
+@pytest.mark.parametrize(
+    "stream",
+    [
+        USAGE,
+        # exits before answering anything
+        "pass",
+        # prints its usage, then waits on stdin
+        USAGE + "; time.sleep(60)",
+    ],
+    ids=["usage", "eof", "usage-and-hang"],
+)
+def test_stream_falls_back_to_decode_file(tmp_path, capsys, stream):
+    binary = tmp_path / "juno-decode"
+    binary.write_text(STUB.format(python=sys.executable, stream=stream, fake=FAKE_DECODER))
+    binary.chmod(0o755)
+
+    decoder = StreamDecoder(str(binary), str(tmp_path))
+    to_decode = [{"id": i, "tx": base64.b64encode(os.urandom(100)).decode()} for i in range(50)]
+
+    start = time.time()
+    values = decoder.decode(to_decode)
+    assert not decoder.streaming
+    assert sorted(v["id"] for v in values if "tx" in v) == list(range(50))
+    # no restarts before the fallback
+    assert "restarting" not in capsys.readouterr().out
+    assert time.time() - start < 10
+
+    # the next batches go straight to decode-file
+    assert len(decoder.decode(to_decode[:5])) == 5
+    decoder.close()
+
+
+def tx(*messages: bytes, memo: str = "") -> str:
+    """A base64 TxRaw of Any messages"""
+    body = b"".join(field_bytes(1, m) for m in messages) + field_str(2, memo)
+    return base64.b64encode(field_bytes(1, body) + field_bytes(2, b"") + field_bytes(3, b"sig")).decode()
+
+
+def msg(type_url: str) -> bytes:
+    return any_(type_url, field_str(1, "juno1a"))
+
+
+def msg_exec(*inner: bytes) -> bytes:
+    return any_(EXEC, field_str(1, "juno1grantee") + b"".join(field_bytes(2, m) for m in inner))
+
+
+def test_policy_exact_and_prefix_patterns():
+    exact = TypePolicy(include=[SEND])
+    assert exact.allows(tx(msg(SEND)))
+    # an exact pattern is not a prefix
+    assert not exact.allows(tx(msg(SEND + "Authorization")))
+    assert not exact.allows(tx(msg("/cosmos.bank.v1beta1.Msg")))
+
+    prefix = TypePolicy(include=["/cosmos.staking.*"])
+    assert prefix.allows(tx(msg(DELEGATE)))
+    assert prefix.allows(tx(msg(SEND), msg(DELEGATE)))
+    assert not prefix.allows(tx(msg(SEND)))
+    assert not prefix.allows(tx(msg("/cosmos.stakingx.v1.MsgDelegate")))
+
+
+def test_policy_exclude_wins_over_include():
+    policy = TypePolicy(include=["/cosmos.*"], exclude=[SEND])
+    assert policy.allows(tx(msg(DELEGATE)))
+    assert not policy.allows(tx(msg(SEND)))
+    assert not policy.allows(tx(msg(DELEGATE), msg(SEND)))
+
+
+def test_type_urls_in_a_memo_or_wasm_msg_do_not_match():
+    wasm = any_(
+        WASM,
+        field_str(1, "juno1a") + field_str(2, "juno1contract") + field_bytes(3, json.dumps({"@type": UPDATE_CLIENT}).encode()),
+    )
+    value = tx(wasm, memo=UPDATE_CLIENT)
+    assert message_type_urls(value) == [WASM]
+    assert TypePolicy(exclude=["/ibc.*"]).allows(value)
+    assert not TypePolicy(include=[UPDATE_CLIENT]).allows(value)
+
+
+def test_policy_matches_the_messages_inside_msg_exec():
+    value = tx(msg_exec(msg(DELEGATE), msg_exec(msg(SEND))))
+    assert message_type_urls(value) == [EXEC, DELEGATE, EXEC, SEND]
+    assert not TypePolicy(exclude=[SEND]).allows(value)
+    assert TypePolicy(include=["/cosmos.staking.*"]).allows(value)
+    assert not TypePolicy(include=[WASM]).allows(value)
+
+
+def test_txs_without_protobuf_types_are_decoded():
+    legacy = base64.b64encode(b'{"type":"cosmos-sdk/StdTx"}').decode()
+    assert message_type_urls(legacy) is None
+    assert TypePolicy(include=[SEND]).allows(legacy)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from autotune import BatchSizeTuner
+from downloader import BlockFetchError, fetch_block, fetch_blocks_batch
+from rpc_pool import CLOSED, OPEN, EndpointPool
+
+BLOCK = b'{"result":{"block":{"header":{"time":"2023-01-01T00:00:00Z"},"data":{"txs":[]}}}}'
+
+
+def fetch_many(status_for_height, heights: list[int], pool: EndpointPool) -> list:
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = status_for_height(int(request.url.params["height"]))
+        return httpx.Response(status, content=BLOCK if status == 200 else b"error")
+
+    async def run():
+        results = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            for height in heights:
+                try:
+                    results.append(await fetch_block(client, pool, height))
+                except BlockFetchError as e:
+                    results.append(e)
+        return results
+
+    return asyncio.run(run())
+
+
+def test_bad_height_does_not_open_the_breaker():
+    pool = EndpointPool(["http://rpc"], failure_threshold=2)
+    results = fetch_many(lambda h: 500 if h == 7 else 200, [7] * 5 + [8], pool)
+
+    assert all(isinstance(r, BlockFetchError) for r in results[:5])
+    assert results[5].height == 8
+    endpoint = pool.endpoints[0]
+    assert endpoint.state == CLOSED and endpoint.error_rate == 0 and endpoint.in_flight == 0
+
+
+@pytest.mark.parametrize("status", [429, 502, 503, 504])
+def test_overloaded_endpoint_opens_the_breaker(status):
+    pool = EndpointPool(["http://rpc"], failure_threshold=2)
+    fetch_many(lambda h: status, [1, 2], pool)
+
+    assert pool.endpoints[0].state == OPEN
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"<html>Bad gateway</html>", b'[1, "x", null]', b'"not a batch"'],
+)
+def test_garbage_batch_releases_the_endpoint(body):
+    pool = EndpointPool(["http://rpc"])
+
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await fetch_blocks_batch(client, pool, [1, 2, 3])
+
+    # no height came back, download_in_order re-queues all of them
+    assert asyncio.run(run()) == {}
+    assert pool.endpoints[0].in_flight == 0
+
+
+def test_rejected_batches_shrink_the_batch_size():
+    limit = 60
+    pool = EndpointPool(["http://rpc"])
+    tuner = BatchSizeTuner(10, 200)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if len(payload) > limit:
+            # ex: a proxy's body size limit
+            return httpx.Response(413, content=b"Request Entity Too Large")
+        results = [{"jsonrpc": "2.0", "id": p["id"], "result": json.loads(BLOCK)["result"]} for p in payload]
+        return httpx.Response(200, json=results)
+
+    async def run() -> list[int]:
+        sizes = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            for _ in range(60):
+                sizes.append(tuner())
+                await fetch_blocks_batch(client, pool, list(range(1, tuner() + 1)), tuner=tuner)
+        return sizes
+
+    sizes = asyncio.run(run())
+    # it only probes 1 step above the limit, then backs off
+    assert max(sizes) <= limit + tuner.step
+    assert sorted(sizes[-20:])[10] < limit
+    # the endpoint itself is fine
+    assert pool.endpoints[0].state == CLOSED
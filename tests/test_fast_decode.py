@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+
+import pytest
+
+import codec
+from fast_decode import decode_tx
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "benchmarks"))
+
+from proto_tx import synthetic_tx
+
+# real Txs (record_blocks.py) + juno-decode's exact output, see benchmarks/conformance_fast_decode.py
+CORPUS = os.path.join(current_dir, "data", "fast_decode_corpus.jsonl")
+
+
+@pytest.mark.skipif(
+    not os.path.exists(CORPUS),
+    reason="no recorded corpus: conformance_fast_decode.py --recorded-dir <dir> --write-corpus " + CORPUS,
+)
+def test_same_bytes_as_the_binary_on_recorded_txs():
+    with open(CORPUS, "r") as f:
+        corpus = [codec.loads(line) for line in f if line.strip() != ""]
+    assert len(corpus) > 0
+
+    mismatches = [i for i, value in enumerate(corpus) if decode_tx(value["tx"]) != value["tx_json"]]
+    assert mismatches == []
+
+
+def test_same_json_as_proto_tx_with_repeated_fields_and_a_tip():
+    # proto_tx.py is written from the .proto files, not from the binary: only the recorded corpus is ground truth
+    rng = random.Random(1)
+    checked = 0
+    while checked < 200:
+        tx, expected = synthetic_tx(rng, unknown_rate=0, tip_rate=1)
+        # the stored JSON text, so the key order counts
+        assert decode_tx(tx) == codec.dumps(expected)
+        checked += 1
+
+    decoded = codec.loads(decode_tx(tx))
+    assert list(decoded["body"]) == [
+        "messages",
+        "memo",
+        "timeout_height",
+        "extension_options",
+        "non_critical_extension_options",
+    ]
+    assert list(decoded["auth_info"]) == ["signer_infos", "fee", "tip"]
+    assert list(decoded["auth_info"]["tip"]) == ["amount", "tipper"]
+
+
+def test_no_tip_is_null():
+    tx, expected = synthetic_tx(random.Random(2), unknown_rate=0)
+    assert expected["auth_info"]["tip"] is None
+    assert decode_tx(tx) == codec.dumps(expected)
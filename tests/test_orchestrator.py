@@ -0,0 +1,67 @@
+import base64
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+import orchestrator
+from orchestrator import BLOCKS, DONE, wait_for_workers, worker_ranges
+from SQL import Database
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+def test_sections_sharing_a_boundary_do_not_overlap():
+    with open(os.path.join(os.path.dirname(current_dir), "chain_config.json.example"), "r") as f:
+        sections = json.load(f)["sections"]
+
+    last = max(section["end"] for section in sections.values())
+    for workers in [0, 4, 7]:
+        ranges = sorted((start, end) for _, start, end, _ in worker_ranges(sections, workers))
+        heights = sum(end - start + 1 for start, end in ranges)
+        assert all(a[1] < b[0] for a, b in zip(ranges, ranges[1:]))
+        assert (ranges[0][0], ranges[-1][1], heights) == (0, last, last + 1)
+
+
+def test_covered_section_is_skipped():
+    sections = {"a": {"start": 0, "end": 100}, "b": {"start": 10, "end": 20}, "c": {"start": 50, "end": 150}}
+    ranges = [(name, start, end) for name, start, end, _ in worker_ranges(sections, 0)]
+    assert ranges == [("a", 0, 100), ("c", 101, 150)]
+
+
+def test_writer_survives_a_failed_insert(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator, "DB_PATH", str(tmp_path / "data.db"))
+
+    def row(height: int) -> tuple:
+        return (height, "2023-01-01T00:00:00Z", [(base64.b64encode(f"tx{height}".encode()).decode(), None)])
+
+    messages: queue.Queue = queue.Queue()
+    messages.put((BLOCKS, [row(1)]))
+    # height 1 is already saved: the whole group is rolled back
+    messages.put((BLOCKS, [row(3), row(1)]))
+    messages.put((BLOCKS, [row(2)]))
+    messages.put((DONE, "w"))
+    orchestrator.writer(messages, 1, {})
+
+    db = Database(str(tmp_path / "data.db"))
+    assert db.get_saved_heights(0, 10) == {1, 2}
+    assert db.get_queued_retries() == {3}
+    db.cur.execute("""SELECT COUNT(*) FROM txs""")
+    assert db.cur.fetchone()[0] == 2
+
+
+def test_workers_stop_when_the_writer_exits():
+    ctx = multiprocessing.get_context("spawn")
+    # a writer which crashed
+    writer_process = ctx.Process(target=sys.exit, args=(1,))
+    writer_process.start()
+    # stands in for a worker blocked on the full queue
+    worker = ctx.Process(target=time.sleep, args=(600,))
+    worker.start()
+
+    start = time.time()
+    assert not wait_for_workers([worker], writer_process, ctx.Queue())
+    assert not worker.is_alive()
+    assert time.time() - start < 30
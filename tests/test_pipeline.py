@@ -0,0 +1,66 @@
+import base64
+import threading
+
+from chain_types import BlockData
+from pipeline import Pipeline
+from SQL import Database
+
+BAD_HEIGHT = 2
+
+
+class FakeDecoderPool:
+    """Decodes every Tx to a MsgSend, but the Tx of BAD_HEIGHT to JSON extractors.py can not read"""
+
+    workers = 1
+    version = "test"
+
+    def __init__(self):
+        self.heights: dict[str, int] = {}
+
+    def decode(self, to_decode: list[dict]) -> list[dict]:
+        values = []
+        for value in to_decode:
+            tx = '{"body":{"messages":[{"@type":"/cosmos.bank.v1beta1.MsgSend","from_address":"juno1a"}]}}'
+            if self.heights[value["tx"]] == BAD_HEIGHT:
+                tx = "not json"
+            values.append({"id": value["id"], "tx": tx})
+        return values
+
+
+def block(height: int) -> BlockData:
+    return BlockData(height, "2023-01-01T00:00:00Z", [base64.b64encode(f"tx{height}".encode()).decode()])
+
+
+def drained(pipeline: Pipeline) -> bool:
+    thread = threading.Thread(target=pipeline.drain, daemon=True)
+    thread.start()
+    thread.join(10)
+    return not thread.is_alive()
+
+
+def test_failed_groups_go_to_the_retry_queue(tmp_path):
+    path = str(tmp_path / "data.db")
+    db = Database(path)
+    db.create_tables()
+    db.optimize_tables()
+
+    decoder = FakeDecoderPool()
+    pipeline = Pipeline(path, decoder, queue_size=1)
+    for height in [1, 2, 3, 4, 5]:
+        decoder.heights[block(height).encoded_txs[0]] = height
+
+    pipeline.put([block(1)])
+    # the forward stage can not build its rows
+    pipeline.put([block(2)])
+    # height 1 is saved already: the insert fails, 4 is rolled back with it
+    pipeline.put([block(4), block(1)])
+    pipeline.put([block(3)])
+    assert drained(pipeline)
+
+    # the stages are still running
+    pipeline.put([block(5)])
+    assert drained(pipeline)
+    pipeline.close()
+
+    assert db.get_saved_heights(0, 10) == {1, 3, 5}
+    assert db.get_queued_retries() == {2, 4}
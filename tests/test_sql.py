@@ -0,0 +1,159 @@
+import base64
+import os
+import sqlite3
+
+import pytest
+
+from chain_types import DECODE_FAILED, DECODE_POLICY, TxDecode
+from SQL import TX_STORAGE_BLOB, TX_STORAGE_TEXT, Database
+from util import txraw_to_hash
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "data.db"))
+    db.create_tables()
+    db.optimize_tables()
+    yield db
+    db.conn.close()
+
+
+def insert_txs(db: Database, rows: list[tuple]):
+    # (id, height, tx_json, decode_status, decoder_version)
+    db.cur.executemany(
+        """INSERT INTO txs (id, height, tx_amino, tx_json, decode_status, decoder_version) VALUES (?, ?, 'AA==', ?, ?, ?)""",
+        rows,
+    )
+    db.commit()
+
+
+def test_decode_queue_skips_policy_and_failed_txs_in_the_index(db):
+    insert_txs(
+        db,
+        [
+            (1, 1, "", "", ""),
+            (2, 1, "", DECODE_POLICY, "v1"),
+            (3, 2, "", DECODE_FAILED, "v1"),
+            (4, 2, "", DECODE_FAILED, "v0"),
+            (5, 3, "{}", "", "v1"),
+            (6, 3, "", "", ""),
+        ],
+    )
+
+    ids = [tx_id for chunk in db.iter_txs_to_decode(0, 10, "v1", chunk_size=2) for tx_id, _, _ in chunk]
+    assert ids == [1, 4, 6]
+
+    # policy skipped Txs are not in the index at all
+    db.cur.execute("""SELECT COUNT(*) FROM txs INDEXED BY txs_to_decode WHERE tx_json='' AND decode_status!='policy'""")
+    assert db.cur.fetchone()[0] == 4
+
+    db.cur.execute(
+        """EXPLAIN QUERY PLAN SELECT id, height, tx_amino FROM txs WHERE tx_json='' AND decode_status!='policy' AND height BETWEEN 0 AND 10 AND (height>0 OR id>-1) AND (decode_status='' OR (decode_status='failed' AND decoder_version!='v1')) ORDER BY height, id LIMIT 2"""
+    )
+    plan = " ".join(row[3] for row in db.cur.fetchall())
+    assert "txs_to_decode" in plan and "TEMP B-TREE" not in plan
+
+
+def test_old_decode_queue_index_is_replaced(db):
+    db.cur.execute("""DROP INDEX txs_to_decode""")
+    db.cur.execute("""CREATE INDEX txs_to_decode ON txs (height) WHERE tx_json=''""")
+    db.optimize_tables()
+
+    db.cur.execute("""SELECT sql FROM sqlite_master WHERE name='txs_to_decode'""")
+    assert "decode_status!='policy'" in db.cur.fetchone()[0]
+
+
+def decoded(height: int) -> TxDecode:
+    return TxDecode(
+        height,
+        tx_json='{"body":{}}',
+        msg_types='["/cosmos.bank.v1beta1.MsgSend"]',
+        messages=[(0, 0, "/cosmos.bank.v1beta1.MsgSend", "juno1a")],
+        decoder_version="v1",
+    )
+
+
+def tx_json_of(path: str, tx_id: int) -> str:
+    # what other connections see
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("""SELECT tx_json FROM txs WHERE id=?""", (tx_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_update_txs_commits_its_own_transaction(db, tmp_path):
+    insert_txs(db, [(1, 1, "", "", "")])
+    db.update_txs([(1, decoded(1))])
+
+    assert not db.conn.in_transaction
+    assert tx_json_of(str(tmp_path / "data.db"), 1) == '{"body":{}}'
+
+
+def test_update_txs_joins_the_callers_transaction(db, tmp_path):
+    insert_txs(db, [(1, 1, "", "", "")])
+    db.cur.execute("""INSERT INTO txs (id, height, tx_amino, tx_json) VALUES (2, 1, 'AA==', '')""")
+    db.update_txs([(1, decoded(1))])
+
+    # nothing is committed on the caller's behalf
+    assert db.conn.in_transaction
+    assert tx_json_of(str(tmp_path / "data.db"), 1) == ""
+
+    db.rollback()
+    db.cur.execute("""SELECT id, tx_json FROM txs""")
+    assert db.cur.fetchall() == [(1, "")]
+    db.cur.execute("""SELECT COUNT(*) FROM messages""")
+    assert db.cur.fetchone()[0] == 0
+
+
+def set_tx_storage(db: Database, storage: str):
+    # what migrations/tx_blobs.py does before converting
+    db.set_setting("tx_storage", storage)
+    db.commit()
+    db.tx_blobs = storage == TX_STORAGE_BLOB
+
+
+def convert_all(db: Database):
+    last_id = 0
+    while last_id is not None:
+        last_id = db.convert_tx_storage(last_id, 2)
+
+
+def test_half_converted_tx_storage_reads_the_same(db):
+    aminos = [base64.b64encode(os.urandom(40 + i)).decode() for i in range(4)]
+    ids = [db.insert_tx(height, amino) for height, amino in enumerate(aminos, 1)]
+    db.commit()
+
+    set_tx_storage(db, TX_STORAGE_BLOB)
+    assert db.convert_tx_storage(0, 2) == ids[1]
+    db.cur.execute("""SELECT typeof(tx_amino), typeof(tx_hash) FROM txs ORDER BY id""")
+    assert db.cur.fetchall() == [("blob", "blob")] * 2 + [("text", "text")] * 2
+
+    hashes = [txraw_to_hash(amino) for amino in aminos]
+    for tx_id, amino, tx_hash in zip(ids, aminos, hashes):
+        tx = db.get_tx(tx_id)
+        assert (tx.tx_amino, tx.tx_hash) == (amino, tx_hash)
+        # hex from a user, either case, matches both storages
+        assert db.get_tx_by_hash(tx_hash.lower()).id == tx_id
+        assert db.get_tx_by_hash(tx_hash).id == tx_id
+
+    assert db.get_tx_by_hash("not hex") is None
+    assert [amino for chunk in db.iter_txs_to_decode(0, 10) for _, _, amino in chunk] == aminos
+
+
+def test_tx_storage_round_trip_is_byte_for_byte(db):
+    for height in range(1, 6):
+        db.insert_tx(height, base64.b64encode(os.urandom(30 + height)).decode())
+    db.commit()
+    db.cur.execute("""SELECT id, tx_amino, tx_hash FROM txs ORDER BY id""")
+    before = db.cur.fetchall()
+
+    set_tx_storage(db, TX_STORAGE_BLOB)
+    convert_all(db)
+    db.cur.execute("""SELECT COUNT(*) FROM txs WHERE typeof(tx_amino)!='blob' OR typeof(tx_hash)!='blob'""")
+    assert db.cur.fetchone()[0] == 0
+
+    set_tx_storage(db, TX_STORAGE_TEXT)
+    convert_all(db)
+    db.cur.execute("""SELECT id, tx_amino, tx_hash FROM txs ORDER BY id""")
+    assert db.cur.fetchall() == before
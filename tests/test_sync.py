@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "benchmarks"))
+
+from bench_indexer import IndexerRun, db_counts, make_workdir, write_config
+from stub_rpc import StubChain, start_stub_rpc
+
+BLOCKS = 200
+TIPS = 5
+
+
+@pytest.fixture
+def workdir():
+    path = make_workdir()
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def write_sync_config(workdir: str, urls: list[str], rpc_batch_size: int, retry_interval: float):
+    args = SimpleNamespace(
+        decode_limit=10_000,
+        decode_workers=1,
+        decode_on_download=False,
+        exclude_types="",
+        grouping=50,
+        max_in_flight=20,
+        rpc_batch_size=rpc_batch_size,
+        static=False,
+    )
+    write_config(workdir, "sync", urls[0], BLOCKS, args)
+    config_path = os.path.join(workdir, "chain_config.json")
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    # every failed height is due at once
+    config.update({"RETRY_BASE_SECONDS": 0, "RETRY_INTERVAL_SECONDS": retry_interval})
+    config["sections"]["bench"]["rpc_endpoints"] = urls
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+
+
+def test_failing_heights_do_not_hold_up_the_tip(workdir):
+    # 5% of the heights always fail and the fake decoder errors on 10% of the Txs
+    chain = StubChain(latest_height=BLOCKS, txs_per_block=2, latency=0.01, error_rate=0.05)
+    failing = [h for h in range(1, BLOCKS + 1) if chain.should_fail(h)]
+    assert len(failing) > 0
+    server, url = start_stub_rpc(chain)
+
+    # the background retry task does not run during the test
+    write_sync_config(workdir, [url], 1, 3600)
+
+    env = dict(os.environ, FAKE_DECODE_FAIL_RATE="0.1")
+    run = IndexerRun(workdir, env)
+    try:
+        try:
+            run.wait_for(r"Subscribed to NewBlock", 60)
+        except TimeoutError:
+            pass
+
+        requests_before = {h: chain.block_requests.get(h, 0) for h in failing}
+        chain.produce(TIPS, 0.2)
+        for _ in range(TIPS):
+            _, match = run.wait_for(r"Tip ([\d,]+) saved", 30)
+            assert match is not None, "main.py exited"
+    finally:
+        run.stop()
+        server.shutdown()
+
+    # the tip path never downloads heights of the retry queue
+    assert {h: chain.block_requests.get(h, 0) for h in failing} == requests_before
+    blocks, _, _ = db_counts(workdir)
+    assert blocks == BLOCKS + TIPS - len(failing)
+
+
+def test_batch_retries_go_to_another_rpc(workdir):
+    # the fast RPC gets the batches but has 5% of the heights pruned, the slow one has all of them
+    pruned = StubChain(latest_height=BLOCKS, txs_per_block=2, error_rate=0.05)
+    full = StubChain(latest_height=BLOCKS, txs_per_block=2, latency=0.2)
+    failing = [h for h in range(1, BLOCKS + 1) if pruned.should_fail(h)]
+    assert len(failing) > 0
+    pruned_server, pruned_url = start_stub_rpc(pruned)
+    full_server, full_url = start_stub_rpc(full)
+
+    write_sync_config(workdir, [pruned_url, full_url], 20, 1)
+
+    run = IndexerRun(workdir, dict(os.environ))
+    try:
+        _, match = run.wait_for(r"Retrying ([\d,]+) failed heights", 60)
+        assert match is not None, "main.py exited"
+
+        deadline = time.time() + 30
+        while db_counts(workdir)[0] < BLOCKS and time.time() < deadline:
+            time.sleep(0.2)
+    finally:
+        run.stop()
+        pruned_server.shutdown()
+        full_server.shutdown()
+
+    # asking the pruned RPC again would fail every time
+    assert db_counts(workdir)[0] == BLOCKS
+    assert all(full.block_requests.get(h, 0) > 0 for h in failing)
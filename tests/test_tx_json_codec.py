@@ -0,0 +1,150 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from SQL import Database
+from tx_json_codec import CODEC_ZLIB_DICT, TxJsonCodec, train_dictionary
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current_dir)
+
+
+def tx_json(i: int) -> str:
+    return json.dumps(
+        {
+            "body": {
+                "messages": [
+                    {
+                        "@type": "/cosmos.bank.v1beta1.MsgSend",
+                        "from_address": f"juno1sender{i:04d}",
+                        "to_address": f"juno1receiver{i * 7:04d}",
+                        "amount": [{"denom": "ujuno", "amount": str(i * 1000)}],
+                    }
+                ],
+                "memo": "",
+            },
+            "auth_info": {"fee": {"amount": [{"denom": "ujuno", "amount": "5000"}], "gas_limit": "200000"}},
+            "signatures": [f"sig{i:08d}"],
+        },
+        separators=(",", ":"),
+    )
+
+
+def add_dictionary(db: Database) -> int:
+    dict_id = db.add_tx_json_dict(train_dictionary([tx_json(i) for i in range(50)]), 50)
+    db.set_setting("tx_json_dict", str(dict_id))
+    db.commit()
+    db.tx_json_codec = db.load_tx_json_codec()
+    return dict_id
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "data.db"))
+    db.create_tables()
+    db.optimize_tables()
+    yield db
+    db.conn.close()
+
+
+def test_round_trip():
+    dictionary = train_dictionary([tx_json(i) for i in range(50)])
+    codec = TxJsonCodec({3: dictionary}, active=3)
+
+    for i in [0, 7, 1000]:
+        value = codec.compress(tx_json(i))
+        assert isinstance(value, bytes) and value[0] == CODEC_ZLIB_DICT
+        assert len(value) < len(tx_json(i))
+        assert codec.is_current(value)
+        assert codec.decompress(value) == codec.decompress(value, cached=False) == tx_json(i)
+
+    # TEXT values are read as they are
+    assert codec.decompress(tx_json(1)) == tx_json(1)
+    assert not codec.is_current(tx_json(1))
+
+
+def test_not_decoded_txs_stay_text(db):
+    add_dictionary(db)
+    assert db.tx_json_codec.compress("") == ""
+
+    tx_id = db.insert_tx(1, "AA==")
+    db.commit()
+    db.cur.execute("""SELECT typeof(tx_json), tx_json FROM txs WHERE id=?""", (tx_id,))
+    assert db.cur.fetchone() == ("text", "")
+    # still matched by the txs_to_decode partial index
+    assert [row[0] for chunk in db.iter_txs_to_decode(0, 10) for row in chunk] == [tx_id]
+    assert db.get_tx(tx_id).tx_json == ""
+
+
+def test_dictionary_added_by_another_connection(db, tmp_path):
+    tx_id = db.insert_tx(1, "AA==")
+    db.commit()
+    # opened before the dictionary exists
+    reader = Database(str(tmp_path / "data.db"))
+    assert reader.tx_json_codec.dicts == {}
+
+    dict_id = add_dictionary(db)
+    db.update_tx(tx_id, tx_json(1), "[]", "")
+    db.commit()
+
+    assert reader.get_tx(tx_id).tx_json == tx_json(1)
+    assert list(reader.tx_json_codec.dicts) == [dict_id]
+    reader.conn.close()
+
+
+def test_text_and_blob_rows_read_the_same(db):
+    # decoded before the dictionary: TEXT, after: BLOB
+    for height in [1, 2]:
+        db.update_tx(db.insert_tx(height, "AA=="), tx_json(height), "[]", "")
+    add_dictionary(db)
+    for height in [3, 4]:
+        db.update_tx(db.insert_tx(height, "AA=="), tx_json(height), "[]", "")
+    db.commit()
+
+    db.cur.execute("""SELECT typeof(tx_json) FROM txs ORDER BY id""")
+    assert [row[0] for row in db.cur.fetchall()] == ["text", "text", "blob", "blob"]
+
+    expected = [tx_json(height) for height in [1, 2, 3, 4]]
+    assert [db.get_tx(tx_id).tx_json for tx_id in [1, 2, 3, 4]] == expected
+    assert [tx.tx_json for tx in db.get_txs_in_range(1, 4)] == expected
+    assert [tx.tx_json for tx in db.get_txs_in_range(1, 4, ["id", "tx_json"])] == expected
+    assert [db.get_tx_specific(tx_id, ["tx_json"]).tx_json for tx_id in [1, 2, 3, 4]] == expected
+
+
+def test_migration_compresses_and_back(tmp_path):
+    workdir = str(tmp_path)
+    for path in glob.glob(os.path.join(parent, "*.py")):
+        shutil.copy(path, workdir)
+    os.makedirs(os.path.join(workdir, "migrations"))
+    shutil.copy(os.path.join(parent, "migrations", "compress_tx_json.py"), os.path.join(workdir, "migrations"))
+
+    db = Database(os.path.join(workdir, "data.db"))
+    db.create_tables()
+    for height in range(1, 41):
+        db.update_tx(db.insert_tx(height, "AA=="), tx_json(height), "[]", "")
+    # not decoded yet
+    db.insert_tx(41, "AA==")
+    db.commit()
+
+    def migrate(arg: str) -> list[tuple]:
+        subprocess.run(
+            [sys.executable, os.path.join("migrations", "compress_tx_json.py"), arg],
+            cwd=workdir,
+            check=True,
+            capture_output=True,
+        )
+        db.cur.execute("""SELECT typeof(tx_json), COUNT(*) FROM txs GROUP BY 1 ORDER BY 1""")
+        return db.cur.fetchall()
+
+    assert migrate("20") == [("blob", 40), ("text", 1)]
+    assert [tx.tx_json for tx in db.get_txs_in_range(1, 41)] == [tx_json(h) for h in range(1, 41)] + [""]
+
+    assert migrate("off") == [("text", 41)]
+    db.cur.execute("""SELECT tx_json FROM txs ORDER BY id""")
+    assert [row[0] for row in db.cur.fetchall()] == [tx_json(h) for h in range(1, 41)] + [""]
+    db.conn.close()
@@ -0,0 +1,144 @@
+"""
+Follows the tip of the chain for the `sync` task.
+
+We subscribe to tm.event='NewBlock' over the RPC websocket, so every new block (header + txs) is
+pushed to us the moment it is committed. No extra /block request is needed for it.
+
+If the websocket drops we reconnect with a backoff, and poll abci_info in the meantime so we never
+stall. If `websockets` is not installed we only poll.
+"""
+
+import asyncio
+import json
+import time
+from typing import AsyncIterator
+
+import httpx
+
+import codec
+from rpc_pool import EndpointPool
+
+try:
+    # pip install websockets
+    import websockets
+except ImportError:
+    websockets = None
+
+NEW_BLOCK_QUERY = "tm.event='NewBlock'"
+
+
+def websocket_url(rpc_url: str) -> str:
+    rpc_url = rpc_url.rstrip("/")
+    if rpc_url.startswith("https://"):
+        rpc_url = "wss://" + rpc_url[len("https://") :]
+    elif rpc_url.startswith("http://"):
+        rpc_url = "ws://" + rpc_url[len("http://") :]
+    return f"{rpc_url}/websocket"
+
+
+def new_block_from_event(message: dict) -> tuple[int, dict] | None:
+    """
+    Returns (height, /block style result) from a NewBlock event.
+    The result can be given to downloader.parse_block_result like a normal /block response.
+    """
+    value = message.get("result", {}).get("data", {}).get("value", {})
+    block = value.get("block")
+    if not block:
+        # subscription confirmation ({"result": {}}) or another event
+        return None
+
+    height = int(block["header"]["height"])
+    return height, {"block": block}
+
+
+class TipFollower:
+    def __init__(
+        self,
+        pool: EndpointPool,
+        client: httpx.AsyncClient,
+        poll_interval: float = 10,
+        max_reconnect_seconds: float = 60,
+    ):
+        self.pool = pool
+        self.client = client
+        self.poll_interval = poll_interval
+        self.max_reconnect_seconds = max_reconnect_seconds
+        self.last_height = 0
+
+    async def follow(self) -> AsyncIterator[tuple[int, dict | None]]:
+        """
+        Yields (height, block result) for every new tip. The block result is None when the height
+        came from polling, the caller then downloads it (and any gap before it) itself.
+        """
+        reconnect_wait = 1.0
+
+        while True:
+            if websockets is not None:
+                endpoint = self.pool.ranked()[0]
+                try:
+                    async for height, block in self._subscribe(endpoint.url):
+                        reconnect_wait = 1.0
+                        if height > self.last_height:
+                            self.last_height = height
+                            yield height, block
+                except Exception as e:
+                    print(f"Error: websocket @ {endpoint.url}: {e!r}. Polling for {reconnect_wait}s")
+                    self.pool.record(endpoint, ok=False)
+
+            # websocket is down (or not installed). Poll until it is time to reconnect.
+            reconnect_at = time.monotonic() + reconnect_wait
+            while websockets is None or time.monotonic() < reconnect_at:
+                height = await self._poll()
+                if height > self.last_height:
+                    self.last_height = height
+                    yield height, None
+
+                wait = self.poll_interval
+                if websockets is not None:
+                    wait = min(wait, max(0, reconnect_at - time.monotonic()))
+                await asyncio.sleep(wait)
+
+            reconnect_wait = min(reconnect_wait * 2, self.max_reconnect_seconds)
+
+    async def _subscribe(self, rpc_url: str) -> AsyncIterator[tuple[int, dict]]:
+        # max_size=None: blocks with large txs (store codes, IBC) go over the 1MiB default
+        async with websockets.connect(websocket_url(rpc_url), max_size=None) as ws:
+            await ws.send(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "subscribe",
+                        "id": 1,
+                        "params": {"query": NEW_BLOCK_QUERY},
+                    }
+                )
+            )
+            print(f"Subscribed to NewBlock events @ {websocket_url(rpc_url)}")
+
+            async for raw in ws:
+                message = codec.loads(raw)
+                if "error" in message:
+                    raise Exception(f"subscribe error: {message['error']}")
+
+                new_block = new_block_from_event(message)
+                if new_block is not None:
+                    yield new_block
+
+        raise Exception("websocket closed by the RPC")
+
+    async def _poll(self) -> int:
+        # Same failover as the bulk download, healthiest RPC first.
+        for endpoint in self.pool.ranked():
+            start = time.monotonic()
+            try:
+                r = await self.client.get(f"{endpoint.url}/abci_info?", timeout=10)
+                height = int(codec.loads(r.content)["result"]["response"]["last_block_height"])
+            except Exception as e:
+                print(f"Error: TipFollower._poll(): {e!r} @ {endpoint.url}")
+                self.pool.record(endpoint, ok=False)
+                continue
+
+            self.pool.record(endpoint, ok=True, latency=time.monotonic() - start)
+            return height
+
+        return -1
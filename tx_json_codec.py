@@ -0,0 +1,120 @@
+"""
+Compression of the decoded txs.tx_json column (migrations/compress_tx_json.py), stdlib zlib only.
+
+Decoded Txs repeat the same type URLs, field names, pubkey types, sign modes, denoms, ... but 1 tx_json is
+too short for zlib to find much of that on its own. So each value is compressed against a preset
+dictionary (zdict) trained on a sample of stored tx_json: the JSON fragments most of them share.
+
+Stored tx_json values:
+- TEXT: not compressed. The default, and "" for Txs which are not decoded yet (txs_to_decode).
+- BLOB: a codec tag byte, then the codec's data. CODEC_ZLIB_DICT: the 4 byte tx_json_dicts.id of the
+  dictionary, then a raw deflate stream.
+"""
+
+import functools
+import re
+import struct
+import zlib
+from collections import Counter
+
+CODEC_ZLIB_DICT = 1
+
+# zlib only looks back 32KB, a longer dictionary is not used
+DICT_SIZE = 32 * 1024
+LEVEL = 6
+
+# runs of up to MAX_TOKENS JSON tokens are dictionary candidates
+MAX_TOKENS = 16
+_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[^",:{}\[\]]+|[,:{}\[\]]')
+_HEADER = struct.Struct(">BI")
+
+
+def train_dictionary(samples: list[str], size: int = DICT_SIZE) -> bytes:
+    """
+    A zdict of the fragments (runs of JSON tokens) found in the most samples, scored by the bytes they would
+    save: (samples with it - 1) * length. The best are put last, zlib reaches them with the shortest distance.
+    """
+    tokenized = [_TOKENS.findall(sample) for sample in samples]
+    # tokens of 1 sample only (signatures, keys, amounts, ...) end a run, no fragment across them repeats
+    token_counts: Counter[str] = Counter()
+    for tokens in tokenized:
+        token_counts.update(set(tokens))
+
+    counts: Counter[str] = Counter()
+    for tokens in tokenized:
+        fragments = set()
+        run: list[str] = []
+        for token in tokens + [""]:
+            if token_counts[token] > 1:
+                run.append(token)
+                continue
+
+            for n in range(1, min(MAX_TOKENS, len(run)) + 1):
+                for i in range(len(run) - n + 1):
+                    fragments.add("".join(run[i : i + n]))
+            run = []
+        counts.update(fragments)
+
+    scored = sorted(
+        ((count - 1) * len(fragment), fragment)
+        for fragment, count in counts.items()
+        if count > 1 and len(fragment) > 3
+    )
+
+    chosen: list[str] = []
+    dictionary = ""
+    for _, fragment in reversed(scored):
+        # a run already inside a longer one adds nothing
+        if len(dictionary) + len(fragment) > size or fragment in dictionary:
+            continue
+
+        chosen.append(fragment)
+        dictionary += fragment
+
+    return "".join(reversed(chosen)).encode()
+
+
+class TxJsonCodec:
+    """
+    Compresses tx_json with the active dictionary (None: TEXT as is) and decompresses values of any of
+    `dicts`, the last `cache_size` of them are kept (keyed by the stored value, rows read again and again).
+    """
+
+    def __init__(self, dicts: dict[int, bytes], active: int | None = None, cache_size: int = 10_000):
+        self.dicts = dicts
+        self.active = active
+        # compressobj with the dictionary loaded, copied for each value
+        self._compressor = None
+        if active is not None:
+            self._compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, -15, zdict=dicts[active])
+        self._decompress = functools.lru_cache(maxsize=cache_size)(self._decompress_uncached)
+
+    def compress(self, tx_json: str) -> str | bytes:
+        if self._compressor is None or tx_json == "":
+            return tx_json
+
+        c = self._compressor.copy()
+        return _HEADER.pack(CODEC_ZLIB_DICT, self.active) + c.compress(tx_json.encode()) + c.flush()
+
+    def decompress(self, value: str | bytes | None, cached: bool = True) -> str:
+        """
+        The tx_json of a stored value, compressed or not. KeyError: a dictionary this codec does not have.
+        cached=False for scans, which would only push the hot rows out of the cache.
+        """
+        if not isinstance(value, bytes):
+            return value or ""
+        return self._decompress(value) if cached else self._decompress_uncached(value)
+
+    def _decompress_uncached(self, value: bytes) -> str:
+        codec, dict_id = _HEADER.unpack_from(value)
+        if codec != CODEC_ZLIB_DICT:
+            raise ValueError(f"Unknown tx_json codec {codec}")
+
+        d = zlib.decompressobj(-15, zdict=self.dicts[dict_id])
+        return (d.decompress(value[_HEADER.size :]) + d.flush()).decode()
+
+    def is_current(self, value: str | bytes | None) -> bool:
+        """If a stored value is already in the form compress would write."""
+        if not isinstance(value, bytes):
+            return self.active is None or not value
+        return self.active is not None and _HEADER.unpack_from(value) == (CODEC_ZLIB_DICT, self.active)
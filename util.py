@@ -1,11 +1,14 @@
 import base64
 import hashlib
-import json
 import os
+import random
+import time
 from shutil import which
 
 import httpx
 
+import codec
+
 current_dir = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -26,8 +29,19 @@ def run_decode_file(
     res = os.popen(
         f"{COSMOS_BINARY_FILE} tx decode-file {file_loc} {output_file_loc}"
     ).read()
-    with open(output_file_loc, "r") as f:
-        return json.load(f)
+    with open(output_file_loc, "rb") as f:
+        return codec.loads(f.read())
+
+
+def retry_backoff(attempts: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with jitter: half of the delay is fixed, the other half random."""
+    delay = min(max_seconds, base_seconds * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def log_rpc_error(height: int, status_code: int, rpc_url: str, text: str):
+    with open(os.path.join(current_dir, "errors.txt"), "a") as f:
+        f.write(f"Height: {height};{status_code} @ {rpc_url} @ {time.time()};{text}\n\n")
 
 
 def command_exists(cmd):
@@ -69,25 +83,44 @@ def get_sender(
 
         return value
 
-    # write error to file if there is no sender found (we need to add this type)
-    with open(os.path.join(current_dir, "no_sender_error.txt"), "a") as f:
-        f.write(f"Height:{height} -" + str(msg) + "\n\n")
-
+    # logged once per type by extractors.miss_log (we need to add this type)
     return None
 
 
 def get_latest_chain_height(RPC_ARCHIVE: str) -> int:
-    r = httpx.get(f"{RPC_ARCHIVE}/abci_info?")
+    """
+    Returns the latest height of the chain from a single RPC, or -1 if the RPC could not be reached.
+    Callers fail over to the next RPC (see rpc_pool.EndpointPool.ranked).
+    """
+    try:
+        r = httpx.get(f"{RPC_ARCHIVE}/abci_info?", timeout=10)
+    except httpx.HTTPError as e:
+        print(f"Error: get_latest_chain_height: {e!r} @ {RPC_ARCHIVE}")
+        return -1
+
+    return _abci_info_height(r, RPC_ARCHIVE)
+
+
+async def get_latest_chain_height_async(client: httpx.AsyncClient, RPC_ARCHIVE: str) -> int:
+    """get_latest_chain_height() on a shared AsyncClient, for the event loop."""
+    try:
+        r = await client.get(f"{RPC_ARCHIVE}/abci_info?", timeout=10)
+    except httpx.HTTPError as e:
+        print(f"Error: get_latest_chain_height: {e!r} @ {RPC_ARCHIVE}")
+        return -1
+
+    return _abci_info_height(r, RPC_ARCHIVE)
+
 
+def _abci_info_height(r: httpx.Response, RPC_ARCHIVE: str) -> int:
     if r.status_code != 200:
-        # TODO: backup RPC?
         print(
-            f"Error: get_latest_chain_height status_code: {r.status_code} @ {RPC_ARCHIVE}. Exiting..."
+            f"Error: get_latest_chain_height status_code: {r.status_code} @ {RPC_ARCHIVE}"
         )
-        exit(1)
+        return -1
 
     current_height = (
-        r.json().get("result", {}).get("response", {}).get("last_block_height", "-1")
+        codec.loads(r.content).get("result", {}).get("response", {}).get("last_block_height", "-1")
     )
 
     print(f"Current Height: {current_height}")